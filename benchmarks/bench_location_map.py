@@ -0,0 +1,120 @@
+"""
+Compare LocationKeyMap (sorted arrays + bisect) with the previous
+IntervalTree-based implementation: build time, lookup time and memory.
+
+    python benchmarks/bench_location_map.py --keys 20000 --lookups 100000
+
+Requires ``intervaltree`` (a dev dependency).
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from intervaltree import Interval, IntervalTree
+from lsprotocol import types as lsp_types
+
+from hydra_lsp.context import Loc, LocationKeyMap, pack_position
+
+URI = "file:///bench/config.yaml"
+
+
+class IntervalTreeKeyMap:
+    """The previous implementation of LocationKeyMap"""
+
+    def __init__(self, definitions: Dict[str, lsp_types.Location]):
+        self.file_to_tree: Dict[str, IntervalTree] = {}
+        for key, loc in definitions.items():
+            interval = Interval(
+                (loc.range.start.line, loc.range.start.character),
+                (loc.range.end.line, loc.range.end.character),
+                key,
+            )
+            self.file_to_tree.setdefault(loc.uri, IntervalTree()).add(interval)
+
+    def find_key_by_position(self, position: lsp_types.Position, doc_id: str):
+        for interval in self.file_to_tree[doc_id].at(
+            (position.line, position.character)
+        ):
+            return interval.data
+
+        return None
+
+
+def make_definitions(n: int) -> Dict[str, lsp_types.Location]:
+    """A key per line, nested 4 levels deep like a typical config"""
+    definitions = {}
+    for line in range(n):
+        indent = 2 * (line % 4)
+        key = f"group{line // 4}.key{line}"
+        definitions[key] = lsp_types.Location(
+            uri=URI,
+            range=lsp_types.Range(
+                start=lsp_types.Position(line=line, character=indent),
+                end=lsp_types.Position(line=line, character=indent + len(key)),
+            ),
+        )
+
+    return definitions
+
+
+def measure(build: Callable, positions: List[lsp_types.Position]) -> Tuple:
+    tracemalloc.start()
+    start = time.perf_counter()
+    key_map = build()
+    build_time = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    found = [key_map.find_key_by_position(p, URI) for p in positions]
+    lookup_time = time.perf_counter() - start
+
+    return build_time, lookup_time, memory, found
+
+
+def to_loc(location: lsp_types.Location) -> Loc:
+    start, end = location.range.start, location.range.end
+    return Loc(
+        location.uri,
+        pack_position(start.line, start.character),
+        pack_position(end.line, end.character),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--keys", type=int, default=20_000)
+    parser.add_argument("--lookups", type=int, default=100_000)
+    args = parser.parse_args()
+
+    definitions = make_definitions(args.keys)
+    compact = {key: to_loc(loc) for key, loc in definitions.items()}
+    rng = random.Random(0)
+    positions = [
+        lsp_types.Position(line=rng.randrange(args.keys), character=rng.randrange(24))
+        for _ in range(args.lookups)
+    ]
+
+    results = {
+        "intervaltree": measure(lambda: IntervalTreeKeyMap(definitions), positions),
+        "sorted arrays": measure(
+            lambda: LocationKeyMap.from_definitions(compact), positions
+        ),
+    }
+    assert results["intervaltree"][3] == results["sorted arrays"][3]
+
+    print(f"{args.keys} keys, {args.lookups} lookups")
+    for name, (build_time, lookup_time, memory, _) in results.items():
+        print(
+            f"{name:>14}: build {build_time * 1000:8.1f} ms, "
+            f"lookup {lookup_time * 1e9 / args.lookups:8.0f} ns, "
+            f"memory {memory / 1024:8.0f} KiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Startup time of the server: from spawning the process to the response to
+``initialize`` (what the editor waits for), and of ``hydra-lsp --version``.
+
+    python -m benchmarks.bench_startup --repeat 10 --output startup.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+COMMAND = [sys.executable, "-m", "hydra_lsp"]
+
+
+def send(process: subprocess.Popen, message: Dict) -> None:
+    body = json.dumps(message).encode()
+    process.stdin.write(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+    process.stdin.flush()
+
+
+def receive(process: subprocess.Popen) -> Dict:
+    length = 0
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise RuntimeError("The server exited")
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode().partition(":")
+        if name.lower() == "content-length":
+            length = int(value)
+
+    return json.loads(process.stdout.read(length))
+
+
+def time_initialize() -> float:
+    """Seconds from spawning the server to the response to initialize"""
+    start = time.perf_counter()
+    process = subprocess.Popen(COMMAND, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    try:
+        send(
+            process,
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "initialize",
+                "params": {"processId": None, "rootUri": None, "capabilities": {}},
+            },
+        )
+        while receive(process).get("id") != 1:
+            pass
+        elapsed = time.perf_counter() - start
+
+        send(process, {"jsonrpc": "2.0", "id": 2, "method": "shutdown"})
+        send(process, {"jsonrpc": "2.0", "method": "exit"})
+        process.wait(timeout=10)
+    finally:
+        if process.poll() is None:
+            process.kill()
+
+    return elapsed
+
+
+def time_version() -> float:
+    start = time.perf_counter()
+    subprocess.run(COMMAND + ["--version"], check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def summarize(times: List[float]) -> Dict[str, float]:
+    return {
+        "min_ms": round(min(times) * 1000, 1),
+        "median_ms": round(statistics.median(times) * 1000, 1),
+        "max_ms": round(max(times) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="save the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {
+        "initialize": summarize([time_initialize() for _ in range(args.repeat)]),
+        "version": summarize([time_version() for _ in range(args.repeat)]),
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Generator of synthetic Hydra config trees.
+
+    python -m benchmarks.generate /tmp/configs --files 5 --depth 3 --fanout 5
+
+Every file is a tree of mappings ``depth`` levels deep with ``fanout`` children
+per mapping and ``leaves`` scalar keys in every innermost mapping.
+``config_0.yaml`` is the root, every file includes the next one in its
+``defaults`` list, so the chain is ``files`` configs long. Sections are shared
+between the files, so later files partially override the earlier ones.
+A share of the values (``interpolation``) are ``${}`` references to other keys.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+from typing import List
+
+
+class ConfigSpec:
+    """Shape of a generated config tree"""
+
+    __slots__ = ["files", "depth", "fanout", "leaves", "interpolation", "seed"]
+
+    def __init__(
+        self,
+        files: int = 3,
+        depth: int = 2,
+        fanout: int = 4,
+        leaves: int = 5,
+        interpolation: float = 0.2,
+        seed: int = 0,
+    ):
+        self.files = files
+        self.depth = depth
+        self.fanout = fanout
+        self.leaves = leaves
+        # share of the values which are interpolations
+        self.interpolation = interpolation
+        self.seed = seed
+
+    @property
+    def keys_per_file(self) -> int:
+        return self.fanout**self.depth * self.leaves
+
+
+# scales used by the benchmarks, roughly 100, 5k and 50k keys
+SCALES = {
+    "small": ConfigSpec(files=2, depth=2, fanout=3, leaves=6),
+    "medium": ConfigSpec(files=5, depth=3, fanout=5, leaves=8),
+    "large": ConfigSpec(files=10, depth=3, fanout=8, leaves=10),
+}
+
+
+def generate_config(spec: ConfigSpec, folder: str) -> str:
+    """Write the config files to the folder, returns the path of the root config"""
+    os.makedirs(folder, exist_ok=True)
+    rng = random.Random(spec.seed)
+
+    # the deepest file of the chain is written first, so interpolations
+    # can point to the keys defined by the files it includes
+    keys: List[str] = []
+    for i in reversed(range(spec.files)):
+        lines = ["defaults:"]
+        if i + 1 < spec.files:
+            lines.append(f"  - config_{i + 1}")
+        lines.append("  - _self_")
+        lines.append("")
+
+        _write_tree(lines, spec, rng, keys, f"f{i}", "", 0)
+
+        with open(os.path.join(folder, f"config_{i}.yaml"), "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+    return os.path.join(folder, "config_0.yaml")
+
+
+def _write_tree(
+    lines: List[str],
+    spec: ConfigSpec,
+    rng: random.Random,
+    keys: List[str],
+    file_id: str,
+    path: str,
+    level: int,
+) -> None:
+    indent = "  " * level
+
+    if level == spec.depth:
+        for j in range(spec.leaves):
+            # every other leaf is shared between the files (an override)
+            name = f"key{j}" if j % 2 else f"{file_id}_key{j}"
+            key = f"{path}.{name}"
+
+            if keys and rng.random() < spec.interpolation:
+                value = f"prefix/${{{rng.choice(keys)}}}"
+            else:
+                value = str(rng.randrange(1000))
+
+            lines.append(f"{indent}{name}: {value}")
+            keys.append(key)
+        return
+
+    for j in range(spec.fanout):
+        name = f"section{j}"
+        lines.append(f"{indent}{name}:")
+        _write_tree(
+            lines,
+            spec,
+            rng,
+            keys,
+            file_id,
+            f"{path}.{name}" if path else name,
+            level + 1,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("folder")
+    parser.add_argument("--files", type=int, default=3)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--fanout", type=int, default=4)
+    parser.add_argument("--leaves", type=int, default=5)
+    parser.add_argument("--interpolation", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    spec = ConfigSpec(
+        files=args.files,
+        depth=args.depth,
+        fanout=args.fanout,
+        leaves=args.leaves,
+        interpolation=args.interpolation,
+        seed=args.seed,
+    )
+    print(generate_config(spec, args.folder))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Benchmarks of the language server features on generated configs.
+
+    python -m benchmarks.run --scales small medium --output results.json
+    python -m benchmarks.run --compare results.json
+
+Every operation is timed ``--repeat`` times, the results (microseconds per call)
+are saved as JSON, so they can be compared between commits with ``--compare``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+from lsprotocol import types as lsp_types
+from pygls.workspace import Workspace
+
+from benchmarks.generate import SCALES, ConfigSpec, generate_config
+from hydra_lsp.autocomplete import Completer
+from hydra_lsp.context import HydraContext
+from hydra_lsp.intel import HydraIntel
+from hydra_lsp.parser import ConfigParser, path_to_uri
+from hydra_lsp.resolver import Resolver
+from hydra_lsp.symbols import SymbolIndex
+
+# how many keys / positions are sampled for the per-key operations
+SAMPLE_SIZE = 500
+
+
+class BenchServer:
+    """The part of the language server used by the features: the workspace"""
+
+    __slots__ = ["workspace"]
+
+    def __init__(self, context: HydraContext):
+        self.workspace = Workspace(None)
+        for uri in context.files:
+            with open(uri[len("file://") :]) as f:
+                self.workspace.put_text_document(
+                    lsp_types.TextDocumentItem(
+                        uri=uri, language_id="yaml", version=1, text=f.read()
+                    )
+                )
+
+
+def measure(fn: Callable, calls: int, repeat: int) -> Dict[str, float]:
+    """``fn`` makes ``calls`` calls of the operation"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1e6 / calls)
+
+    return {
+        "min_us": round(min(times), 3),
+        "median_us": round(statistics.median(times), 3),
+        "calls": calls,
+        "repeat": repeat,
+    }
+
+
+def run_scale(spec: ConfigSpec, repeat: int) -> Dict:
+    rng = random.Random(spec.seed)
+
+    with tempfile.TemporaryDirectory() as folder:
+        root = path_to_uri(generate_config(spec, folder))
+        results: Dict = {}
+
+        results["load_cold"] = measure(lambda: ConfigParser().load(root), 1, repeat)
+
+        parser = ConfigParser()
+        context = parser.load(root)
+        results["load_warm"] = measure(lambda: parser.load(root), 1, repeat)
+
+        results["size"] = {
+            "files": len(context.files),
+            "keys": len(context.definitions),
+            "references": context.size - len(context.definitions),
+        }
+
+        keys = rng.sample(sorted(context.values), min(SAMPLE_SIZE, len(context.values)))
+        results["get"] = measure(
+            lambda: [context.get(k) for k in keys], len(keys), repeat
+        )
+
+        completer = Completer()
+        completer.update(context)
+        prefixes = [k[: rng.randrange(1, len(k) + 1)] for k in keys]
+        results["complete"] = measure(
+            lambda: [completer.complete(p, root) for p in prefixes],
+            len(prefixes),
+            repeat,
+        )
+
+        symbols = SymbolIndex()
+        symbols.sync(parser.cache)
+        # names and abbreviations: "data.loader.batch_size" -> "dalobasi"
+        queries = [k.rpartition(".")[2] for k in keys] + [
+            "".join(s[:2] for s in k.replace("_", ".").split(".")) for k in keys
+        ]
+        results["workspace_symbol"] = measure(
+            lambda: [symbols.search(q) for q in queries], len(queries), repeat
+        )
+
+        ls = BenchServer(context)
+        intel = HydraIntel(ls)
+
+        definitions = rng.sample(
+            sorted(context.definitions), min(SAMPLE_SIZE, len(context.definitions))
+        )
+        hovers = []
+        for key in definitions:
+            loc = context.definitions[key]
+            hovers.append(
+                lsp_types.HoverParams(
+                    text_document=lsp_types.TextDocumentIdentifier(uri=loc.uri),
+                    position=loc.range.start,
+                )
+            )
+        results["hover"] = measure(
+            lambda: [intel.get_hover(p, context) for p in hovers], len(hovers), repeat
+        )
+
+        references = get_reference_params(ls, context, rng)
+        if references:
+            results["references"] = measure(
+                lambda: [intel.get_references(p, context) for p in references],
+                len(references),
+                repeat,
+            )
+
+        def diagnostics():
+            # resolved values are memoized, start from scratch every time
+            context.resolver = Resolver(context)
+            intel.get_diagnostics(context, None)
+
+        results["diagnostics"] = measure(diagnostics, 1, repeat)
+
+    return results
+
+
+def get_reference_params(
+    ls: BenchServer, context: HydraContext, rng: random.Random
+) -> List[lsp_types.ReferenceParams]:
+    """Positions inside of the ${} of the sampled references"""
+    locations = [loc for locs in context.references.values() for loc in locs]
+    locations = rng.sample(locations, min(SAMPLE_SIZE, len(locations)))
+
+    params = []
+    for loc in locations:
+        start = loc.range.start
+        line = ls.workspace.get_text_document(loc.uri).lines[start.line]
+        params.append(
+            lsp_types.ReferenceParams(
+                text_document=lsp_types.TextDocumentIdentifier(uri=loc.uri),
+                position=lsp_types.Position(
+                    line=start.line, character=line.find("${", start.character) + 2
+                ),
+                context=lsp_types.ReferenceContext(include_declaration=False),
+            )
+        )
+
+    return params
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old: Dict, new: Dict) -> None:
+    print(f"{old['meta']['commit']} -> {new['meta']['commit']}")
+    for scale, results in new["results"].items():
+        for name, result in results.items():
+            previous = old["results"].get(scale, {}).get(name)
+            if previous is None or "median_us" not in result:
+                continue
+
+            ratio = result["median_us"] / previous["median_us"]
+            print(
+                f"{scale:>8} {name:<18} {previous['median_us']:12.1f} us "
+                f"-> {result['median_us']:12.1f} us  x{ratio:.2f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scales", nargs="+", choices=list(SCALES), default=["small", "medium"]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="save the results to this JSON file")
+    parser.add_argument("--compare", help="compare with the results from this file")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {
+            "commit": get_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": {},
+    }
+    for scale in args.scales:
+        print(f"Running {scale}...")
+        report["results"][scale] = run_scale(SCALES[scale], args.repeat)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
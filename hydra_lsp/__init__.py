@@ -1 +1,9 @@
-from .server import HydraLSP
+def __getattr__(name: str):
+    # the server (and lsprotocol with it) is only imported when it is used,
+    # e.g. the parser workers of the indexer never need it
+    if name == "HydraLSP":
+        from .server import HydraLSP
+
+        return HydraLSP
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
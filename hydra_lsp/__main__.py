@@ -1,23 +1,26 @@
 import argparse
 import inspect
 import logging
-from importlib import metadata
+import sys
 
-from hydra_lsp.server import server
+LOG_LEVELS = ["DEBUG", "INFO", "WARNING", "ERROR"]
 
-logging.basicConfig(
-    filename="/tmp/mylsp.log",
-    filemode="w",
-    format="[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s",
-    datefmt="%d/%b/%Y %H:%M:%S",
-    level=logging.DEBUG,
-)
-logging.getLogger("pygls.protocol").setLevel(logging.WARN)
+
+def setup_logging(level: str = "WARNING", filename: str | None = None) -> None:
+    # not done at import time: worker processes of the indexer import this module
+    # and would write to the log file too
+    logging.basicConfig(
+        filename=filename,
+        format="[%(asctime)s] %(levelname)s [%(name)s.%(funcName)s:%(lineno)d] %(message)s",
+        datefmt="%d/%b/%Y %H:%M:%S",
+        level=level,
+    )
+    if level != "DEBUG":
+        logging.getLogger("pygls").setLevel(logging.WARNING)
 
 
 def main() -> None:
     """Hydra-lsp entry point."""
-
     parser = argparse.ArgumentParser()
     parser.description = "Hydra Language Server Protocol implementation"
 
@@ -31,26 +34,101 @@ def main() -> None:
 
     parser.add_argument("--version", action="store_true", help="Print version and exit")
 
-    parser.add_argument("-v", action="store_true", help="Verbose output")
+    parser.add_argument(
+        "--log-level", choices=LOG_LEVELS, default="WARNING", help="Logging level"
+    )
+
+    parser.add_argument(
+        "--log-file", help="Write the log to this file (default: stderr)"
+    )
+
+    parser.add_argument(
+        "--trace-sample",
+        type=float,
+        default=0.0,
+        metavar="RATE",
+        help="Log this share (0-1) of the requests with their params and duration",
+    )
+
+    parser.add_argument(
+        "--profile",
+        metavar="DIR",
+        help="Profile the requests, cProfile stats per request type are saved to DIR",
+    )
+
+    parser.add_argument("-v", action="store_true", help="Verbose output (DEBUG level)")
+
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    check = commands.add_parser(
+        "check",
+        help="Check the configs without an editor (e.g. in CI), "
+        "exits with 1 if there are problems",
+    )
+    check.add_argument(
+        "paths",
+        nargs="+",
+        metavar="PATH",
+        help="Folders (their root configs are checked) or root config files",
+    )
+    check.add_argument(
+        "--format", choices=["json", "sarif"], default="json", help="Report format"
+    )
+    check.add_argument(
+        "--output", help="Write the report to this file (default: stdout)"
+    )
+    check.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        help="Number of worker processes (default: number of CPUs)",
+    )
+    check.add_argument(
+        "--cache",
+        metavar="FILE",
+        help="Keep the parsed files in this index between the runs",
+    )
 
     args = parser.parse_args()
 
     if args.version:
+        from importlib import metadata
+
         version = metadata.version("hydra-lsp")
         print(inspect.cleandoc(f"""HydraLSP v{version} """))
         return
 
-    if args.v:
-        logging.basicConfig(level=logging.DEBUG)
-        logging.getLogger("pygls.protocol").setLevel(logging.DEBUG)
+    setup_logging("DEBUG" if args.v else args.log_level, args.log_file)
+
+    if args.command == "check":
+        from hydra_lsp.check import main as check_main
+
+        sys.exit(
+            check_main(args.paths, args.format, args.output, args.workers, args.cache)
+        )
+
+    # the server is only built (and its dependencies imported) when it is started
+    from hydra_lsp.server import server
+
+    if args.trace_sample:
+        server.trace_sample = args.trace_sample
+        logging.getLogger("hydra_lsp.trace").setLevel(logging.INFO)
+
+    if args.profile:
+        from hydra_lsp.profiling import Profiler
+
+        server.profiler = Profiler(args.profile)
 
     logging.info("Starting hydra-lsp server")
-    if args.tcp:
-        logging.info(f"Starting TCP server on {args.host}:{args.port}")
-        server.start_tcp(args.host, args.port)
-    else:
-        logging.info("Starting stdio server")
-        server.start_io()
+    try:
+        if args.tcp:
+            logging.info(f"Starting TCP server on {args.host}:{args.port}")
+            server.start_tcp(args.host, args.port)
+        else:
+            logging.info("Starting stdio server")
+            server.start_io()
+    finally:
+        if server.profiler is not None:
+            server.profiler.dump()
 
 
 if __name__ == "__main__":
@@ -2,71 +2,349 @@ from __future__ import annotations
 
 import json
 import logging
+import os
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, List, Tuple
 
-import pygtrie
 from lsprotocol.types import (
     CompletionItem,
     CompletionItemKind,
     CompletionList,
     CompletionParams,
     MarkupContent,
+    Position,
+    Range,
+    TextEdit,
 )
 from pygls.server import LanguageServer
 
-from hydra_lsp.context import HydraContext
-from hydra_lsp.utils import to_markdown_content, yaml_get_var_prefix
+from hydra_lsp.context import Definitions, HydraContext
+from hydra_lsp.groups import GroupIndex
+from hydra_lsp.metrics import metrics
+from hydra_lsp.parser import get_folder, uri_to_path
+from hydra_lsp.targets import TARGET_KEY, Target, TargetIndex, format_signature
+from hydra_lsp.utils import (
+    KeyBlob,
+    is_subsequence,
+    to_markdown_content,
+    yaml_get_default_entry,
+    yaml_get_siblings,
+    yaml_get_target,
+    yaml_get_var_prefix,
+)
 
 logger = logging.getLogger(__name__)
 
+# how the key matched the typed prefix, lower is better
+MATCH_SEGMENT_PREFIX = 0  # data.lo -> data.loader
+MATCH_SEGMENT_FUZZY = 1  # data.ldr -> data.loader
+MATCH_NESTED = 2  # data.lo -> data.loader.batch_size
+MATCH_FUZZY = 3  # dtldr -> data.loader
+
+# a new key is typed: "  - lr<cursor>"
+KEY_PREFIX = re.compile(r"^\s*(?:-\s+)?\w*$")
+
+
+class CompletionIndex:
+    """
+    Index of the keys of a single context, it is never modified after it is built.
+    Keys are grouped by their parent path, so the next path segment is completed
+    without scanning all the keys.
+    """
+
+    __slots__ = ["definitions", "keys", "children", "_blob"]
+
+    def __init__(self, definitions: Definitions):
+        self.definitions = definitions
+        self.keys: List[str] = sorted(definitions)
+        self.children: Dict[str, List[str]] = defaultdict(list)
+        for key in self.keys:
+            self.children[key.rpartition(".")[0]].append(key)
+
+        # all keys in a single string, built on the first fuzzy search
+        self._blob: KeyBlob | None = None
+
+    def search(
+        self, prefix: str, uri: str | None = None, limit: int = 100
+    ) -> Tuple[List[str], bool]:
+        """
+        Find the keys matching the prefix, returns at most ``limit`` keys
+        (best first) and whether there are more matches.
+        Keys are ranked by the kind of match, depth and whether they are defined
+        in the current document (``uri``).
+        """
+        # (kind, key); collecting stops a bit after the limit, the rest is dropped
+        matches: List[Tuple[int, str]] = []
+        budget = limit * 4
+
+        parent, _, partial = prefix.rpartition(".")
+        children = self.children.get(parent, [])
+
+        # children are sorted, the ones starting with the prefix form a range
+        i = bisect_left(children, prefix)
+        end = bisect_right(children, prefix + "\U0010ffff", i)
+        matches.extend(
+            (MATCH_SEGMENT_PREFIX, key) for key in children[i : min(end, i + budget)]
+        )
+        truncated = end - i > budget
+
+        if partial and len(matches) < limit:
+            start = len(parent) + 1 if parent else 0
+            query = partial.lower()
+            matches.extend(
+                (MATCH_SEGMENT_FUZZY, key)
+                for key in children[:i] + children[end:]
+                if is_subsequence(query, key[start:].lower())
+            )
+
+        depth = prefix.count(".")
+        i = bisect_left(self.keys, prefix)
+        end = bisect_right(self.keys, prefix + "\U0010ffff", i)
+        for key in self.keys[i : min(end, i + budget)]:
+            if key.count(".") > depth:
+                matches.append((MATCH_NESTED, key))
+
+        truncated = truncated or end - i > budget
+        if not matches and prefix:
+            fuzzy, truncated = self._fuzzy(prefix, budget)
+            matches = [(MATCH_FUZZY, key) for key in fuzzy]
+
+        matches.sort(key=lambda m: self._rank(m[0], m[1], uri))
+        keys = [key for _, key in matches[:limit]]
+
+        return keys, truncated or len(matches) > limit
+
+    def _rank(self, kind: int, key: str, uri: str | None) -> Tuple:
+        location = self.definitions.get(key)
+        elsewhere = uri is None or location is None or location.uri != uri
+        return (kind, key.count("."), elsewhere, len(key), key)
+
+    def _fuzzy(self, query: str, budget: int) -> Tuple[List[str], bool]:
+        """Keys containing the query as a subsequence"""
+        if self._blob is None:
+            self._blob = KeyBlob(self.keys)
+
+        found, truncated = self._blob.search(query, budget)
+        return [self.keys[i] for i in found], truncated
+
 
 class Completer:
     """
-    Simple prefix-tree based completer
+    Completer of the context keys (inside of ${}),
+    of the config groups and their options (in the ``defaults`` list)
+    and of the ``_target_`` values and their arguments.
+    Items are returned without documentation, it is added on completionItem/resolve
     """
 
-    __slots__ = ["context", "trie"]
+    # at most this many items are returned, the list is marked incomplete otherwise
+    MAX_ITEMS: int = 100
+
+    __slots__ = ["context", "index"]
 
     def __init__(self):
         self.context = None
-        self.trie = pygtrie.CharTrie()
+        self.index = CompletionIndex({})
+
+    @staticmethod
+    def build_index(context: HydraContext) -> CompletionIndex:
+        """
+        Index the keys of the context, once: the server builds it in the parser
+        thread together with the context, so completions never wait for it
+        """
+        if context.completion_index is None:
+            with metrics.timer("phase.completion_index"):
+                context.completion_index = CompletionIndex(context.definitions)
+
+        return context.completion_index
 
     def update(self, context: HydraContext):
-        self.context = context
-        self.trie.update(context.definitions)
+        self.context, self.index = context, self.build_index(context)
 
-    def get_completions(self, ls: LanguageServer, params: CompletionParams):
+    def get_completions(
+        self,
+        ls: LanguageServer,
+        params: CompletionParams,
+        context: HydraContext | None,
+    ):
         uri = params.text_document.uri
-        logger.info(f"Completion requested: {uri} at {params.position}")
+        logger.debug("Completion requested: %s at %s", uri, params.position)
+
+        if context is None:
+            return CompletionList(is_incomplete=False, items=[])
+
+        # the index is built for the context of the last completed document
+        if context is not self.context:
+            self.update(context)
 
         document = ls.workspace.get_document(uri)
         position = params.position
         current_line = document.lines[position.line]
 
         prefix = yaml_get_var_prefix(current_line, position.character)
-        return self.complete(prefix)
+        if prefix is None:
+            entry = yaml_get_default_entry(
+                document.lines, position.line, position.character
+            )
+            if entry is not None:
+                groups = ls.config_loaded.groups
+                return self.complete_group(*entry, uri, groups)
+
+        return self.complete(prefix, uri)
 
-    def complete(self, prefix: str | None) -> CompletionList:
+    def get_target_completions(
+        self, ls: LanguageServer, params: CompletionParams, targets: TargetIndex
+    ) -> CompletionList | None:
+        """
+        Classes and functions for the ``_target_`` value, parameters of the target
+        for a new key next to ``_target_``; None anywhere else
+        """
+        document = ls.workspace.get_document(params.text_document.uri)
+        position = params.position
+        current_line = document.lines[position.line]
+
+        value = yaml_get_target(current_line)
+        if value is not None:
+            start = value[0]
+            if position.character < start:
+                return None
+
+            prefix = current_line[start : position.character]
+            return self.complete_target(prefix, position.line, start, targets)
+
+        if KEY_PREFIX.match(current_line[: position.character]) is None:
+            return None
+
+        siblings = yaml_get_siblings(document.lines, position.line)
+        name = siblings.get(TARGET_KEY)
+        target = targets.get(name.strip("\"'")) if name else None
+        if target is None:
+            return None
+
+        return self.complete_arguments(target, siblings, targets)
+
+    def complete_target(
+        self, prefix: str, line: int, start: int, targets: TargetIndex
+    ) -> CompletionList:
+        """Dotted names starting with the prefix, the whole typed name is replaced"""
+        names, is_incomplete = targets.complete(prefix, self.MAX_ITEMS)
+        edit_range = Range(
+            start=Position(line=line, character=start),
+            end=Position(line=line, character=start + len(prefix)),
+        )
+
+        items = []
+        for name in names:
+            target = targets.get(name)
+            if target is None:
+                continue
+
+            kind = (
+                CompletionItemKind.Class
+                if target.kind == "class"
+                else CompletionItemKind.Function
+            )
+            items.append(
+                CompletionItem(
+                    label=name,
+                    kind=kind,
+                    detail=format_signature(target, targets.get_params(target)),
+                    text_edit=TextEdit(range=edit_range, new_text=name),
+                )
+            )
+
+        return CompletionList(is_incomplete=is_incomplete, items=items)
+
+    def complete_arguments(
+        self, target: Target, siblings: Dict[str, str], targets: TargetIndex
+    ) -> CompletionList:
+        """Parameters of the target which are not in the mapping yet, in their order"""
+        items = [
+            CompletionItem(
+                label=param.name,
+                kind=CompletionItemKind.Property,
+                detail=str(param),
+                insert_text=f"{param.name}: ",
+                sort_text=f"{i:05d}",
+            )
+            for i, param in enumerate(targets.get_params(target))
+            if not param.kind and param.name not in siblings
+        ]
+        return CompletionList(is_incomplete=False, items=items)
+
+    def complete_group(
+        self, group: str, option: str | None, uri: str, groups: GroupIndex
+    ) -> CompletionList:
+        """
+        Options of the group (after "group:") or the groups (before it),
+        groups are relative to the folder of the document, absolute ones (/db)
+        to the folder of the root config. Folders are listed by the GroupIndex once.
+        """
+        if group.startswith("/") and self.context is not None and self.context.files:
+            base = get_folder(self.context.files[-1])
+        else:
+            base = get_folder(uri)
+
+        if option is None:
+            parent = group.rpartition("/")[0]
+            folder = os.path.join(uri_to_path(base), parent.lstrip("/"))
+            labels = [
+                (f"{parent}/{name}" if parent else name, CompletionItemKind.Module)
+                for name in groups.groups(folder)
+            ]
+            labels.extend(
+                (f"{parent}/{name}" if parent else name, CompletionItemKind.File)
+                for name in groups.options(folder)
+            )
+            prefix = group
+        else:
+            folder = os.path.join(uri_to_path(base), group.lstrip("/"))
+            labels = [
+                (name, CompletionItemKind.EnumMember) for name in groups.options(folder)
+            ]
+            prefix = option
+
+        items = [
+            CompletionItem(label=label, kind=kind)
+            for label, kind in labels
+            if label.startswith(prefix)
+        ]
+        return CompletionList(is_incomplete=False, items=items)
+
+    def complete(self, prefix: str | None, uri: str | None = None) -> CompletionList:
         if prefix is None:
             return CompletionList(is_incomplete=False, items=[])
 
-        try:
-            keys = self.trie.keys(prefix)
-        except KeyError:
-            keys = []
+        keys, is_incomplete = self.index.search(prefix, uri, self.MAX_ITEMS)
+        has_files = self.context is not None and self.context.files
+        root = self.context.files[-1] if has_files else None
 
         items = [
             CompletionItem(
                 label=k,
                 kind=CompletionItemKind.Variable,
-                documentation=self._get_docstring(k),
+                sort_text=f"{i:05d}",
+                data={"key": k, "root": root},
             )
-            for k in keys
+            for i, k in enumerate(keys)
         ]
 
-        return CompletionList(is_incomplete=False, items=items)
+        return CompletionList(is_incomplete=is_incomplete, items=items)
+
+    def resolve(
+        self, item: CompletionItem, context: HydraContext | None
+    ) -> CompletionItem:
+        """Add the documentation (value of the key) to the completion item"""
+        key = (item.data or {}).get("key")
+        if context is None or key is None:
+            return item
+
+        item.documentation = self._get_docstring(key, context)
+        return item
 
-    def _get_docstring(self, key: str) -> MarkupContent:
-        value = str(self.context.get(key))
+    def _get_docstring(self, key: str, context: HydraContext) -> MarkupContent:
+        value = str(context.resolve(key))
 
         s = json.dumps({key: value}, indent=2)[1:-1]
         result = to_markdown_content(s)
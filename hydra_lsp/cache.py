@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import sys
+from collections import OrderedDict, defaultdict
+from typing import Callable, Dict, FrozenSet, Hashable, List, Tuple
+
+from hydra_lsp.context import Definitions, HydraContext, KeyIndex, Loc, References
+from hydra_lsp.groups import DefaultEntry
+
+logger = logging.getLogger(__name__)
+
+# bump it whenever the serialized format of ParsedFile changes
+INDEX_VERSION = 9
+
+
+class ParsedFile:
+    """
+    Everything extracted from a single YAML file.
+    It does not depend on the config it was included from, so it can be reused
+    between reloads as long as the file itself did not change.
+    """
+
+    __slots__ = [
+        "uri",
+        "stamp",
+        "digest",
+        "data",
+        "definitions",
+        "references",
+        "owners",
+        "includes",
+        "defaults",
+        "package",
+        "skip_lines",
+        "interpolations",
+        "key_index",
+        "tokens",
+        "error",
+    ]
+
+    def __init__(
+        self,
+        uri: str,
+        stamp: Hashable,
+        data: Dict,
+        definitions: Definitions | None = None,
+        references: References | None = None,
+        includes: List[str] | None = None,
+        skip_lines: FrozenSet[int] = frozenset(),
+        defaults: List[DefaultEntry] | None = None,
+        package: str | None = None,
+        digest: bytes | None = None,
+    ):
+        self.uri = uri
+        self.stamp = stamp
+        # hash of the content, the entry is still valid if only the stamp changed
+        self.digest = digest
+        self.data = data
+        self.definitions: Definitions = definitions if definitions is not None else {}
+        self.references: References = (
+            references if references is not None else defaultdict(list)
+        )
+        # relative reference -> the keys whose values contain it, one for every
+        # location in ``references`` (${.b} in "x.a" refers to "x.b")
+        self.owners: Dict[str, List[str]] = {}
+        # URIs of the files from the ``defaults`` list (relative to the file,
+        # the ones actually included are known after the config is composed)
+        self.includes: List[str] = includes if includes is not None else []
+        # parsed ``defaults`` list
+        self.defaults: List[DefaultEntry] = defaults if defaults is not None else []
+        # from the "# @package" header
+        self.package = package
+        # lines marked with "# hydra: skip", no diagnostics are reported for them
+        self.skip_lines = skip_lines
+        # (packed start, length, reference, key of the value) of every ${}
+        self.interpolations: List[Tuple[int, int, str, str]] = []
+        # built on demand, see get_key_index
+        self.key_index: KeyIndex | None = None
+        # semantic tokens, built on demand, see hydra_lsp.semantic
+        self.tokens: List[Tuple[int, int, int, str, str]] | None = None
+        # (line, column, message) of the YAML error, the file is empty then
+        self.error: Tuple[int, int, str] | None = None
+
+    def get_key_index(self) -> KeyIndex:
+        """Index of the locations of the keys, it is not pickled"""
+        if self.key_index is None:
+            self.key_index = KeyIndex(self.definitions.items())
+
+        return self.key_index
+
+    def __getstate__(self):
+        """
+        Compact form used by pickle (worker processes and the on-disk index):
+        locations are stored as (start, end) pairs without repeating the URI
+        """
+        definitions = {k: (loc.start, loc.end) for k, loc in self.definitions.items()}
+        references = {
+            var: [(loc.start, loc.end) for loc in locations]
+            for var, locations in self.references.items()
+        }
+        return (
+            self.uri,
+            self.stamp,
+            self.digest,
+            self.data,
+            definitions,
+            references,
+            self.owners,
+            self.includes,
+            self.skip_lines,
+            self.defaults,
+            self.package,
+            self.interpolations,
+            self.error,
+        )
+
+    def __setstate__(self, state):
+        (
+            uri,
+            stamp,
+            digest,
+            data,
+            definitions,
+            references,
+            owners,
+            includes,
+            skip_lines,
+            defaults,
+            package,
+            interpolations,
+            error,
+        ) = state
+        self.uri = uri
+        self.stamp = stamp
+        self.digest = digest
+        self.data = data
+        uri = sys.intern(uri)
+        self.definitions = {
+            sys.intern(k): Loc(uri, start, end)
+            for k, (start, end) in definitions.items()
+        }
+        self.references = defaultdict(list)
+        for var, ranges in references.items():
+            self.references[var] = [Loc(uri, start, end) for start, end in ranges]
+        self.owners = owners
+        self.includes = includes
+        self.skip_lines = skip_lines
+        self.defaults = defaults
+        self.package = package
+        self.interpolations = interpolations
+        self.error = error
+        self.key_index = None
+        self.tokens = None
+
+
+class FileCache:
+    """
+    Maps a file URI to its ParsedFile.
+    An entry is only valid while its stamp (document version, mtime or content
+    hash) matches the current one, or its content did not change (see revalidate).
+    """
+
+    __slots__ = ["files", "version", "hits", "misses", "revalidated"]
+
+    def __init__(self):
+        self.files: Dict[str, ParsedFile] = {}
+        # bumped whenever an entry is added or removed
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+
+    def __contains__(self, uri: str) -> bool:
+        return uri in self.files
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def get(self, uri: str, stamp: Hashable) -> ParsedFile | None:
+        parsed = self.files.get(uri)
+        if parsed is None or stamp is None or parsed.stamp != stamp:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return parsed
+
+    def revalidate(self, uri: str, stamp: Hashable, digest: bytes) -> ParsedFile | None:
+        """
+        Get the entry whose stamp is outdated but whose content is the same,
+        it gets the new stamp
+        """
+        parsed = self.files.get(uri)
+        if parsed is None or stamp is None or parsed.digest != digest:
+            return None
+
+        self.revalidated += 1
+        parsed.stamp = stamp
+        return parsed
+
+    def put(self, parsed: ParsedFile) -> None:
+        self.files[parsed.uri] = parsed
+        self.version += 1
+
+    def invalidate(self, uri: str) -> None:
+        if self.files.pop(uri, None) is not None:
+            self.version += 1
+
+    def clear(self) -> None:
+        self.files.clear()
+        self.version += 1
+
+    def save(self, path: str, get_stamp: Callable[[str], Hashable]) -> int:
+        """
+        Write the index to disk, returns the number of saved files.
+        Only the entries which match the file on disk (``get_stamp``) are saved,
+        unsaved editor changes are skipped.
+        """
+        files = [
+            parsed
+            for parsed in self.files.values()
+            if parsed.stamp is not None and parsed.stamp == get_stamp(parsed.uri)
+        ]
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            # the version is a separate pickle, so it is checked before the files
+            # (whose format depends on it) are unpickled
+            pickle.dump(INDEX_VERSION, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(files, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        logger.info(f"Saved {len(files)} files to the index {path}")
+        return len(files)
+
+    def load(self, path: str, get_stamp: Callable[[str], Hashable]) -> List[ParsedFile]:
+        """
+        Read the index from disk, returns the loaded files.
+        Only the entries whose files did not change since (``get_stamp``) are loaded.
+        """
+        try:
+            with open(path, "rb") as f:
+                version = pickle.load(f)
+                if version != INDEX_VERSION:
+                    logger.info(f"Index {path} has an outdated format, ignoring it")
+                    return []
+
+                files = pickle.load(f)
+        except FileNotFoundError:
+            return []
+        except Exception as e:
+            logger.error(f"Can't read the index {path}: {e}")
+            return []
+
+        result = [parsed for parsed in files if parsed.stamp == get_stamp(parsed.uri)]
+        for parsed in result:
+            self.put(parsed)
+
+        logger.info(f"Loaded {len(result)} of {len(files)} files from the index {path}")
+
+        return result
+
+
+class ContextCache:
+    """
+    LRU cache of composed contexts keyed by the root config.
+    Least recently used contexts are evicted when there are more than
+    ``max_contexts`` of them or their total size exceeds ``memory_budget``.
+    """
+
+    __slots__ = ["contexts", "max_contexts", "memory_budget", "hits", "misses"]
+
+    def __init__(self, max_contexts: int = 16, memory_budget: int = 2_000_000):
+        self.contexts: OrderedDict[str, HydraContext] = OrderedDict()
+        self.max_contexts = max_contexts
+        self.memory_budget = memory_budget
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, root: str) -> bool:
+        return root in self.contexts
+
+    def __len__(self) -> int:
+        return len(self.contexts)
+
+    def roots(self) -> List[str]:
+        return list(self.contexts)
+
+    def get(self, root: str) -> HydraContext | None:
+        context = self.contexts.get(root)
+        if context is not None:
+            self.contexts.move_to_end(root)
+
+        return context
+
+    def put(self, root: str, context: HydraContext) -> None:
+        self.contexts[root] = context
+        self.contexts.move_to_end(root)
+        self._evict()
+
+    def invalidate(self, root: str) -> None:
+        self.contexts.pop(root, None)
+
+    def clear(self) -> None:
+        self.contexts.clear()
+
+    def find_owner(self, uri: str) -> HydraContext | None:
+        """
+        Get the context the document belongs to:
+        the one where it is the root config, otherwise the most recently used
+        context which includes it.
+        """
+        if uri in self.contexts:
+            self.hits += 1
+            return self.get(uri)
+
+        for root in reversed(self.contexts):
+            if uri in self.contexts[root].files:
+                self.hits += 1
+                return self.get(root)
+
+        self.misses += 1
+        return None
+
+    def owners(self) -> Dict[str, HydraContext]:
+        """Map every file of the cached contexts to its context, like find_owner"""
+        owners = {}
+        for context in self.contexts.values():
+            owners.update(dict.fromkeys(context.files, context))
+        owners.update(self.contexts)
+
+        return owners
+
+    def _evict(self) -> None:
+        total = sum(context.size for context in self.contexts.values())
+
+        # the most recently used context is always kept
+        while len(self.contexts) > 1 and (
+            len(self.contexts) > self.max_contexts or total > self.memory_budget
+        ):
+            root, context = self.contexts.popitem(last=False)
+            total -= context.size
+            logger.info(f"Context of {root} is evicted")
@@ -0,0 +1,353 @@
+"""
+Headless batch check of config trees (``hydra-lsp check``), e.g. in CI.
+Reports the same problems as the editor diagnostics for every root config.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from hydra_lsp.cache import ParsedFile
+from hydra_lsp.context import Loc
+from hydra_lsp.parser import ConfigParser, get_file_stamp, get_folder, parse_files
+from hydra_lsp.utils import chunks, discover_yaml_files
+
+logger = logging.getLogger(__name__)
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+RULE_UNDEFINED = "undefined-interpolation"
+RULE_UNRESOLVED = "unresolved-interpolation"
+RULE_UNREADABLE = "unreadable-config"
+RULE_MISSING = "missing-config"
+
+RULES = {
+    RULE_UNDEFINED: "The interpolation refers to a key which is not defined",
+    RULE_UNRESOLVED: "The interpolation is circular or refers to an undefined key",
+    RULE_UNREADABLE: "The config can't be read",
+    RULE_MISSING: "A config from the defaults list does not exist",
+}
+
+# files (or root configs) handed to a worker process at once
+CHUNK_SIZE = 32
+
+# the parser of a worker process, its cache is warmed up by _init_worker
+_parser: ConfigParser | None = None
+
+
+class Problem:
+    """A problem found in a file while checking the ``root`` config"""
+
+    __slots__ = ["uri", "root", "start", "end", "message", "rule"]
+
+    def __init__(
+        self,
+        uri: str,
+        root: str,
+        start: Tuple[int, int],
+        end: Tuple[int, int],
+        message: str,
+        rule: str,
+    ):
+        self.uri = uri
+        self.root = root
+        # zero-based (line, character)
+        self.start = start
+        self.end = end
+        self.message = message
+        self.rule = rule
+
+    @property
+    def key(self) -> Tuple:
+        """Same problems found through different roots are reported once"""
+        return (self.uri, self.start, self.end, self.message)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "file": self.uri,
+            "root": self.root,
+            "line": self.start[0] + 1,
+            "column": self.start[1] + 1,
+            "end_line": self.end[0] + 1,
+            "end_column": self.end[1] + 1,
+            "rule": self.rule,
+            "message": self.message,
+        }
+
+
+def _init_worker(files: List[ParsedFile]) -> None:
+    global _parser
+    _parser = ConfigParser()
+    for parsed in files:
+        _parser.add_parsed_file(parsed)
+
+
+def get_span(loc: Loc | None) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """Start and end (line, character) of the location, the file start if none"""
+    if loc is None:
+        return (0, 0), (0, 0)
+
+    start = (loc.start_line, loc.start & 0xFFFFFFFF)
+    end = (loc.end_line, loc.end & 0xFFFFFFFF)
+    return start, end
+
+
+def check_roots(roots: List[str], parser: ConfigParser | None = None) -> List[Problem]:
+    """Compose the root configs and collect the problems of all their files"""
+    parser = parser or _parser or ConfigParser()
+
+    problems = []
+    for root in roots:
+        try:
+            context = parser.load(root)
+        except (OSError, UnicodeDecodeError) as e:
+            problems.append(
+                Problem(root, root, (0, 0), (0, 0), str(e), RULE_UNREADABLE)
+            )
+            continue
+
+        for uri, parsed in context.parsed_files.items():
+            if parsed.error is not None:
+                line, column, message = parsed.error
+                position = (line, column)
+                problems.append(
+                    Problem(uri, root, position, position, message, RULE_UNREADABLE)
+                )
+
+            # the entries of the defaults list have no locations, their key has
+            for missing in context.missing.get(uri, []):
+                message = f"Config {missing} from the defaults list is missing"
+                start, end = get_span(parsed.definitions.get("defaults"))
+                problems.append(Problem(uri, root, start, end, message, RULE_MISSING))
+
+            for loc, message in context.get_problems(uri):
+                unresolved = "can't be resolved" in message
+                rule = RULE_UNRESOLVED if unresolved else RULE_UNDEFINED
+                start, end = get_span(loc)
+                problems.append(Problem(uri, root, start, end, message, rule))
+
+    return problems
+
+
+def get_group_folders(parser: ConfigParser) -> Tuple[Set[str], Set[str]]:
+    """
+    Folders used as config groups by the ``defaults`` lists of the parsed files
+    and the absolute groups (/db), their folders depend on the root config
+    """
+    folders, absolute = set(), set()
+    for parsed in parser.cache.files.values():
+        folder = get_folder(parsed.uri)
+        for entry in parsed.defaults:
+            if entry.group is None:
+                continue
+
+            if entry.group.startswith("/"):
+                absolute.add(entry.group.strip("/"))
+            else:
+                folders.add(os.path.normpath(os.path.join(folder, entry.group)))
+
+    return folders, absolute
+
+
+def get_absolute_includes(parser: ConfigParser) -> Set[str]:
+    """
+    Configs included by an absolute path (/common/base), relative to the root
+    config, so they are not in the dependency graph
+    """
+    return {
+        f"{entry.options[0].strip('/')}.yaml"
+        for parsed in parser.cache.files.values()
+        for entry in parsed.defaults
+        if entry.group is None and entry.options[0].startswith("/")
+    }
+
+
+def find_roots(parser: ConfigParser, files: Iterable[str]) -> List[str]:
+    """
+    Files which are not included by any other file (through ``defaults``) and
+    are not options of a config group: the options which are not selected
+    anywhere are only valid as a part of a primary config
+    """
+    folders, absolute = get_group_folders(parser)
+    absolute_includes = get_absolute_includes(parser)
+
+    def is_option(uri: str) -> bool:
+        folder = os.path.normpath(get_folder(uri))
+        return folder in folders or any(
+            folder.endswith(f"/{group}") for group in absolute
+        )
+
+    def is_included(uri: str) -> bool:
+        path = os.path.normpath(uri)
+        return bool(parser.graph.included_by.get(uri)) or any(
+            path.endswith(f"/{include}") for include in absolute_includes
+        )
+
+    return [uri for uri in files if not is_included(uri) and not is_option(uri)]
+
+
+class Checker:
+    """
+    Checks the configs in two parallel passes:
+        1. every file is parsed once, on a process pool
+        2. the root configs are composed and checked on a process pool,
+           every worker gets all the parsed files, so nothing is parsed twice
+    Small trees (at most CHUNK_SIZE files) are checked in the current process.
+    """
+
+    __slots__ = ["parser", "workers", "cache_path", "stats"]
+
+    def __init__(self, workers: int | None = None, cache_path: str | None = None):
+        self.parser = ConfigParser()
+        self.workers = workers or os.cpu_count() or 1
+        # on-disk index shared between runs (see ConfigParser.save_index)
+        self.cache_path = cache_path
+        self.stats: Dict[str, Any] = {}
+
+    def _pool(self, **kwargs) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, **kwargs)
+
+    def parse(self, files: List[str]) -> None:
+        if self.cache_path:
+            self.parser.load_index(self.cache_path)
+
+        stale = [
+            uri
+            for uri in files
+            if self.parser.cache.get(uri, get_file_stamp(None, uri)) is None
+        ]
+        if self.workers > 1 and len(stale) > CHUNK_SIZE:
+            with self._pool() as pool:
+                for parsed_files in pool.map(parse_files, chunks(stale, CHUNK_SIZE)):
+                    for parsed in parsed_files:
+                        self.parser.add_parsed_file(parsed)
+        else:
+            for parsed in parse_files(stale):
+                self.parser.add_parsed_file(parsed)
+
+        # files loaded from the index are in the graph already
+        self.stats["parsed"] = len(stale)
+
+        if self.cache_path and stale:
+            self.parser.save_index(self.cache_path)
+
+    def compose(self, roots: List[str]) -> List[Problem]:
+        if self.workers == 1 or len(roots) <= CHUNK_SIZE:
+            return check_roots(roots, self.parser)
+
+        files = list(self.parser.cache.files.values())
+        with self._pool(initializer=_init_worker, initargs=(files,)) as pool:
+            results = pool.map(check_roots, chunks(roots, CHUNK_SIZE))
+            return [problem for problems in results for problem in problems]
+
+    def run(self, paths: List[str]) -> List[Problem]:
+        """
+        Check the configs: folders are searched for YAML files and their root
+        configs are checked, files are always checked as roots
+        """
+        start = time.perf_counter()
+
+        folders = [path for path in paths if os.path.isdir(path)]
+        explicit = [path for path in paths if not os.path.isdir(path)]
+        files = discover_yaml_files(folders)
+
+        self.parse(files + explicit)
+        roots = list(dict.fromkeys(explicit + find_roots(self.parser, files)))
+        logger.info(f"Checking {len(roots)} root configs of {len(files)} files")
+
+        unique: Dict[Tuple, Problem] = {}
+        for problem in self.compose(roots):
+            unique.setdefault(problem.key, problem)
+
+        problems = sorted(unique.values(), key=lambda p: (p.uri, p.start, p.message))
+        self.stats.update(
+            files=len(files) + len(explicit),
+            roots=len(roots),
+            problems=len(problems),
+            seconds=round(time.perf_counter() - start, 3),
+        )
+
+        return problems
+
+
+def to_json(problems: List[Problem], stats: Dict[str, Any]) -> Dict[str, Any]:
+    return {"stats": stats, "problems": [p.to_dict() for p in problems]}
+
+
+def to_sarif(problems: List[Problem], version: str) -> Dict[str, Any]:
+    """SARIF 2.1.0 log, e.g. for GitHub code scanning"""
+    results = [
+        {
+            "ruleId": problem.rule,
+            "level": "error",
+            "message": {"text": problem.message},
+            "locations": [
+                {
+                    "physicalLocation": {
+                        "artifactLocation": {"uri": os.path.relpath(problem.uri)},
+                        "region": {
+                            "startLine": problem.start[0] + 1,
+                            "startColumn": problem.start[1] + 1,
+                            "endLine": problem.end[0] + 1,
+                            "endColumn": problem.end[1] + 1,
+                        },
+                    }
+                }
+            ],
+        }
+        for problem in problems
+    ]
+    rules = [
+        {"id": rule, "shortDescription": {"text": description}}
+        for rule, description in RULES.items()
+    ]
+
+    return {
+        "$schema": SARIF_SCHEMA,
+        "version": "2.1.0",
+        "runs": [
+            {
+                "tool": {
+                    "driver": {"name": "hydra-lsp", "version": version, "rules": rules}
+                },
+                "results": results,
+            }
+        ],
+    }
+
+
+def main(
+    paths: List[str],
+    output_format: str = "json",
+    output: str | None = None,
+    workers: int | None = None,
+    cache_path: str | None = None,
+) -> int:
+    """Run the check and write the report, returns the exit code"""
+    checker = Checker(workers, cache_path)
+    problems = checker.run(paths)
+
+    if output_format == "sarif":
+        from importlib import metadata
+
+        report = to_sarif(problems, metadata.version("hydra-lsp"))
+    else:
+        report = to_json(problems, checker.stats)
+
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    logger.info(
+        f"Found {len(problems)} problems in {checker.stats['roots']} root configs "
+        f"in {checker.stats['seconds']} s"
+    )
+
+    return 1 if problems else 0
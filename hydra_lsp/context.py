@@ -1,98 +1,385 @@
 from __future__ import annotations
 
+import hashlib
 import logging
+import sys
+from array import array
+from bisect import bisect_right
 from collections import defaultdict
-from typing import DefaultDict, Dict, List
+from itertools import accumulate
+from typing import TYPE_CHECKING, Any, DefaultDict, Dict, Iterable, List, Tuple
 
-from intervaltree import Interval, IntervalTree
-from lsprotocol import types as lsp_types
+from hydra_lsp.resolver import Resolver, get_absolute_key, is_custom_resolver
+
+if TYPE_CHECKING:
+    from lsprotocol import types as lsp_types
+
+    from hydra_lsp.autocomplete import CompletionIndex
+    from hydra_lsp.cache import ParsedFile
 
 logger = logging.getLogger(__name__)
 
 
-References = DefaultDict[str, List[lsp_types.Location]]
-Definitions = Dict[str, lsp_types.Location]
-LocationToDefinition = Dict[lsp_types.Location, str]
+def flatten(config: Dict) -> Dict[str, Any]:
+    """
+    Map the path of every node of the config to its value (a subtree for
+    mappings and sequences), sequence items are addressed by their index:
+        {"a": {"b": [1]}} -> {"a": {"b": [1]}, "a.b": [1], "a.b.0": 1}
+    Paths are interned, so they share the strings of the definitions.
+    """
+    values: Dict[str, Any] = {}
+    stack = [(sys.intern(str(k)), v) for k, v in config.items()]
+    while stack:
+        path, value = stack.pop()
+        values[path] = value
+
+        if isinstance(value, dict):
+            items = value.items()
+        elif isinstance(value, list):
+            items = enumerate(value)
+        else:
+            continue
+
+        stack.extend((sys.intern(f"{path}.{k}"), v) for k, v in items)
+
+    return values
+
+
+def pack_position(line: int, character: int) -> int:
+    """(line, character) as a single int which keeps the order of positions"""
+    return line << 32 | character
+
+
+def unpack_position(position: int) -> lsp_types.Position:
+    # lsprotocol is heavy to import and the parser workers never need it
+    from lsprotocol import types as lsp_types
+
+    return lsp_types.Position(line=position >> 32, character=position & 0xFFFFFFFF)
+
+
+class Loc:
+    """
+    Compact location of a key or a reference: interned URI and packed
+    start and end positions (see pack_position).
+    LSP objects are only created when they are returned to the client.
+    """
+
+    __slots__ = ["uri", "start", "end"]
+
+    def __init__(self, uri: str, start: int, end: int):
+        self.uri = sys.intern(uri)
+        self.start = start
+        self.end = end
+
+    @property
+    def start_line(self) -> int:
+        return self.start >> 32
+
+    @property
+    def end_line(self) -> int:
+        return self.end >> 32
+
+    @property
+    def range(self) -> lsp_types.Range:
+        from lsprotocol import types as lsp_types
+
+        return lsp_types.Range(
+            start=unpack_position(self.start), end=unpack_position(self.end)
+        )
+
+    def to_lsp(self) -> lsp_types.Location:
+        from lsprotocol import types as lsp_types
+
+        return lsp_types.Location(uri=self.uri, range=self.range)
+
+    def __eq__(self, other) -> bool:
+        return (
+            isinstance(other, Loc)
+            and self.start == other.start
+            and self.end == other.end
+            and self.uri == other.uri
+        )
+
+    def __hash__(self) -> int:
+        return hash((self.uri, self.start, self.end))
+
+    def __repr__(self) -> str:
+        r = self.range
+        return (
+            f"Loc({self.uri}, {r.start.line}:{r.start.character}"
+            f"-{r.end.line}:{r.end.character})"
+        )
+
+
+References = DefaultDict[str, List[Loc]]
+Definitions = Dict[str, Loc]
+
+
+class KeyIndex:
+    """
+    Locations of the keys of a single file: parallel arrays of packed
+    (line, character) offsets sorted by start, searched with bisect.
+    Ranges are half-open, when they are nested the innermost key is found.
+    """
+
+    __slots__ = ["starts", "ends", "max_ends", "keys"]
+
+    def __init__(self, items: Iterable[Tuple[str, Loc]] = ()):
+        entries = [(loc.start, loc.end, key) for key, loc in items]
+        # among ranges with the same start the shortest one is the last
+        entries.sort(key=lambda e: (e[0], -e[1]))
+
+        self.starts = array("Q", [e[0] for e in entries])
+        self.ends = array("Q", [e[1] for e in entries])
+        # max_ends[i] - the largest end of the first i + 1 ranges,
+        # no range before i contains a position past it
+        self.max_ends = array("Q", accumulate(self.ends, max))
+        self.keys: List[str] = [e[2] for e in entries]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def find(self, line: int, character: int) -> str | None:
+        position = pack_position(line, character)
+
+        i = bisect_right(self.starts, position) - 1
+        while i >= 0 and self.max_ends[i] > position:
+            if self.ends[i] > position:
+                return self.keys[i]
+            i -= 1
+
+        return None
 
 
 class LocationKeyMap:
     """
-    Build an interval tree to map a location to a key.
+    Map a location to a key, one KeyIndex per file.
     Also allows to find a key by non-exact location
     """
 
-    __slots__ = ["file_to_tree"]
+    __slots__ = ["file_to_index", "file_to_package"]
 
     def __init__(self):
-        self.file_to_tree = defaultdict(IntervalTree)
+        self.file_to_index: Dict[str, KeyIndex] = {}
+        # the keys of a file are relative to its package
+        self.file_to_package: Dict[str, str] = {}
 
-    def add_location_key(self, position: lsp_types.Location, value: str) -> None:
-        interval = Interval(
-            (position.range.start.line, position.range.start.character),
-            (position.range.end.line, position.range.end.character),
-            value,
-        )
-        self.file_to_tree[position.uri].add(interval)
+    @classmethod
+    def from_definitions(cls, definitions: Definitions) -> LocationKeyMap:
+        by_file: DefaultDict[str, List[Tuple[str, Loc]]]
+        by_file = defaultdict(list)
+        for key, loc in definitions.items():
+            by_file[loc.uri].append((key, loc))
+
+        result = cls()
+        for uri, items in by_file.items():
+            result.file_to_index[uri] = KeyIndex(items)
+
+        return result
+
+    def add_index(self, uri: str, index: KeyIndex, package: str = "") -> None:
+        self.file_to_index[uri] = index
+        if package:
+            self.file_to_package[uri] = package
+
+    def _find(self, uri: str, line: int, char: int) -> str | None:
+        index = self.file_to_index.get(uri)
+        if index is None:
+            return None
+
+        key = index.find(line, char)
+        package = self.file_to_package.get(uri)
+        if key is None or package is None:
+            return key
+
+        return f"{package}.{key}"
 
     def find_key_by_position(
         self, position: lsp_types.Position, doc_id: str
     ) -> str | None:
         logger.debug(
-            f"Finding key for {position.line}-{position.character} in {doc_id}"
-        )
-        overlapping_intervals = self.file_to_tree[doc_id].at(
-            (position.line, position.character)
+            "Finding key for %d-%d in %s", position.line, position.character, doc_id
         )
+        return self._find(doc_id, position.line, position.character)
 
-        for interval in overlapping_intervals:
-            return interval.data
-
-        return None
-
-    def find_key_by_location(self, position: lsp_types.Location) -> str | None:
-        return self.find_key_by_position(position.range.start, position.uri)
+    def find_key_by_location(self, location: Loc) -> str | None:
+        return self._find(
+            location.uri, location.start_line, location.start & 0xFFFFFFFF
+        )
 
 
 class HydraContext:
     """
-    Stores: YAML keys and values pairs
+    Stores: YAML keys and values pairs.
+    ``files`` lists the files the config is composed of, the root config is the last,
+    ``packages`` maps them to the packages their values are placed at
     """
 
-    __slots__ = ["config", "references", "definitions", "loc_to_definition"]
+    __slots__ = [
+        "config",
+        "references",
+        "definitions",
+        "files",
+        "parsed_files",
+        "packages",
+        "stamp",
+        "size",
+        "loc_to_definition",
+        "resolver",
+        "values",
+        "reference_errors",
+        "completion_index",
+        "missing",
+    ]
 
     def __init__(
         self,
         config: Dict,
         references: References = defaultdict(list),
         definitions: Definitions = {},
+        files: List[str] | None = None,
+        parsed_files: Dict[str, ParsedFile] | None = None,
+        packages: Dict[str, str] | None = None,
+        missing: Dict[str, List[str]] | None = None,
     ):
         self.config = config
+        self.values = flatten(config)
         self.references = references
         self.definitions = definitions
-        self.loc_to_definition = LocationKeyMap()
-        for k, v in definitions.items():
-            self.loc_to_definition.add_location_key(v, k)
+        self.files = files if files is not None else []
+        self.parsed_files = parsed_files if parsed_files is not None else {}
+        self.packages = packages if packages is not None else {}
+        # file -> the required configs of its defaults list which don't exist
+        self.missing = missing if missing is not None else {}
+        # changes whenever any of the files changes
+        self.stamp = hashlib.blake2b(
+            repr([(uri, f.stamp) for uri, f in self.parsed_files.items()]).encode(),
+            digest_size=8,
+        ).hexdigest()
+        # rough memory footprint: number of indexed definitions and references
+        self.size = len(definitions) + sum(map(len, references.values()))
+        # the key indexes of the files are built once and shared between contexts
+        if self.parsed_files:
+            self.loc_to_definition = LocationKeyMap()
+            for uri, parsed in self.parsed_files.items():
+                self.loc_to_definition.add_index(
+                    uri, parsed.get_key_index(), self.packages.get(uri, "")
+                )
+        else:
+            self.loc_to_definition = LocationKeyMap.from_definitions(definitions)
+        # interpolated values are resolved on demand and memoized
+        self.resolver = Resolver(self)
+        # absolute reference -> why it can't be resolved (None if it can), for
+        # the references of all the files. Computed while the context is built,
+        # so the Resolver is never used from two threads (e.g. the semantic
+        # tokens are encoded in the parser thread, hover runs in the event loop)
+        self.reference_errors: Dict[str, str | None] = self._check_references()
+        # built once per context by the Completer (see Completer.build_index)
+        self.completion_index: CompletionIndex | None = None
 
     def set(self, key: str, value: str):
         raise NotImplementedError
 
     def get(self, key: str):
         """
-        Get a value from the config:
-            1. Using a standard dict notation (e.g. config["data"])
-            2. Using a dot notation (e.g. config["data.loader"])
+        Get a value from the config by its path, e.g. "data", "data.loader"
+        or "data.size.0" for the items of a list.
 
         Will return None if the key is not found
         """
-        if "." not in key:
-            return self.config.get(key)
+        return self.values.get(key)
+
+    def resolve(self, key: str):
+        """Get a value from the config with all the ${} interpolations resolved"""
+        return self.resolver.resolve(key)
+
+    def get_reference_key(self, reference: str, key: str, uri: str) -> str:
+        """
+        Absolute key the ${reference} in the value of the ``key`` of the file
+        refers to (the keys of a file are relative to its package)
+        """
+        if not reference.startswith("."):
+            return reference
+
+        package = self.packages.get(uri)
+        return get_absolute_key(reference, f"{package}.{key}" if package else key)
+
+    def get_reference_error(self, reference: str) -> str | None:
+        """
+        Why the ${reference} (an absolute key, see get_reference_key) can't be
+        resolved, None if it can. Custom resolvers are resolved at runtime.
+        """
+        if reference in self.reference_errors:
+            return self.reference_errors[reference]
+
+        # not in the files the context was built from (e.g. a document changed
+        # since then), only checked for being defined
+        return self._check_defined(reference)
+
+    def _check_defined(self, reference: str) -> str | None:
+        if is_custom_resolver(reference):
+            return None
+
+        if reference not in self.definitions and reference not in self.values:
+            return f"`{reference}` is not defined"
+
+        return None
+
+    def _check_references(self) -> Dict[str, str | None]:
+        # in the order of the files, so the same cycle is reported the same way
+        keys = [ref for ref in self.references if not ref.startswith(".")]
+        for uri, parsed in self.parsed_files.items():
+            for reference, owners in parsed.owners.items():
+                keys.extend(
+                    self.get_reference_key(reference, owner, uri) for owner in owners
+                )
+
+        errors: Dict[str, str | None] = {}
+        for key in keys:
+            if key not in errors:
+                errors[key] = self._check_reference(key)
+
+        return errors
+
+    def _check_reference(self, reference: str) -> str | None:
+        error = self._check_defined(reference)
+        if error is not None or is_custom_resolver(reference):
+            return error
+
+        # resolved values are memoized, so every key is resolved once
+        self.resolve(reference)
+        error = self.resolver.errors.get(reference)
+        if error is None:
+            return None
+
+        return f"`{reference}` can't be resolved: {error}"
+
+    def get_problems(self, uri: str) -> List[Tuple[Loc, str]]:
+        """
+        Undefined references of a single file of the context,
+        and references which can't be resolved (circular or ending in an undefined key).
+        Lines marked with "# hydra: skip" are skipped.
+        """
+        parsed = self.parsed_files.get(uri)
+        if parsed is None:
+            return []
+
+        problems = []
+        for reference, locations in parsed.references.items():
+            owners = parsed.owners.get(reference)
+            for i, loc in enumerate(locations):
+                key = reference
+                if owners is not None:
+                    key = self.get_reference_key(reference, owners[i], uri)
 
-        # nested case
-        value = self.config
-        for k in key.split("."):
-            value = value.get(k)
+                message = self.get_reference_error(key)
+                if message is None:
+                    continue
 
-            if value is None:
-                return None
+                # if there is "# hydra: skip" in the lines of the value,
+                # skip the problem for that block
+                lines = range(loc.start_line, loc.end_line + 1)
+                if parsed.skip_lines.isdisjoint(lines):
+                    problems.append((loc, message))
 
-        return value
+        return problems
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from typing import DefaultDict, Dict, Iterable, List, Set
+
+logger = logging.getLogger(__name__)
+
+
+class DependencyGraph:
+    """
+    Keeps which files include which (through ``defaults``).
+    Reverse edges allow to find every config which depends on a changed file.
+    The edges of a file don't depend on the root config it is composed into,
+    the files selected by overrides and absolute paths are kept per root.
+    """
+
+    __slots__ = ["includes", "included_by", "composed"]
+
+    def __init__(self):
+        self.includes: Dict[str, List[str]] = {}
+        self.included_by: DefaultDict[str, Set[str]] = defaultdict(set)
+        # root config -> the files its last composition looked up (missing ones too)
+        self.composed: Dict[str, Set[str]] = {}
+
+    def __contains__(self, uri: str) -> bool:
+        return uri in self.includes
+
+    def set_includes(self, uri: str, includes: List[str]) -> None:
+        """Replace the outgoing edges of the file"""
+        old = self.includes.get(uri)
+        if old == includes:
+            return
+
+        for dep in old or []:
+            self.included_by[dep].discard(uri)
+
+        self.includes[uri] = list(includes)
+        for dep in includes:
+            self.included_by[dep].add(uri)
+
+    def set_composed(self, root: str, files: Set[str]) -> None:
+        self.composed[root] = files
+
+    def remove(self, uri: str) -> None:
+        for dep in self.includes.pop(uri, []):
+            self.included_by[dep].discard(uri)
+        self.composed.pop(uri, None)
+
+    def _walk(self, uri: str, edges) -> Set[str]:
+        visited = {uri}
+        stack = [uri]
+        while stack:
+            for nxt in edges(stack.pop()):
+                if nxt not in visited:
+                    visited.add(nxt)
+                    stack.append(nxt)
+
+        return visited
+
+    def dependencies(self, uri: str) -> Set[str]:
+        """All files the given file includes (transitively), including itself"""
+        return self._walk(uri, lambda u: self.includes.get(u, ()))
+
+    def dependents(self, uri: str) -> Set[str]:
+        """All files which include the given file (transitively), including itself"""
+        return self._walk(uri, lambda u: self.included_by.get(u, ()))
+
+    def roots_including(self, uri: str, roots: Iterable[str]) -> Set[str]:
+        """Filter the root configs down to the ones which reach the given file"""
+        dependents = self.dependents(uri)
+        return {
+            root
+            for root in roots
+            if root in dependents or uri in self.composed.get(root, ())
+        }
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+CONFIG_EXTENSION = ".yaml"
+
+# package keywords, see https://hydra.cc/docs/advanced/overriding_packages/
+GLOBAL_PACKAGE = "_global_"
+GROUP_PACKAGE = "_group_"
+HERE_PACKAGE = "_here_"
+
+PACKAGE_HEADER = "# @package"
+
+
+class DefaultEntry:
+    """
+    A single item of the ``defaults`` list:
+        _self_                     - the config itself
+        base, /common/base         - a config (relative to the group of the file)
+        db: mysql                  - an option of a config group (or a list of them)
+        optional db: mysql         - skipped if the option does not exist
+        override db: postgres      - replaces the option of the group selected
+                                     anywhere below in the defaults tree
+        db@backup: mysql           - with the package of the config overridden
+    """
+
+    __slots__ = ["group", "options", "package", "optional", "override"]
+
+    def __init__(
+        self,
+        group: str | None,
+        options: List[str],
+        package: str | None = None,
+        optional: bool = False,
+        override: bool = False,
+    ):
+        # None for plain config names (options holds the name then)
+        self.group = group
+        self.options = options
+        self.package = package
+        self.optional = optional
+        self.override = override
+
+    @property
+    def is_self(self) -> bool:
+        return self.group is None and self.options == ["_self_"]
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, DefaultEntry) and all(
+            getattr(self, k) == getattr(other, k) for k in self.__slots__
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"DefaultEntry({self.group!r}, {self.options!r}, package={self.package!r}, "
+            f"optional={self.optional}, override={self.override})"
+        )
+
+    @classmethod
+    def parse(cls, item: Any) -> DefaultEntry | None:
+        """Parse an item of the defaults list, None if it is not a valid one"""
+        if isinstance(item, str):
+            name, _, package = item.partition("@")
+            return cls(None, [name], package or None)
+
+        if not isinstance(item, dict) or len(item) != 1:
+            return None
+
+        ((key, value),) = item.items()
+        if not isinstance(key, str):
+            return None
+
+        *keywords, group = key.split()
+        group, _, package = group.partition("@")
+
+        # null (disabled group) and ??? (mandatory value) select nothing
+        if value is None or value == "???":
+            options = []
+        elif isinstance(value, list):
+            options = [str(v) for v in value if v is not None]
+        else:
+            options = [str(value)]
+
+        return cls(
+            group,
+            options,
+            package or None,
+            optional="optional" in keywords,
+            override="override" in keywords,
+        )
+
+
+def parse_defaults(data: Dict) -> List[DefaultEntry]:
+    defaults = data.get("defaults")
+    if not isinstance(defaults, list):
+        return []
+
+    entries = [DefaultEntry.parse(item) for item in defaults]
+    return [entry for entry in entries if entry is not None]
+
+
+def parse_package_header(lines: List[str]) -> str | None:
+    """Package from the "# @package" directive in the header comments of the file"""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if not line.startswith("#"):
+            break
+        if line.startswith(PACKAGE_HEADER):
+            return line[len(PACKAGE_HEADER) :].strip() or None
+
+    return None
+
+
+def get_package(
+    group_package: str,
+    parent_package: str,
+    entry_package: str | None,
+    header: str | None,
+) -> str:
+    """
+    Package (the key path the values are placed at) of a config included from
+    the defaults list:
+        1. the package from the defaults list (db@backup), relative to the parent
+        2. the "# @package" header of the config, absolute
+        3. the config group (_group_), e.g. "server.db" for server/db/mysql.yaml
+    """
+    if entry_package is not None:
+        package, base = entry_package, parent_package
+    elif header is not None:
+        package, base = header, ""
+    else:
+        return group_package
+
+    parts = [base]
+    for part in package.split("."):
+        if part == GLOBAL_PACKAGE:
+            parts = []
+        elif part == HERE_PACKAGE:
+            parts = [parent_package]
+        elif part == GROUP_PACKAGE:
+            parts = [group_package]
+        else:
+            parts.append(part)
+
+    return ".".join(p for p in parts if p)
+
+
+def nest(data: Dict, package: str) -> Dict:
+    """Place the values under the package: ({"a": 1}, "x.y") -> {"x": {"y": {"a": 1}}}"""
+    for key in reversed(package.split(".") if package else []):
+        data = {key: data}
+
+    return data
+
+
+class GroupIndex:
+    """
+    Config groups and their options (the configs of a folder and its subfolders).
+    Every folder is listed once, on the first lookup, and kept until it is
+    invalidated (e.g. a file is created or deleted).
+    Listings are replaced, never modified, so they can be read from any thread.
+    """
+
+    __slots__ = ["folders"]
+
+    def __init__(self):
+        # folder -> (options, subfolders)
+        self.folders: Dict[str, Tuple[frozenset, frozenset]] = {}
+
+    def _list(self, folder: str) -> Tuple[frozenset, frozenset]:
+        folder = os.path.normpath(folder)
+        listing = self.folders.get(folder)
+        if listing is not None:
+            return listing
+
+        options, groups = set(), set()
+        try:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir():
+                        groups.add(entry.name)
+                    elif entry.name.endswith(CONFIG_EXTENSION):
+                        options.add(entry.name[: -len(CONFIG_EXTENSION)])
+        except OSError:
+            pass
+
+        listing = self.folders[folder] = (frozenset(options), frozenset(groups))
+        return listing
+
+    def options(self, folder: str) -> List[str]:
+        """Configs of the folder (options of the group)"""
+        return sorted(self._list(folder)[0])
+
+    def groups(self, folder: str) -> List[str]:
+        """Subfolders of the folder (nested groups)"""
+        return sorted(self._list(folder)[1])
+
+    def has(self, path: str) -> bool:
+        """Whether the config file exists"""
+        folder, name = os.path.split(path)
+        return name.endswith(CONFIG_EXTENSION) and (
+            name[: -len(CONFIG_EXTENSION)] in self._list(folder)[0]
+        )
+
+    def invalidate(self, path: str) -> None:
+        """A file or a folder was created or deleted"""
+        path = os.path.normpath(path)
+        self.folders.pop(os.path.dirname(path), None)
+        self.folders.pop(path, None)
+
+    def clear(self) -> None:
+        self.folders.clear()
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Callable, List
+
+from lsprotocol.types import (
+    WorkDoneProgressBegin,
+    WorkDoneProgressEnd,
+    WorkDoneProgressReport,
+)
+from pygls.server import LanguageServer
+
+from hydra_lsp.cache import ParsedFile
+from hydra_lsp.parser import (
+    ConfigParser,
+    get_file_stamp,
+    parse_files,
+    path_to_uri,
+    uri_to_path,
+)
+from hydra_lsp.targets import TargetIndex, parse_modules
+from hydra_lsp.utils import chunks, discover_yaml_files
+
+logger = logging.getLogger(__name__)
+
+
+class WorkspaceIndexer:
+    """
+    Parse every YAML file of the workspace in the background,
+    so the first request in any file hits a warm parse cache.
+    """
+
+    __slots__ = ["ls", "parser", "workers", "chunk_size", "executor"]
+
+    PROGRESS_TOKEN = "workspace-index"
+
+    def __init__(
+        self,
+        ls: LanguageServer,
+        parser: ConfigParser,
+        workers: int | None = None,
+        chunk_size: int = 32,
+        executor: Executor | None = None,
+    ):
+        self.ls = ls
+        self.parser = parser
+        self.workers = workers
+        self.chunk_size = chunk_size
+        # where the parser is allowed to run (None - the event loop thread)
+        self.executor = executor
+
+    async def _run_parser(self, fn: Callable, *args):
+        if self.executor is None:
+            return fn(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, fn, *args
+        )
+
+    def add_parsed_files(self, files: List[ParsedFile]) -> None:
+        for parsed in files:
+            self.parser.add_parsed_file(parsed)
+
+    def get_roots(self) -> List[str]:
+        workspace = self.ls.workspace
+        roots = [folder.uri for folder in workspace.folders.values()]
+        if not roots and workspace.root_uri:
+            roots = [workspace.root_uri]
+
+        return [uri_to_path(root) for root in roots if root.startswith("file://")]
+
+    def get_stale_files(self) -> List[str]:
+        """Files which are not in the parse cache yet (or changed since)"""
+        uris = map(path_to_uri, discover_yaml_files(self.get_roots()))
+        return [
+            uri
+            for uri in uris
+            if self.parser.cache.get(uri, get_file_stamp(self.ls, uri)) is None
+        ]
+
+    async def index(self) -> int:
+        """Parse the workspace on a process pool, returns the number of parsed files"""
+        uris = await self._run_parser(self.get_stale_files)
+        if not uris:
+            return 0
+
+        logger.info(f"Indexing {len(uris)} files in background")
+        await self._parse_on_pool(
+            "Indexing workspace", parse_files, uris, self.add_parsed_files
+        )
+        logger.info(f"Indexed {len(uris)} files")
+
+        return len(uris)
+
+    async def index_targets(self, targets: TargetIndex) -> int:
+        """
+        Parse the Python files of the workspace for the ``_target_`` index,
+        returns the number of parsed files. A few changed files are parsed
+        in the parser thread, without starting the worker processes.
+        """
+        paths = await self._run_parser(targets.get_stale_files, self.get_roots())
+        if not paths:
+            return 0
+
+        logger.info(f"Indexing {len(paths)} Python files")
+        if len(paths) <= self.chunk_size:
+            await self._run_parser(lambda: targets.update(parse_modules(paths)))
+        else:
+            await self._parse_on_pool(
+                "Indexing Python files", parse_modules, paths, targets.update
+            )
+        logger.info(f"Indexed {len(paths)} Python files, {len(targets)} targets")
+
+        return len(paths)
+
+    async def _parse_on_pool(
+        self,
+        title: str,
+        parse: Callable[[List[str]], List],
+        files: List[str],
+        add: Callable[[List], None],
+    ) -> None:
+        """Parse the files in chunks on a process pool, ``add`` runs in the parser thread"""
+        self.ls.progress.begin(
+            self.PROGRESS_TOKEN, WorkDoneProgressBegin(title=title, percentage=0)
+        )
+
+        loop = asyncio.get_running_loop()
+        done = 0
+        try:
+            # forking a process with running threads (e.g. the stdio reader) can
+            # deadlock the child, so workers are spawned instead
+            with ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=get_context("spawn")
+            ) as pool:
+                futures = [
+                    loop.run_in_executor(pool, parse, chunk)
+                    for chunk in chunks(files, self.chunk_size)
+                ]
+
+                for future in asyncio.as_completed(futures):
+                    await self._run_parser(add, await future)
+
+                    done += self.chunk_size
+                    self.ls.progress.report(
+                        self.PROGRESS_TOKEN,
+                        WorkDoneProgressReport(
+                            percentage=min(100, done * 100 // len(files))
+                        ),
+                    )
+        finally:
+            self.ls.progress.end(self.PROGRESS_TOKEN, WorkDoneProgressEnd())
@@ -3,16 +3,31 @@ from __future__ import annotations
 import json
 import logging
 from functools import wraps
-from typing import Any, Callable, Concatenate, Optional, ParamSpec, Tuple, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Concatenate,
+    Dict,
+    List,
+    Optional,
+    ParamSpec,
+    Tuple,
+    TypeVar,
+)
 
 from lsprotocol import types as lsp_types
 from pygls.server import LanguageServer
 from pygls.workspace import TextDocument
 
-from hydra_lsp.parser import HydraContext
+from hydra_lsp.metrics import metrics
+from hydra_lsp.parser import HydraContext, path_to_uri
+from hydra_lsp.targets import TARGET_KEY, Param, Target, TargetIndex, format_signature
 from hydra_lsp.utils import (
     to_markdown_content,
     yaml_get_identifier,
+    yaml_get_key,
+    yaml_get_siblings,
+    yaml_get_target,
     yaml_get_variable_name,
 )
 
@@ -39,13 +54,14 @@ def intel(feature: str, context_required: bool = True):
             *args: P.args,
             **kwargs: P.kwargs,
         ) -> R | None:
-            logger.info(f"{feature} requested: {params}")
+            logger.debug("%s requested: %s", feature, params)
 
             if context_required and context is None:
                 logger.warning("Context is not loaded")
                 return None
 
-            return f(_self, params, context, *args, **kwargs)
+            with metrics.timer(f"phase.{feature.lower()}"):
+                return f(_self, params, context, *args, **kwargs)
 
         return _impl
 
@@ -77,6 +93,8 @@ class HydraIntel:
             it will return the value of the variable.
         - if the cursor is on the key (before ':'),
             it will return the computed value of the key.
+
+        Values are shown with the ${} interpolations resolved.
         """
 
         document_path, document, position = self._get_location(params)
@@ -89,14 +107,14 @@ class HydraIntel:
             key = context.loc_to_definition.find_key_by_position(
                 position, document_path
             )
-            logger.info(f"Key from position: {key}")
+            logger.debug("Key from position: %s", key)
 
-        value = context.get(key) if key is not None else None
+        value = context.resolve(key) if key is not None else None
 
         if key is None or value is None:
             return None
 
-        s = json.dumps({key: value}, indent=2)[1:-1]
+        s = json.dumps({key: value}, indent=2, default=str)[1:-1]
         return lsp_types.Hover(contents=to_markdown_content(s))
 
     @intel("Definition")
@@ -113,8 +131,95 @@ class HydraIntel:
         if key is None:
             return None
 
-        logger.info(f"Definition of {key} is {context.definitions.get(key)}")
-        return context.definitions.get(key)
+        location = context.definitions.get(key)
+        logger.debug("Definition of %s is %s", key, location)
+
+        return location.to_lsp() if location is not None else None
+
+    def _get_target_at(
+        self, params: LocParams, targets: TargetIndex
+    ) -> Tuple[Target, Param | None] | None:
+        """
+        The target named by the ``_target_`` value under the cursor, or the
+        target and its parameter whose key (next to ``_target_``) is under the cursor
+        """
+        _, document, position = self._get_location(params)
+        current_line = document.lines[position.line]
+
+        value = yaml_get_target(current_line)
+        if value is not None:
+            start, name = value
+            if not start <= position.character <= start + len(name):
+                return None
+
+            target = targets.get(name)
+            return (target, None) if target is not None else None
+
+        key = yaml_get_key(current_line, position.character)
+        if not key:
+            return None
+
+        name = yaml_get_siblings(document.lines, position.line).get(TARGET_KEY)
+        target = targets.get(name.strip("\"'")) if name else None
+        if target is None:
+            return None
+
+        key = key.lstrip("- ")
+        for param in targets.get_params(target):
+            if param.name == key and not param.kind:
+                return target, param
+
+        return None
+
+    @intel("Target", context_required=False)
+    def get_target_hover(
+        self,
+        params: lsp_types.HoverParams,
+        context: HydraContext | None,
+        targets: TargetIndex,
+    ) -> lsp_types.Hover | None:
+        """Signature of the ``_target_`` or the parameter under the cursor"""
+        found = self._get_target_at(params, targets)
+        if found is None:
+            return None
+
+        target, param = found
+        if param is None:
+            signature = format_signature(target, targets.get_params(target))
+            content = to_markdown_content(signature, "python")
+            if target.doc:
+                content.value += f"\n\n{target.doc}"
+        else:
+            content = to_markdown_content(str(param), "python")
+            content.value += f"\n\nParameter of `{target.name}`"
+
+        return lsp_types.Hover(contents=content)
+
+    @intel("Target", context_required=False)
+    def get_target_definition(
+        self,
+        params: lsp_types.TextDocumentPositionParams,
+        context: HydraContext | None,
+        targets: TargetIndex,
+    ) -> lsp_types.Location | None:
+        """Where the ``_target_`` or the parameter under the cursor is defined"""
+        found = self._get_target_at(params, targets)
+        if found is None:
+            return None
+
+        target, param = found
+        if param is None:
+            line, start, end = target.line, target.column, target.column
+        else:
+            line, start, end = param.line, param.column, param.column + len(param.name)
+
+        return lsp_types.Location(
+            uri=path_to_uri(target.path),
+            range=lsp_types.Range(
+                start=lsp_types.Position(line=line, character=start),
+                end=lsp_types.Position(line=line, character=end),
+            ),
+        )
 
     @intel("References")
     def get_references(
@@ -128,48 +233,92 @@ class HydraIntel:
         if key is None:
             return None
 
-        logger.info(f"References of {key} are {context.references.get(key)}")
-        return context.references.get(key)
+        locations = context.references.get(key)
+        logger.debug("References of %s are %s", key, locations)
+
+        return [loc.to_lsp() for loc in locations] if locations is not None else None
 
     def get_diagnostics(self, context: HydraContext | None, doc_uri: str | None):
-        """Get diagnostics for the current context."""
+        """Get diagnostics for the document (or for all the files of the context)."""
 
-        logger.info(f"Diagnostics requested for: {doc_uri}")
+        logger.debug("Diagnostics requested for: %s", doc_uri)
         if context is None:
             logger.warning("Context is not loaded")
             return None
 
+        uris = [doc_uri] if doc_uri is not None else list(context.parsed_files)
+
         diagnostics = []
+        for uri in uris:
+            diagnostics.extend(self.get_file_diagnostics(context, uri))
 
-        for reference, locations in context.references.items():
-            if reference in context.definitions:
-                continue
-
-            for loc in locations:
-                if doc_uri is not None and loc.uri != doc_uri:
-                    continue
-
-                # check if there is "# hydra: skip" in the line
-                # if so, skip the diagnostic for that block
-                lines = self.ls.workspace.get_document(loc.uri).lines
-                skip = any(
-                    filter(
-                        lambda s: "# hydra: skip" in s,
-                        lines[loc.range.start.line : loc.range.end.line + 1],
-                    )
-                )
+        logger.debug("Diagnostics: %s", diagnostics)
 
-                if skip:
-                    continue
+        return diagnostics
 
-                diagnostics.append(
-                    lsp_types.Diagnostic(
-                        range=loc.range,
-                        message=f"`{reference}` is not defined",
-                        source="hydra-lsp",
+    @metrics.timed("phase.diagnostics")
+    def get_file_diagnostics(
+        self, context: HydraContext, doc_uri: str
+    ) -> List[lsp_types.Diagnostic]:
+        """Undefined and unresolvable references of a single file of the context"""
+        return [
+            lsp_types.Diagnostic(range=loc.range, message=message, source="hydra-lsp")
+            for loc, message in context.get_problems(doc_uri)
+        ]
+
+    def get_diagnostics_result_id(self, context: HydraContext) -> str:
+        """
+        Diagnostics of a file only change when some file of its context changes,
+        so the stamp of the context is used as the result id.
+        """
+        return context.stamp
+
+    def get_document_diagnostic_report(
+        self, context: HydraContext | None, doc_uri: str, previous_id: str | None
+    ) -> lsp_types.DocumentDiagnosticReport:
+        """Report for textDocument/diagnostic, "unchanged" if the result id matches"""
+        if context is None:
+            return lsp_types.RelatedFullDocumentDiagnosticReport(items=[])
+
+        result_id = self.get_diagnostics_result_id(context)
+        if result_id == previous_id:
+            return lsp_types.RelatedUnchangedDocumentDiagnosticReport(
+                result_id=result_id
+            )
+
+        return lsp_types.RelatedFullDocumentDiagnosticReport(
+            items=self.get_file_diagnostics(context, doc_uri), result_id=result_id
+        )
+
+    def get_workspace_diagnostic_report(
+        self, contexts: Dict[str, HydraContext], previous_ids: Dict[str, str]
+    ) -> lsp_types.WorkspaceDiagnosticReport:
+        """
+        Report for workspace/diagnostic.
+        ``contexts`` maps every known file to the context which owns it.
+        """
+        items: List[lsp_types.WorkspaceDocumentDiagnosticReport] = []
+        for uri, context in contexts.items():
+            version = None
+            document = self.ls.workspace.text_documents.get(uri)
+            if document is not None:
+                version = document.version
+
+            result_id = self.get_diagnostics_result_id(context)
+            if previous_ids.get(uri) == result_id:
+                items.append(
+                    lsp_types.WorkspaceUnchangedDocumentDiagnosticReport(
+                        uri=uri, version=version, result_id=result_id
+                    )
+                )
+            else:
+                items.append(
+                    lsp_types.WorkspaceFullDocumentDiagnosticReport(
+                        uri=uri,
+                        version=version,
+                        items=self.get_file_diagnostics(context, uri),
+                        result_id=result_id,
                     )
                 )
 
-        logger.debug(f"Diagnostics: {diagnostics}")
-
-        return diagnostics
+        return lsp_types.WorkspaceDiagnosticReport(items=items)
@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import inspect
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, TypeVar
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable)
+
+# upper bounds (in milliseconds) of the histogram buckets, the last one is open
+BUCKETS: List[float] = [
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000
+]  # fmt: skip
+
+
+class Histogram:
+    """Distribution of durations over fixed log-scale buckets"""
+
+    __slots__ = ["count", "total", "min", "max", "buckets"]
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets: List[int] = [0] * (len(BUCKETS) + 1)
+
+    def add(self, ms: float) -> None:
+        self.count += 1
+        self.total += ms
+        self.min = min(self.min, ms)
+        self.max = max(self.max, ms)
+        self.buckets[bisect_left(BUCKETS, ms)] += 1
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket the percentile falls into"""
+        rank = p * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3),
+            "min_ms": round(self.min, 3),
+            "max_ms": round(self.max, 3),
+            "p50_ms": round(self.percentile(0.5), 3),
+            "p90_ms": round(self.percentile(0.9), 3),
+            "p99_ms": round(self.percentile(0.99), 3),
+        }
+
+
+class Metrics:
+    """
+    Timing histograms of the LSP methods and of the pipeline phases, e.g.:
+        "lsp.textDocument/hover", "phase.read", "phase.compose"
+    It is safe to record from the parser thread and the event loop at once.
+    """
+
+    __slots__ = ["timings", "lock"]
+
+    def __init__(self):
+        self.timings: Dict[str, Histogram] = {}
+        self.lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        with self.lock:
+            histogram = self.timings.get(name)
+            if histogram is None:
+                histogram = self.timings[name] = Histogram()
+
+            histogram.add(seconds * 1000)
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name: str) -> Callable[[F], F]:
+        """Decorator recording the duration of every call (coroutines too)"""
+
+        def decorator(f):
+            if inspect.iscoroutinefunction(f):
+
+                @wraps(f)
+                async def async_wrapper(*args, **kwargs):
+                    with self.timer(name):
+                        return await f(*args, **kwargs)
+
+                return async_wrapper
+
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return f(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            return {name: h.to_dict() for name, h in sorted(self.timings.items())}
+
+    def clear(self) -> None:
+        with self.lock:
+            self.timings.clear()
+
+
+# shared by all the components of the process
+metrics = Metrics()
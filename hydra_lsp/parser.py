@@ -1,37 +1,44 @@
 from __future__ import annotations
 
+import hashlib
 import logging
 import os
-import re
+import sys
 from collections import defaultdict
-from typing import Dict, Generator, List
-
-import ruamel.yaml
-from lsprotocol import types as lsp_types
-from pygls.server import LanguageServer
-from ruamel.yaml.main import (
-    BlockEndToken,
-    BlockEntryToken,
-    BlockMappingStartToken,
-    BlockSequenceStartToken,
-    DocumentStartToken,
-    FlowEntryToken,
-    FlowMappingEndToken,
-    FlowMappingStartToken,
-    FlowSequenceEndToken,
-    FlowSequenceStartToken,
-    KeyToken,
-    ScalarToken,
-    StreamStartToken,
-    ValueToken,
+from functools import partial
+from typing import TYPE_CHECKING, Dict, Hashable, List, Set, Tuple
+
+from ruamel.yaml import YAMLError
+from ruamel.yaml.nodes import MappingNode, Node, ScalarNode, SequenceNode
+
+try:  # the C parser (ruamel.yaml.clib) is several times faster, same nodes and marks
+    from ruamel.yaml.cyaml import CSafeLoader as SafeLoader
+except ImportError:
+    from ruamel.yaml.loader import SafeLoader
+
+from hydra_lsp.cache import FileCache, ParsedFile
+from hydra_lsp.context import Definitions, HydraContext, Loc, References, pack_position
+from hydra_lsp.graph import DependencyGraph
+from hydra_lsp.groups import (
+    DefaultEntry,
+    GroupIndex,
+    get_package,
+    nest,
+    parse_defaults,
+    parse_package_header,
 )
-from ruamel.yaml.tokens import Token
-
-from hydra_lsp.context import Definitions, HydraContext, References
+from hydra_lsp.metrics import metrics
+from hydra_lsp.resolver import INTERPOLATION
 from hydra_lsp.utils import deep_update
 
+if TYPE_CHECKING:
+    from pygls.server import LanguageServer
+
 logger = logging.getLogger(__name__)
 
+MERGE_TAG = "tag:yaml.org,2002:merge"
+SKIP_MARKER = "# hydra: skip"
+
 
 def assert_type_is_any_of(t, types, msg: str = "Invalid type"):
     assert any([t is _t for _t in types]), msg
@@ -41,11 +48,17 @@ def append_to_base_key(base_key: str, key: str):
     return f"{base_key}.{key}" if base_key else key
 
 
-def remove_from_base_key(base_key: str):
-    if "." not in base_key:
-        return ""
+def uri_to_path(uri: str) -> str:
+    return uri[len("file://") :] if uri.startswith("file://") else uri
+
 
-    return base_key.rsplit(".", 1)[0] if base_key else ""
+def path_to_uri(path: str) -> str:
+    return f"file://{path}"
+
+
+def get_folder(uri: str) -> str:
+    """Folder of the file, keeps the scheme of the URI"""
+    return "/".join(uri.split("/")[:-1])
 
 
 def get_file(ls: LanguageServer | None, uri: str) -> List[str]:
@@ -53,152 +66,490 @@ def get_file(ls: LanguageServer | None, uri: str) -> List[str]:
         doc = ls.workspace.get_document(uri)
         return doc.lines
 
-    uri = uri[len("file://") :] if uri.startswith("file://") else uri
-    with open(uri) as f:
+    with open(uri_to_path(uri)) as f:
         f.seek(0)
         data = f.readlines()
 
     return data
 
 
+def get_digest(lines: List[str]) -> bytes:
+    """Hash of the content of the file"""
+    return hashlib.blake2b("".join(lines).encode(), digest_size=16).digest()
+
+
+def get_file_stamp(ls: LanguageServer | None, uri: str) -> Hashable:
+    """
+    Get a cheap token which changes whenever the content of the file changes:
+        1. the document version and the hash of the content for documents opened
+           in the editor (versions start over when a document is reopened)
+        2. mtime and size for files on disk
+
+    Will return None if the file can't be stamped (it is never cached then)
+    """
+    if ls is not None:
+        doc = ls.workspace.text_documents.get(uri)
+        if doc is not None:
+            digest = hashlib.blake2b(doc.source.encode(), digest_size=16).digest()
+            return ("version", doc.version, digest)
+
+    try:
+        stat = os.stat(uri_to_path(uri))
+    except OSError:
+        return None
+
+    return ("mtime", stat.st_mtime_ns, stat.st_size)
+
+
+class ReloadCancelled(Exception):
+    """The load was cancelled (e.g. superseded by a newer one)"""
+
+
+class CancelToken:
+    """Checked by ConfigParser between files, so a running load can be aborted"""
+
+    __slots__ = ["cancelled"]
+
+    def __init__(self):
+        self.cancelled = False
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def check(self) -> None:
+        if self.cancelled:
+            raise ReloadCancelled
+
+
 class ConfigParser:
     """Load a Hydra YAML config file, looks for _defaults and loads respective files"""
 
-    __slots__ = ["ls", "definitions", "references"]
-
-    def __init__(self, ls: LanguageServer | None = None):
+    __slots__ = [
+        "ls",
+        "cache",
+        "graph",
+        "token",
+        "definitions",
+        "references",
+        "files",
+        "parsed_files",
+        "packages",
+        "lookups",
+        "missing",
+        "groups",
+        "search_root",
+    ]
+
+    def __init__(
+        self, ls: LanguageServer | None = None, cache: FileCache | None = None
+    ):
         self.ls = ls
+        self.cache = cache if cache is not None else FileCache()
+        self.graph = DependencyGraph()
+        self.token: CancelToken | None = None
         self.definitions: Definitions = {}
         self.references: References = defaultdict(list)
+        self.files: List[str] = []
+        self.parsed_files: Dict[str, ParsedFile] = {}
+        # file -> the package its values are placed at
+        self.packages: Dict[str, str] = {}
+        # every config the defaults lists of the load refer to, missing ones too
+        self.lookups: Set[str] = set()
+        # file -> the required configs of its defaults list which don't exist
+        self.missing: Dict[str, List[str]] = {}
+        # options of the config groups, shared by all the loads
+        self.groups = GroupIndex()
+        # folder of the root config, absolute defaults (/group) are relative to it
+        self.search_root = ""
 
     def _get_raw_file(self, uri: str) -> List[str]:
         return get_file(self.ls, uri)
 
-    def _get_yaml_file(self, uri: str) -> Dict:
-        data = "".join(get_file(self.ls, uri))
-
-        try:
-            return ruamel.yaml.safe_load(data)
-        except ruamel.yaml.YAMLError as e:
-            logger.error(f"Error while parsing {uri}: {e}")
-            return {}
+    def _read_yaml_file(self, parsed: ParsedFile, lines: List[str]) -> None:
+        """
+        Parse the file in a single pass: compose the YAML node tree once and use it
+        both to collect the definitions/references (from the node marks)
+        and to construct the values.
+        """
+        parsed.package = parse_package_header(lines)
 
-    def _get_yaml_tokens(self, uri: str) -> Generator:
-        data = "".join(get_file(self.ls, uri))
+        parsed.skip_lines = frozenset(
+            i for i, line in enumerate(lines) if SKIP_MARKER in line
+        )
 
+        source = "".join(lines)
+        loader = SafeLoader(source)
         try:
-            return ruamel.yaml.scan(data)
-        except ruamel.yaml.YAMLError as e:
-            logger.error(f"Error while parsing {uri}: {e}")
-            raise GeneratorExit
-
-    def _get_location(self, node: Token, filename: str) -> lsp_types.Location:
-        return lsp_types.Location(
-            uri=filename,
-            range=lsp_types.Range(
-                start=lsp_types.Position(
-                    line=node.start_mark.line, character=node.start_mark.column
-                ),
-                end=lsp_types.Position(
-                    line=node.end_mark.line, character=node.end_mark.column
-                ),
-            ),
+            with metrics.timer("phase.scan"):
+                node = loader.get_single_node()
+                if node is None:
+                    return
+
+                self._process_node(node, "", parsed, set(), source)
+                value = loader.construct_document(node)
+        except YAMLError as e:
+            logger.error(f"Error while parsing {parsed.uri}: {e}")
+            mark = getattr(e, "problem_mark", None)
+            parsed.error = (
+                mark.line if mark is not None else 0,
+                mark.column if mark is not None else 0,
+                getattr(e, "problem", None) or str(e),
+            )
+            return
+        finally:
+            loader.dispose()
+
+        if isinstance(value, dict):
+            parsed.data = value
+
+    def _get_location(self, node: Node, filename: str) -> Loc:
+        return Loc(
+            filename,
+            pack_position(node.start_mark.line, node.start_mark.column),
+            pack_position(node.end_mark.line, node.end_mark.column),
         )
 
-    def _get_variables(self, token: ScalarToken) -> List[str]:
-        return re.findall(r"\${(.*?)}", token.value)
-
-    def _process_tokens(self, tokens: Generator, filename: str):
-        tokens = self._get_yaml_tokens(filename)
-        base_key: str = ""
-        prev_key: str = ""
-
-        for token in tokens:
-            match token:
-                case (
-                    StreamStartToken()
-                    | DocumentStartToken()
-                    | BlockMappingStartToken()
-                    | FlowEntryToken()
-                    | FlowSequenceEndToken()
-                    | FlowMappingEndToken()
-                ):
-                    continue
-
-                case BlockEndToken():
-                    base_key = remove_from_base_key(base_key)
-
-                case KeyToken():
-                    token = next(tokens)  # now it's ScalarToken
-                    assert type(token) is ScalarToken
+    def _get_variables(self, node: ScalarNode) -> List[str]:
+        return INTERPOLATION.findall(node.value)
 
-                    k = append_to_base_key(base_key, token.value)
-                    self.definitions[k] = self._get_location(token, filename)
-                    prev_key = token.value
-
-                case ValueToken():
-                    n_token = next(tokens)
-                    # now it's ScalarToken or BlockMappingStartToken
-
-                    match n_token:
-                        case ScalarToken():
-                            for var in self._get_variables(n_token):
-                                self.references[var].append( self._get_location(n_token, filename))
+    def _get_interpolations(
+        self, node: ScalarNode, key: str, source: str
+    ) -> List[Tuple[int, int, str, str]]:
+        """
+        Exact positions of the ${} in the source of the scalar (for highlighting),
+        ``key`` is the key of the value
+        """
+        start, end = node.start_mark, node.end_mark
+        text = source[start.index : end.index]
+
+        result = []
+        for match in INTERPOLATION.finditer(text):
+            offset = match.start()
+            line_start = text.rfind("\n", 0, offset) + 1
+            if line_start:
+                line = start.line + text.count("\n", 0, offset)
+                column = offset - line_start
+            else:
+                line, column = start.line, start.column + offset
+
+            position = pack_position(line, column)
+            result.append((position, match.end() - offset, match.group(1), key))
+
+        return result
+
+    def _process_node(
+        self,
+        node: Node,
+        base_key: str,
+        parsed: ParsedFile,
+        seen: Set[int],
+        source: str,
+    ):
+        """
+        Walk the node tree: every mapping key is a definition
+        and every ${} in a scalar value is a reference (``source`` is the text
+        of the file, the exact positions of the ${} are taken from it).
+        Sequence items are addressed by their index (e.g. "data.size.0").
+        """
+        match node:
+            case MappingNode() | SequenceNode() if id(node) in seen:
+                return  # an alias of an already processed anchor
+
+            case MappingNode():
+                seen.add(id(node))
+                for key_node, value_node in node.value:
+                    if type(key_node) is not ScalarNode or key_node.tag == MERGE_TAG:
+                        continue
+
+                    k = sys.intern(append_to_base_key(base_key, key_node.value))
+                    parsed.definitions[k] = self._get_location(key_node, parsed.uri)
+                    self._process_node(value_node, k, parsed, seen, source)
+
+            case SequenceNode():
+                seen.add(id(node))
+                for i, item in enumerate(node.value):
+                    k = append_to_base_key(base_key, str(i))
+                    self._process_node(item, k, parsed, seen, source)
+
+            case ScalarNode():
+                variables = self._get_variables(node)
+                for var in variables:
+                    parsed.references[var].append(self._get_location(node, parsed.uri))
+                    if var.startswith("."):
+                        parsed.owners.setdefault(var, []).append(base_key)
+
+                if variables:
+                    parsed.interpolations.extend(
+                        self._get_interpolations(node, base_key, source)
+                    )
+
+    def parse_file(self, uri: str) -> ParsedFile:
+        """Get the parsed file from the cache, (re)parse it only if it has changed"""
+        stamp = get_file_stamp(self.ls, uri)
+        parsed = self.cache.get(uri, stamp)
+        if parsed is not None:
+            return parsed
+
+        with metrics.timer("phase.read"):
+            lines = get_file(self.ls, uri)
+
+        # e.g. the file was opened in the editor or touched by a git checkout
+        digest = get_digest(lines)
+        parsed = self.cache.revalidate(uri, stamp, digest)
+        if parsed is not None:
+            return parsed
+
+        logger.debug("Parsing %s", uri)
+        parsed = ParsedFile(uri, stamp, {}, digest=digest)
+        self._read_yaml_file(parsed, lines)
+        parsed.defaults = parse_defaults(parsed.data)
+        parsed.includes = self._get_includes(parsed)
+        self.cache.put(parsed)
+
+        return parsed
+
+    def invalidate_files(self, changes: Dict[str, bool], roots: List[str]) -> Set[str]:
+        """
+        Forget the files changed outside of the editor (``changes`` maps a file
+        to whether it was deleted), returns the root configs which include any of them
+        """
+        affected: Set[str] = set()
+        for uri, deleted in changes.items():
+            self.groups.invalidate(uri_to_path(uri))
+            affected.update(self.graph.roots_including(uri, roots))
+            if deleted:
+                self.cache.invalidate(uri)
+                self.graph.remove(uri)
+
+        return affected
+
+    def add_parsed_file(self, parsed: ParsedFile) -> None:
+        """Add a file parsed elsewhere (e.g. by a worker process) to the cache"""
+        self.cache.put(parsed)
+        self.graph.set_includes(parsed.uri, parsed.includes)
+
+    def load_index(self, path: str) -> int:
+        """Warm the cache up with the on-disk index, returns the number of files"""
+        files = self.cache.load(path, partial(get_file_stamp, None))
+        for parsed in files:
+            self.graph.set_includes(parsed.uri, parsed.includes)
+
+        return len(files)
+
+    def save_index(self, path: str) -> int:
+        """Write the files parsed from disk to the on-disk index"""
+        return self.cache.save(path, partial(get_file_stamp, None))
+
+    def _get_includes(self, parsed: ParsedFile) -> List[str]:
+        """
+        URIs of the files the ``defaults`` list of the file refers to.
+        Overrides and absolute paths (relative to the root config) are only known
+        when the config is composed.
+        """
+        folder = get_folder(parsed.uri)
+        includes = []
+        for entry in parsed.defaults:
+            if entry.is_self or entry.override:
+                continue
+
+            if entry.group is None:
+                if not entry.options[0].startswith("/"):
+                    includes.append(os.path.join(folder, f"{entry.options[0]}.yaml"))
+            elif not entry.group.startswith("/"):
+                group_folder = os.path.join(folder, entry.group)
+                includes.extend(
+                    os.path.join(group_folder, f"{option}.yaml")
+                    for option in entry.options
+                )
 
-                        case BlockMappingStartToken():
-                            base_key += f".{prev_key}" if base_key else prev_key
+        return includes
 
-                        case (
-                            BlockSequenceStartToken()
-                            | FlowSequenceStartToken()
-                            | FlowMappingStartToken()
-                            | BlockEntryToken()
-                        ):
-                            pass
+    def _exists(self, uri: str) -> bool:
+        if self.ls is not None and uri in self.ls.workspace.text_documents:
+            return True
 
-                        case _:
-                            raise ValueError(f"Unexpected token: {n_token}")
+        return self.groups.has(uri_to_path(uri))
 
-                case ScalarToken():
-                    for var in self._get_variables(token):
-                        self.references[var].append(self._get_location(token, filename))
+    def _get_group_name(self, folder: str) -> str:
+        """Config group of the folder, e.g. "server/db" (relative to the search root)"""
+        group = os.path.relpath(
+            uri_to_path(folder), uri_to_path(self.search_root) or "."
+        )
+        return "" if group == "." or group.startswith("..") else group
 
-    def _update_context(self, filename: str):
-        tokens = self._get_yaml_tokens(filename)
-        self._process_tokens(tokens, filename)
+    def _resolve_entry(
+        self, entry: DefaultEntry, folder: str, overrides: Dict[str, List[str]]
+    ) -> List[Tuple[str, str]]:
+        """
+        URIs of the configs selected by the ``defaults`` entry and their groups,
+        the files may not exist
+        """
+        if entry.group is None:
+            name = entry.options[0]
+            base = self.search_root if name.startswith("/") else folder
+            uri = os.path.join(base, f"{name.lstrip('/')}.yaml")
+            return [(uri, self._get_group_name(os.path.dirname(uri)))]
+
+        base = self.search_root if entry.group.startswith("/") else folder
+        group_folder = os.path.join(base, entry.group.lstrip("/"))
+        group = self._get_group_name(group_folder)
+        return [
+            (os.path.join(group_folder, f"{option}.yaml"), group)
+            for option in overrides.get(group, entry.options)
+        ]
+
+    def _update_context(self, parsed: ParsedFile, package: str = ""):
+        self.files.append(parsed.uri)
+        self.parsed_files[parsed.uri] = parsed
+        self.packages[parsed.uri] = package
+        if package:
+            self.definitions.update(
+                (sys.intern(f"{package}.{k}"), loc)
+                for k, loc in parsed.definitions.items()
+            )
+        else:
+            self.definitions.update(parsed.definitions)
+
+        for var, locations in parsed.references.items():
+            self.references[var].extend(locations)
+
+    def load_yaml_config(
+        self, config_path: str, loading: Set[str] | None = None
+    ) -> Dict:
+        """Compose the config with everything from its ``defaults`` list"""
+        self.search_root = get_folder(config_path)
+        loading = loading if loading is not None else set()
+        return self._compose(self._parse(config_path), loading, {})
+
+    def _parse(self, config_path: str) -> ParsedFile:
+        logger.debug("Loading config from: %s", config_path)
+        if self.token is not None:
+            self.token.check()
+
+        return self.parse_file(config_path)
+
+    def _compose(
+        self,
+        parsed: ParsedFile,
+        loading: Set[str],
+        overrides: Dict[str, List[str]],
+        package: str = "",
+    ) -> Dict:
+        """
+        Compose the config placed at the ``package``, ``overrides`` map a group
+        to the options selected by an "override group: option" entry above.
+        """
+        config_path = parsed.uri
+        folder = get_folder(config_path)
+        loading.add(config_path)
+
+        # the outermost override of a group wins
+        for entry in parsed.defaults:
+            if entry.override and entry.group is not None:
+                base = self.search_root if entry.group.startswith("/") else folder
+                group = self._get_group_name(
+                    os.path.join(base, entry.group.lstrip("/"))
+                )
+                overrides.setdefault(group, entry.options)
 
-    def load_yaml_config(self, config_path: str) -> Dict:
-        logger.info("Loading config from: {}".format(config_path))
-        data = self._get_yaml_file(config_path)
+        # cached data is shared between loads, so it's copied into the result
+        data = nest(parsed.data, package)
 
-        # Recursively load default file (config inheritance)
+        # Recursively load default files (config inheritance),
+        # the config itself is merged at the position of _self_ (the last one if none)
         result: Dict = {}
-        if "defaults" in data:
-            base_folder = "/".join(config_path.split("/")[:-1])
+        merged_self = False
+        for entry in parsed.defaults:
+            if entry.is_self:
+                result = deep_update(result, data)
+                merged_self = True
+                continue
+
+            if entry.override:
+                continue
+
+            for uri, group in self._resolve_entry(entry, folder, overrides):
+                # missing files are kept in the graph too, so creating one
+                # reloads the configs which refer to it
+                self.lookups.add(uri)
+                if not self._exists(uri):
+                    if not entry.optional:
+                        logger.warning(
+                            f"Config {uri} from the defaults list is missing"
+                        )
+                        self.missing.setdefault(config_path, []).append(uri)
+                    continue
 
-            for default_file_path in data["defaults"]:
-                if default_file_path == "_self_":
+                if uri in loading:
+                    logger.error(f"Circular defaults: {uri} in {config_path}")
                     continue
 
-                default_file_path = os.path.join(
-                    base_folder, f"{default_file_path}.yaml"
+                included = self._parse(uri)
+                child_package = get_package(
+                    group.replace("/", "."), package, entry.package, included.package
+                )
+                result = deep_update(
+                    result, self._compose(included, loading, overrides, child_package)
                 )
-                default_data = self.load_yaml_config(default_file_path)
-                result = deep_update(result, default_data)
 
-        data = deep_update(result, data)
-        self._update_context(config_path)
+        if not merged_self:
+            result = deep_update(result, data)
+
+        loading.discard(config_path)
+        self.graph.set_includes(config_path, parsed.includes)
+        self._update_context(parsed, package)
 
-        return data
+        return result
 
-    def load(self, config_path: str) -> HydraContext:
+    def load(self, config_path: str, token: CancelToken | None = None) -> HydraContext:
         """
-        Load the config from the file
+        Load the config from the file.
+        Only the files which changed since the previous load are parsed again.
+
+        Raises ReloadCancelled if the ``token`` is cancelled in the meantime
         """
-        self.definitions.clear()
-        self.references.clear()
+        self.definitions = {}
+        self.references = defaultdict(list)
+        self.files = []
+        self.parsed_files = {}
+        self.packages = {}
+        self.lookups = set()
+        self.missing = {}
+        self.token = token
 
         logger.info(f"Loaded config from: {config_path}")
-        config = self.load_yaml_config(config_path)
+        try:
+            # includes reading and scanning of the changed files
+            with metrics.timer("phase.compose"):
+                config = self.load_yaml_config(config_path)
+        finally:
+            self.token = None
+
+        self.graph.set_composed(config_path, self.lookups)
+
+        with metrics.timer("phase.index"):
+            return HydraContext(
+                config,
+                self.references,
+                self.definitions,
+                self.files,
+                self.parsed_files,
+                self.packages,
+                self.missing,
+            )
+
+
+def parse_files(uris: List[str]) -> List[ParsedFile]:
+    """
+    Parse the files without a language server (files are read from disk).
+    Used by the worker processes of the background indexer.
+    """
+    parser = ConfigParser()
+    result = []
+    for uri in uris:
+        try:
+            result.append(parser.parse_file(uri))
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error(f"Can't read {uri}: {e}")
 
-        return HydraContext(config, self.references, self.definitions)
+    return result
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import cProfile
+import logging
+import os
+import pstats
+import threading
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Profiler:
+    """
+    Opt-in profiling (``hydra-lsp --profile DIR``): requests are profiled with
+    cProfile, the stats are accumulated per request type and written to
+    ``DIR/<request type>.prof`` (readable by pstats, snakeviz etc.).
+
+    Only one request at a time is profiled per thread, the code which runs while
+    it awaits (e.g. other requests) is included in its profile.
+    """
+
+    __slots__ = ["directory", "stats", "lock", "local"]
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.stats: Dict[str, pstats.Stats] = {}
+        self.lock = threading.Lock()
+        # the profile active in the current thread
+        self.local = threading.local()
+
+    def _start(self) -> cProfile.Profile | None:
+        if getattr(self.local, "profile", None) is not None:
+            return None
+
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # another profiler is active
+            return None
+
+        self.local.profile = profile
+        return profile
+
+    def _stop(self, name: str, profile: cProfile.Profile | None) -> None:
+        if profile is None:
+            return
+
+        profile.disable()
+        self.local.profile = None
+
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                self.stats[name] = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+
+    def run(self, name: str, f: Callable, *args, **kwargs) -> Any:
+        profile = self._start()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            self._stop(name, profile)
+
+    async def run_async(
+        self, name: str, f: Callable[..., Awaitable], *args, **kwargs
+    ) -> Any:
+        profile = self._start()
+        try:
+            return await f(*args, **kwargs)
+        finally:
+            self._stop(name, profile)
+
+    def dump(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            for name, stats in self.stats.items():
+                path = os.path.join(self.directory, f"{name.replace('/', '.')}.prof")
+                stats.dump_stats(path)
+                logger.info(f"Profile of {name} is saved to {path}")
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import logging
+import re
+from typing import TYPE_CHECKING, Any, Dict, List, Set
+
+if TYPE_CHECKING:
+    from hydra_lsp.context import HydraContext
+
+logger = logging.getLogger(__name__)
+
+INTERPOLATION = re.compile(r"\${(.*?)}")
+
+# value of a key which does not exist (None is a valid value)
+MISSING = object()
+
+
+def is_custom_resolver(reference: str) -> bool:
+    """${oc.env:HOME}, ${now:%H-%M} etc. are resolved by OmegaConf at runtime"""
+    return ":" in reference
+
+
+def get_absolute_key(reference: str, key: str) -> str:
+    """
+    Convert a relative reference to the absolute one:
+        ${.b} in "x.a" -> "x.b", ${..b} in "x.y.a" -> "x.b"
+    """
+    if not reference.startswith("."):
+        return reference
+
+    name = reference.lstrip(".")
+    depth = len(reference) - len(name)
+    parent = key.rsplit(".", depth)[0] if key.count(".") >= depth else ""
+
+    return f"{parent}.{name}" if parent else name
+
+
+class Resolver:
+    """
+    Resolves ${} interpolations of the context values.
+
+    Every key is resolved at most once: interpolations are followed depth first
+    (i.e. in topological order of the interpolation graph) and the results are
+    memoized, so resolving the whole config is linear in its size.
+    The keys being resolved are kept on an explicit stack, so long chains of
+    interpolations don't hit the recursion limit.
+    Circular interpolations and chains ending in an undefined key are recorded
+    in ``errors``.
+    """
+
+    __slots__ = ["context", "resolved", "errors", "_stack", "_active"]
+
+    def __init__(self, context: HydraContext):
+        self.context = context
+        self.resolved: Dict[str, Any] = {}
+        # key -> why it (or anything it depends on) can't be resolved
+        self.errors: Dict[str, str] = {}
+        # [key, raw value, keys it depends on, index of the next one]
+        # of the keys being resolved at the moment
+        self._stack: List[List] = []
+        # the keys on the stack, to detect cycles
+        self._active: Set[str] = set()
+
+    def lookup(self, key: str) -> Any:
+        """Raw value of the key, MISSING if there is no such key"""
+        return self.context.values.get(key, MISSING)
+
+    def resolve(self, key: str) -> Any:
+        """Resolved value of the key, None if it does not exist"""
+        value = self._resolve(key)
+        return None if value is MISSING else value
+
+    def _resolve(self, key: str) -> Any:
+        if key in self.resolved:
+            return self.resolved[key]
+
+        if not self._push(key):
+            return MISSING
+
+        while self._stack:
+            frame = self._stack[-1]
+            dependencies = frame[2]
+            if frame[3] < len(dependencies):
+                dependency = dependencies[frame[3]]
+                frame[3] += 1
+                if dependency in self._active:
+                    self._add_cycle(dependency)
+                elif dependency not in self.resolved:
+                    self._push(dependency)
+                continue
+
+            self._stack.pop()
+            self._active.discard(frame[0])
+            self.resolved[frame[0]] = self._combine(frame[0], frame[1])
+
+        return self.resolved[key]
+
+    def _push(self, key: str) -> bool:
+        """Start resolving the key, False if there is no such key"""
+        value = self.lookup(key)
+        if value is MISSING:
+            return False
+
+        if isinstance(value, dict):
+            dependencies = [f"{key}.{k}" for k in value]
+        elif isinstance(value, list):
+            dependencies = [f"{key}.{i}" for i in range(len(value))]
+        elif isinstance(value, str) and "${" in value:
+            dependencies = [
+                get_absolute_key(reference, key)
+                for reference in INTERPOLATION.findall(value)
+                if not is_custom_resolver(reference)
+            ]
+        else:
+            self.resolved[key] = value
+            return True
+
+        self._stack.append([key, value, dependencies, 0])
+        self._active.add(key)
+        return True
+
+    def _add_cycle(self, key: str) -> None:
+        """The key is reached again while it is being resolved"""
+        keys = [frame[0] for frame in self._stack]
+        cycle = keys[keys.index(key) :] + [key]
+        message = f"circular interpolation: {' -> '.join(cycle)}"
+        for k in cycle[:-1]:
+            self.errors.setdefault(k, message)
+
+    def _combine(self, key: str, value: Any) -> Any:
+        """The value of the key once everything it depends on is resolved"""
+        if isinstance(value, dict):
+            return {k: self.resolved.get(f"{key}.{k}", MISSING) for k in value}
+        if isinstance(value, list):
+            return [self.resolved.get(f"{key}.{i}", MISSING) for i in range(len(value))]
+
+        return self._interpolate(key, value)
+
+    def _interpolate(self, key: str, value: str) -> Any:
+        references = INTERPOLATION.findall(value)
+
+        resolved = {}
+        for reference in references:
+            if is_custom_resolver(reference):
+                continue
+
+            target = get_absolute_key(reference, key)
+            # the keys on the stack (a cycle) are not resolved yet
+            target_value = self.resolved.get(target, MISSING)
+
+            if target in self.errors:
+                self.errors.setdefault(key, self.errors[target])
+            elif target_value is MISSING:
+                self.errors.setdefault(key, f"`{target}` is not defined")
+            else:
+                resolved[reference] = target_value
+
+        # the whole value is a single interpolation: keep the type of the target
+        if len(references) == 1 and value == f"${{{references[0]}}}":
+            return resolved.get(references[0], value)
+
+        return INTERPOLATION.sub(
+            lambda m: str(resolved[m[1]]) if m[1] in resolved else m[0], value
+        )
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import logging
+from collections import OrderedDict
+from typing import List, Tuple
+
+from hydra_lsp.cache import ParsedFile
+from hydra_lsp.context import HydraContext
+from hydra_lsp.resolver import is_custom_resolver
+
+logger = logging.getLogger(__name__)
+
+# legend of the semantic tokens, the index of a type is its code
+TOKEN_TYPES = ["property", "variable", "function"]
+TOKEN_MODIFIERS = ["unresolved"]
+
+TOKEN_KEY = 0  # a key of a mapping
+TOKEN_INTERPOLATION = 1  # ${data.size}
+TOKEN_RESOLVER = 2  # ${oc.env:HOME}
+
+MODIFIER_UNRESOLVED = 1  # ${undefined.key}
+
+# compare the token streams in blocks of this many ints, see diff
+BLOCK = 1024
+
+Edit = Tuple[int, int, List[int]]
+
+
+def get_tokens(parsed: ParsedFile) -> List[Tuple[int, int, int, str, str]]:
+    """
+    (packed start, length, type, reference, key of the value) of the tokens of
+    the file in the order of their positions: keys come from the definitions,
+    ${} from the interpolations found by the parser. Built once per parsed file.
+    """
+    if parsed.tokens is not None:
+        return parsed.tokens
+
+    tokens = [
+        (
+            loc.start,
+            (loc.end & 0xFFFFFFFF) - (loc.start & 0xFFFFFFFF),
+            TOKEN_KEY,
+            "",
+            "",
+        )
+        for loc in parsed.definitions.values()
+        # tokens can't span lines (e.g. complex keys)
+        if loc.start_line == loc.end_line
+    ]
+    tokens.extend(
+        (
+            start,
+            length,
+            TOKEN_RESOLVER if is_custom_resolver(reference) else TOKEN_INTERPOLATION,
+            reference,
+            key,
+        )
+        # aliased scalars are walked again, so the same ${} can be found twice
+        for start, length, reference, key in set(parsed.interpolations)
+    )
+    tokens.sort()
+
+    parsed.tokens = tokens
+    return tokens
+
+
+def encode(parsed: ParsedFile, context: HydraContext | None) -> List[int]:
+    """
+    Tokens in the LSP format: 5 ints per token (delta line, delta start,
+    length, type, modifiers). Interpolations which can't be resolved in the
+    context are marked as unresolved.
+    """
+    data: List[int] = []
+    line = character = 0
+    for start, length, token_type, reference, key in get_tokens(parsed):
+        modifiers = 0
+        if token_type == TOKEN_INTERPOLATION and context is not None:
+            target = context.get_reference_key(reference, key, parsed.uri)
+            if context.get_reference_error(target) is not None:
+                modifiers = MODIFIER_UNRESOLVED
+
+        token_line, token_character = start >> 32, start & 0xFFFFFFFF
+        if token_line != line:
+            character = 0
+        data += (
+            token_line - line,
+            token_character - character,
+            length,
+            token_type,
+            modifiers,
+        )
+        line, character = token_line, token_character
+
+    return data
+
+
+def diff(old: List[int], new: List[int]) -> Edit | None:
+    """
+    A single edit turning ``old`` into ``new``: (start, delete count, data),
+    None if they are equal. The common prefix and suffix are skipped block by
+    block, so only the changed blocks are compared int by int.
+    """
+    if old == new:
+        return None
+
+    size = min(len(old), len(new))
+    prefix = 0
+    while (
+        prefix + BLOCK <= size
+        and old[prefix : prefix + BLOCK] == new[prefix : prefix + BLOCK]
+    ):
+        prefix += BLOCK
+    while prefix < size and old[prefix] == new[prefix]:
+        prefix += 1
+
+    suffix = 0
+    limit = size - prefix
+    while (
+        suffix + BLOCK <= limit
+        and old[len(old) - suffix - BLOCK : len(old) - suffix]
+        == new[len(new) - suffix - BLOCK : len(new) - suffix]
+    ):
+        suffix += BLOCK
+    while suffix < limit and old[len(old) - suffix - 1] == new[len(new) - suffix - 1]:
+        suffix += 1
+
+    return prefix, len(old) - prefix - suffix, new[prefix : len(new) - suffix]
+
+
+class SemanticTokens:
+    """
+    Semantic tokens of the documents. The last result of every document is kept,
+    so the next request can be answered with the delta against it.
+    """
+
+    # the results of at most this many documents are kept
+    MAX_DOCUMENTS: int = 64
+
+    __slots__ = ["results", "counter"]
+
+    def __init__(self):
+        # uri -> (result id, data)
+        self.results: OrderedDict[str, Tuple[str, List[int]]] = OrderedDict()
+        self.counter = 0
+
+    def _put(self, uri: str, data: List[int]) -> str:
+        self.counter += 1
+        result_id = str(self.counter)
+
+        self.results[uri] = (result_id, data)
+        self.results.move_to_end(uri)
+        while len(self.results) > self.MAX_DOCUMENTS:
+            self.results.popitem(last=False)
+
+        return result_id
+
+    def full(
+        self, uri: str, parsed: ParsedFile, context: HydraContext | None
+    ) -> Tuple[str, List[int]]:
+        """Result id and all the tokens of the document"""
+        data = encode(parsed, context)
+        return self._put(uri, data), data
+
+    def delta(
+        self,
+        uri: str,
+        parsed: ParsedFile,
+        context: HydraContext | None,
+        previous_id: str,
+    ) -> Tuple[str, List[int], List[Edit] | None]:
+        """
+        Result id, all the tokens of the document and the edits of the previous
+        result (None if the previous result is not known anymore)
+        """
+        previous = self.results.get(uri)
+        data = encode(parsed, context)
+        result_id = self._put(uri, data)
+
+        if previous is None or previous[0] != previous_id:
+            logger.debug("No semantic tokens %s for %s", previous_id, uri)
+            return result_id, data, None
+
+        edit = diff(previous[1], data)
+        return result_id, data, [edit] if edit is not None else []
+
+    def forget(self, uri: str) -> None:
+        self.results.pop(uri, None)
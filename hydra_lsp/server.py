@@ -1,119 +1,867 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
 import logging
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
 from importlib import metadata
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Tuple, TypeVar
 
 from lsprotocol import types as lsp_types
-from lsprotocol.types import CompletionList, WorkDoneProgressBegin, WorkDoneProgressEnd
+from lsprotocol.types import (
+    CompletionList,
+    TextDocumentSyncKind,
+    WorkDoneProgressBegin,
+    WorkDoneProgressEnd,
+)
 from pygls.server import LanguageServer
 
 from hydra_lsp.autocomplete import Completer
+from hydra_lsp.cache import ContextCache
 from hydra_lsp.context import HydraContext
 from hydra_lsp.intel import HydraIntel
-from hydra_lsp.parser import ConfigParser
+from hydra_lsp.metrics import metrics
+from hydra_lsp.parser import CancelToken, ConfigParser, ReloadCancelled, uri_to_path
+from hydra_lsp.profiling import Profiler
+from hydra_lsp.semantic import TOKEN_MODIFIERS, TOKEN_TYPES, SemanticTokens
+from hydra_lsp.settings import Settings
+from hydra_lsp.symbols import SymbolIndex
+from hydra_lsp.targets import PYTHON_EXTENSIONS, TargetIndex
+
+if TYPE_CHECKING:
+    from hydra_lsp.indexer import WorkspaceIndexer
 
 logger = logging.getLogger(__name__)
+# sampled requests (see HydraLSP.trace_sample) are logged here
+trace_logger = logging.getLogger("hydra_lsp.trace")
+
+R = TypeVar("R")
+
+
+class PendingLoad:
+    """A running load of a root config, shared by everyone waiting for it"""
+
+    __slots__ = ["token", "future", "waiters", "pinned"]
+
+    def __init__(self, token: CancelToken, future: asyncio.Future):
+        self.token = token
+        self.future = future
+        # requests waiting for the load
+        self.waiters = 0
+        # waited for by a notification, so never cancelled by the requests
+        self.pinned = False
 
 
 class HydraLSP(LanguageServer):
     CONFIGURATION_SECTION: str = "hydralsp"
 
-    __slots__ = ["init_params", "config_loaded", "context", "intel", "completer"]
+    # delay (in seconds) after the last keystroke before re-indexing a document
+    CHANGE_DEBOUNCE: float = 0.05
+
+    # delay (in seconds) after the last change of a watched file before re-indexing,
+    # so that e.g. a branch switch is re-indexed in a single batch
+    WATCH_DEBOUNCE: float = 0.3
+
+    # files changed outside of the editor the client notifies about
+    WATCHED_FILES: Tuple[str, ...] = ("**/*.yaml", "**/*.py")
+
+    # workspace/executeCommand returning the metrics of the server
+    METRICS_COMMAND: str = "hydra-lsp.metrics"
+
+    # at most this many results of workspace/symbol
+    MAX_SYMBOLS: int = 100
+
+    __slots__ = [
+        "init_params",
+        "settings",
+        "config_loaded",
+        "parser_executor",
+        "contexts",
+        "reloads",
+        "intel",
+        "completer",
+        "semantic_tokens",
+        "symbols",
+        "targets",
+        "targets_lock",
+        "pending_changes",
+        "file_changes",
+        "pending_file_changes",
+        "profiler",
+        "trace_sample",
+    ]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
         self.init_params: lsp_types.InitializeParams | None = None
+        self.settings: Settings = Settings()
 
+        # the parser (and its caches) is only used from this single worker thread,
+        # so reloads never block the event loop
         self.config_loaded: ConfigParser = ConfigParser(self)
-        self.context: HydraContext | None = None
+        self.parser_executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="hydra-parser"
+        )
+
+        # last good contexts, requests are served from them while reloading
+        self.contexts: ContextCache = ContextCache(
+            self.settings.max_contexts, self.settings.memory_budget
+        )
+        # root config -> the running load, requests wait for it (see load_config)
+        self.reloads: Dict[str, PendingLoad] = {}
 
         self.intel: HydraIntel = HydraIntel(self)
         self.completer: Completer = Completer()
-
-    def reload_config(self, file_path: str) -> None:
-        """Load configuration."""
-        self.context = self.config_loaded.load(file_path)
-        self.completer.update(self.context)
+        # only used from the parser thread
+        self.semantic_tokens: SemanticTokens = SemanticTokens()
+        self.symbols: SymbolIndex = SymbolIndex()
+        # read from the event loop, only replaced as a whole (see update_targets)
+        self.targets: TargetIndex = TargetIndex()
+        self.targets_lock = asyncio.Lock()
+
+        self.pending_changes: Dict[str, asyncio.Task] = {}
+
+        # watched files changed since the last batch -> whether they were deleted
+        self.file_changes: Dict[str, bool] = {}
+        self.pending_file_changes: asyncio.Task | None = None
+
+        # set by the command line options (--profile, --trace-sample)
+        self.profiler: Profiler | None = None
+        # share of the requests which are logged with their params and duration
+        self.trace_sample: float = 0.0
+
+    def feature(self, feature_name: str, options: Any | None = None) -> Callable:
+        """Register an LSP feature, see instrument"""
+        register = super().feature(feature_name, options)
+        return lambda f: register(self.instrument(feature_name, f))
+
+    def instrument(self, name: str, f: Callable) -> Callable:
+        """Time every call of the handler, profile and trace it when enabled"""
+        f = metrics.timed(f"lsp.{name}")(f)
+
+        if asyncio.iscoroutinefunction(f):
+
+            @wraps(f)
+            async def async_wrapper(*args, **kwargs):
+                start = self._start_trace()
+                try:
+                    if self.profiler is not None:
+                        return await self.profiler.run_async(name, f, *args, **kwargs)
+                    return await f(*args, **kwargs)
+                finally:
+                    if start is not None:
+                        self._trace(name, start, args)
+
+            return async_wrapper
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            start = self._start_trace()
+            try:
+                if self.profiler is not None:
+                    return self.profiler.run(name, f, *args, **kwargs)
+                return f(*args, **kwargs)
+            finally:
+                if start is not None:
+                    self._trace(name, start, args)
+
+        return wrapper
+
+    def _start_trace(self) -> float | None:
+        """Start time of the request if it is sampled for tracing, None otherwise"""
+        if self.trace_sample and random.random() < self.trace_sample:
+            return time.perf_counter()
+
+        return None
+
+    def _trace(self, name: str, start: float, args: tuple) -> None:
+        trace_logger.info(
+            "%s took %.2f ms, params: %s",
+            name,
+            (time.perf_counter() - start) * 1000,
+            args[-1] if args else None,
+        )
+
+    def apply_settings(self, options: Dict | None) -> None:
+        self.settings.update(options)
+        self.contexts.max_contexts = self.settings.max_contexts
+        self.contexts.memory_budget = self.settings.memory_budget
+
+    async def run_parser(self, fn: Callable[..., R], *args) -> R:
+        """Run the function in the parser thread"""
+        if self.profiler is not None:
+            name = f"parser.{getattr(fn, '__name__', 'call')}"
+            fn = partial(self.profiler.run, name, fn)
+
+        return await self.loop.run_in_executor(self.parser_executor, fn, *args)
+
+    async def reload_config(self, file_path: str) -> HydraContext | None:
+        """
+        Load configuration in the parser thread (after a change of the files).
+        A newer reload of the same root config cancels the pending one,
+        returns None if this reload got cancelled.
+        """
+        previous = self.reloads.pop(file_path, None)
+        if previous is not None:
+            previous.token.cancel()
+
+        return await self._wait_load(self._start_load(file_path), pinned=True)
+
+    async def load_config(
+        self, file_path: str, pinned: bool = False
+    ) -> HydraContext | None:
+        """
+        Wait for the running load of the root config (or the newer one which
+        superseded it), start one if none.
+        The loads started or joined by notifications are ``pinned``, the other
+        ones are cancelled once all the requests waiting for them are.
+        """
+        pending = self.reloads.get(file_path)
+        while True:
+            if pending is None or pending.token.cancelled:
+                pending = self._start_load(file_path)
+
+            context = await self._wait_load(pending, pinned)
+            if context is not None:
+                return context
+
+            pending = self.reloads.get(file_path)
+            if pending is None:
+                return self.contexts.get(file_path)
+
+    def _start_load(self, file_path: str) -> PendingLoad:
+        token = CancelToken()
+        pending = PendingLoad(
+            token, asyncio.ensure_future(self._load_config(file_path, token))
+        )
+        self.reloads[file_path] = pending
+        return pending
+
+    async def _wait_load(
+        self, pending: PendingLoad, pinned: bool
+    ) -> HydraContext | None:
+        # the load is shared between the waiters, so it is not cancelled
+        # together with one of them
+        if pinned:
+            pending.pinned = True
+            return await asyncio.shield(pending.future)
+
+        pending.waiters += 1
+        try:
+            return await asyncio.shield(pending.future)
+        except asyncio.CancelledError:
+            if pending.waiters == 1 and not pending.pinned:
+                logger.info("All the requests waiting for a load are cancelled")
+                pending.token.cancel()
+            raise
+        finally:
+            pending.waiters -= 1
+
+    async def _load_config(
+        self, file_path: str, token: CancelToken
+    ) -> HydraContext | None:
+        try:
+            context = await self.run_parser(self._compose, file_path, token)
+        except ReloadCancelled:
+            logger.info(f"Reload of {file_path} is cancelled")
+            return None
+        finally:
+            pending = self.reloads.get(file_path)
+            if pending is not None and pending.token is token:
+                del self.reloads[file_path]
+
+        self.contexts.put(file_path, context)
         logger.info(f"Context loaded from {file_path}")
 
+        return context
+
+    def _compose(self, file_path: str, token: CancelToken) -> HydraContext:
+        """Load the root config and build its indexes (in the parser thread)"""
+        context = self.config_loaded.load(file_path, token)
+        Completer.build_index(context)
+        return context
+
+    def cancel_pending(self) -> None:
+        """Cancel the running loads and the scheduled re-indexing (on shutdown)"""
+        for pending in self.reloads.values():
+            pending.token.cancel()
+        self.reloads.clear()
+
+        for task in self.pending_changes.values():
+            task.cancel()
+        self.pending_changes.clear()
+
+        if self.pending_file_changes is not None:
+            self.pending_file_changes.cancel()
+            self.pending_file_changes = None
+        self.file_changes.clear()
+
+    def get_index_path(self) -> str | None:
+        """Path of the on-disk index of the workspace, None if it is disabled"""
+        root = self.workspace.root_path
+        if not self.settings.persistent_index or not root:
+            return None
+
+        cache_dir = self.settings.cache_dir or os.path.join(
+            os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"),
+            "hydra-lsp",
+        )
+        name = hashlib.blake2b(root.encode(), digest_size=8).hexdigest()
+        return os.path.join(cache_dir, f"{name}.idx")
+
+    async def load_index(self) -> None:
+        path = self.get_index_path()
+        if path is not None:
+            await self.run_parser(self.config_loaded.load_index, path)
+
+    def get_indexer(self) -> WorkspaceIndexer:
+        """Indexer of the workspace files, running the parser in the parser thread"""
+        # multiprocessing is only imported when the workspace is indexed
+        from hydra_lsp.indexer import WorkspaceIndexer
+
+        return WorkspaceIndexer(
+            self,
+            self.config_loaded,
+            workers=self.settings.index_workers or None,
+            executor=self.parser_executor,
+        )
+
+    async def update_targets(self, update: Callable[[TargetIndex], Any]) -> None:
+        """
+        Update a copy of the target index and replace the current one with it,
+        so the requests keep reading a complete index from the event loop.
+        ``update`` is a coroutine function, it runs the parser in the parser
+        thread. Updates are applied one at a time, none of them is lost.
+        """
+        async with self.targets_lock:
+            index = await self.run_parser(self.targets.copy)
+            await update(index)
+            # built before it is read from the event loop
+            await self.run_parser(index.get_names)
+            self.targets = index
+
+    async def index_targets(self) -> None:
+        """
+        Index the Python files of the workspace for ``_target_``, the files
+        which did not change since the last run are taken from the disk
+        """
+        index_path = self.get_index_path()
+        path = os.path.splitext(index_path)[0] + ".targets" if index_path else None
+        parsed = 0
+
+        async def update(index: TargetIndex) -> None:
+            nonlocal parsed
+            if path is not None:
+                await self.run_parser(index.load, path)
+            parsed = await self.get_indexer().index_targets(index)
+
+        await self.update_targets(update)
+        if not parsed or path is None:
+            return
+
+        try:
+            # the index is never modified once it is served
+            await self.run_parser(self.targets.save, path)
+        except OSError as e:
+            logger.error(f"Can't save the targets to {path}: {e}")
+
+    async def refresh_targets(self, paths: List[str]) -> None:
+        """Parse the changed Python files again, forget the deleted ones"""
+
+        async def update(index: TargetIndex) -> None:
+            await self.run_parser(index.refresh, paths)
+
+        await self.update_targets(update)
+
+    async def save_index(self) -> None:
+        path = self.get_index_path()
+        if path is None:
+            return
+
+        try:
+            await self.run_parser(self.config_loaded.save_index, path)
+        except OSError as e:
+            logger.error(f"Can't save the index to {path}: {e}")
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Timings of the requests and the pipeline phases, caches and contexts"""
+
+        def hit_rate(hits: int, misses: int) -> float | None:
+            return round(hits / (hits + misses), 3) if hits + misses else None
+
+        cache = self.config_loaded.cache
+        return {
+            "timings": metrics.snapshot(),
+            "parse_cache": {
+                "files": len(cache),
+                "hits": cache.hits,
+                "misses": cache.misses,
+                "revalidated": cache.revalidated,
+                "hit_rate": hit_rate(cache.hits, cache.misses),
+            },
+            "context_cache": {
+                "contexts": len(self.contexts),
+                "hits": self.contexts.hits,
+                "misses": self.contexts.misses,
+                "hit_rate": hit_rate(self.contexts.hits, self.contexts.misses),
+            },
+            "contexts": {
+                root: {"files": len(context.files), "size": context.size}
+                for root, context in self.contexts.contexts.items()
+            },
+        }
+
+    def dump_metrics(self) -> None:
+        path = self.settings.metrics_file
+        if not path:
+            return
+
+        try:
+            with open(path, "w") as f:
+                json.dump(self.get_metrics(), f, indent=2)
+        except OSError as e:
+            logger.error(f"Can't write the metrics to {path}: {e}")
+
+    def get_context(self, uri: str) -> HydraContext | None:
+        """Get the context which owns the document"""
+        return self.contexts.find_owner(uri)
+
+    async def ensure_context(
+        self, uri: str, pinned: bool = False
+    ) -> HydraContext | None:
+        """
+        Get the context which owns the document, load it as a root if none
+        (or wait for the load which is already running, see load_config)
+        """
+        context = self.get_context(uri)
+        if context is None:
+            context = await self.load_config(uri, pinned)
+
+        return context
+
+    def schedule_reindex(self, uri: str) -> None:
+        """
+        Re-index the document once the user stops typing.
+        Every new change postpones (cancels) the pending re-index of the document.
+        """
+        task = self.pending_changes.pop(uri, None)
+        if task is not None:
+            task.cancel()
+
+        self.pending_changes[uri] = asyncio.ensure_future(self._debounced_reindex(uri))
+
+    async def _debounced_reindex(self, uri: str) -> None:
+        await asyncio.sleep(self.CHANGE_DEBOUNCE)
+        del self.pending_changes[uri]
+        await self.reindex_document(uri)
+
+    async def reindex_document(self, uri: str) -> None:
+        """
+        Re-parse the changed document and compose again only the root configs
+        which reach it through ``defaults``.
+        All the other files of the contexts are taken from the parse cache,
+        but the roots are composed as a whole: the contribution of the edited
+        file is not patched into the existing context (a root of ~30k keys
+        takes ~100 ms).
+        """
+        roots = await self.run_parser(
+            self.config_loaded.graph.roots_including, uri, self.contexts.roots()
+        )
+        for root in roots:
+            await self.reload_config(root)
+
+        context = await self.ensure_context(uri, pinned=True)
+        if context is None:
+            return  # superseded by a newer change
+
+        if self.supports_pull_diagnostics():
+            self.refresh_diagnostics()
+        else:
+            self.publish_document_diagnostics(uri, context)
+
+    async def watch_files(self) -> None:
+        """Ask the client to notify about the changes of the config files"""
+        capabilities = self.client_capabilities.workspace
+        watched = capabilities and capabilities.did_change_watched_files
+        if not watched or not watched.dynamic_registration:
+            logger.info("The client can't watch files, changes on disk are not tracked")
+            return
+
+        registration = lsp_types.Registration(
+            id=lsp_types.WORKSPACE_DID_CHANGE_WATCHED_FILES,
+            method=lsp_types.WORKSPACE_DID_CHANGE_WATCHED_FILES,
+            register_options=lsp_types.DidChangeWatchedFilesRegistrationOptions(
+                watchers=[
+                    lsp_types.FileSystemWatcher(glob_pattern=pattern)
+                    for pattern in self.WATCHED_FILES
+                ]
+            ),
+        )
+        try:
+            await self.register_capability_async(
+                lsp_types.RegistrationParams(registrations=[registration])
+            )
+        except Exception as e:
+            logger.error(f"Can't register the file watcher: {e}")
+
+    def schedule_file_changes(self, changes: List[lsp_types.FileEvent]) -> None:
+        """
+        Collect the changes made outside of the editor (e.g. by git), they are
+        applied in a single batch once no new ones come for WATCH_DEBOUNCE.
+        """
+        for change in changes:
+            # open documents are kept up to date by didChange
+            if change.uri in self.workspace.text_documents:
+                continue
+
+            deleted = change.type == lsp_types.FileChangeType.Deleted
+            self.file_changes[change.uri] = deleted
+
+        if not self.file_changes:
+            return
+
+        if self.pending_file_changes is not None:
+            self.pending_file_changes.cancel()
+
+        self.pending_file_changes = asyncio.ensure_future(self._apply_file_changes())
+
+    async def _apply_file_changes(self) -> None:
+        await asyncio.sleep(self.WATCH_DEBOUNCE)
+        # changes which come from now on go to the next batch
+        self.pending_file_changes = None
+        changes, self.file_changes = self.file_changes, {}
+
+        # Python files only matter for the _target_ index
+        modules = [uri for uri in changes if uri.endswith(PYTHON_EXTENSIONS)]
+        if modules:
+            for uri in modules:
+                del changes[uri]
+            if self.settings.target_indexing:
+                await self.refresh_targets([uri_to_path(uri) for uri in modules])
+            if not changes:
+                return
+
+        roots = await self.run_parser(
+            self.config_loaded.invalidate_files, changes, self.contexts.roots()
+        )
+        logger.info(f"{len(changes)} files changed on disk, reloading {len(roots)}")
+
+        for root in roots:
+            if changes.get(root):
+                self.contexts.invalidate(root)
+            else:
+                await self.reload_config(root)
+
+        if not roots:
+            return
+
+        if self.supports_pull_diagnostics():
+            self.refresh_diagnostics()
+            return
+
+        for uri in list(self.workspace.text_documents):
+            context = self.get_context(uri)
+            if context is not None and context.files[-1] in roots:
+                self.publish_document_diagnostics(uri, context)
+
+    def get_semantic_tokens(
+        self, uri: str, context: HydraContext | None, previous_id: str | None = None
+    ) -> lsp_types.SemanticTokens | lsp_types.SemanticTokensDelta:
+        """
+        Semantic tokens of the current version of the document (run in the parser
+        thread), the delta against the previous result if ``previous_id`` is given
+        """
+        parsed = self.config_loaded.parse_file(uri)
+        if previous_id is None:
+            result_id, data = self.semantic_tokens.full(uri, parsed, context)
+            return lsp_types.SemanticTokens(data=data, result_id=result_id)
+
+        result_id, data, edits = self.semantic_tokens.delta(
+            uri, parsed, context, previous_id
+        )
+        if edits is None:
+            return lsp_types.SemanticTokens(data=data, result_id=result_id)
+
+        return lsp_types.SemanticTokensDelta(
+            edits=[
+                lsp_types.SemanticTokensEdit(
+                    start=start, delete_count=delete_count, data=data
+                )
+                for start, delete_count, data in edits
+            ],
+            result_id=result_id,
+        )
+
+    def get_workspace_symbols(self, query: str) -> List[lsp_types.SymbolInformation]:
+        """Keys of all the parsed files matching the query (run in the parser thread)"""
+        self.symbols.sync(self.config_loaded.cache)
+        return [
+            lsp_types.SymbolInformation(
+                name=key,
+                kind=lsp_types.SymbolKind.Key,
+                location=loc.to_lsp(),
+                container_name=key.rpartition(".")[0] or None,
+            )
+            for key, loc in self.symbols.search(query, self.MAX_SYMBOLS)
+        ]
+
+    def supports_pull_diagnostics(self) -> bool:
+        capabilities = self.client_capabilities.text_document
+        return capabilities is not None and capabilities.diagnostic is not None
+
+    def refresh_diagnostics(self) -> None:
+        """Ask the client to pull the diagnostics again"""
+        capabilities = self.client_capabilities.workspace
+        if capabilities is None or capabilities.diagnostics is None:
+            return
+
+        if capabilities.diagnostics.refresh_support:
+            self.lsp.send_request(lsp_types.WORKSPACE_DIAGNOSTIC_REFRESH)
+
+    def publish_document_diagnostics(self, uri: str, context: HydraContext) -> None:
+        """Push diagnostics to the clients which don't pull them"""
+        if self.supports_pull_diagnostics():
+            return
+
+        diagnostics = self.intel.get_diagnostics(context, uri)
+        self.publish_diagnostics(uri, diagnostics)
+
 
 version = metadata.version("hydra-lsp")
-server = HydraLSP("hydralsp", f"v{version}")
+server = HydraLSP(
+    "hydralsp", f"v{version}", text_document_sync_kind=TextDocumentSyncKind.Incremental
+)
 
 
-@server.feature(lsp_types.INITIALIZED)
+@server.feature(lsp_types.INITIALIZE)
 def initialize(ls: HydraLSP, params: lsp_types.InitializeParams) -> None:
+    """Connection is being initialized, read the client options."""
+    ls.init_params = params
+    ls.apply_settings(params.initialization_options)
+
+
+@server.feature(lsp_types.INITIALIZED)
+async def initialized(ls: HydraLSP, params: lsp_types.InitializedParams) -> None:
     """Connection is initialized."""
     logger.info("Server is initialized")
-    ls.init_params = params
+    await ls.watch_files()
+    await ls.load_index()
+
+    if ls.settings.background_indexing:
+        if await ls.get_indexer().index():
+            await ls.save_index()
+        # the keys of all the files are indexed before the first workspace/symbol
+        await ls.run_parser(ls.symbols.sync, ls.config_loaded.cache)
+
+    if ls.settings.target_indexing:
+        await ls.index_targets()
+
+
+@server.feature(lsp_types.SHUTDOWN)
+async def shutdown(ls: HydraLSP, params: None) -> None:
+    """Server is shutting down, keep the index for the next start."""
+    # the loads are not waited for, the parser thread is only needed for the index
+    ls.cancel_pending()
+    await ls.save_index()
+    ls.dump_metrics()
+    ls.parser_executor.shutdown(wait=False, cancel_futures=True)
+
+
+@server.command(HydraLSP.METRICS_COMMAND)
+def get_metrics(ls: HydraLSP, args: Any) -> Dict[str, Any]:
+    """Metrics of the server, see HydraLSP.get_metrics"""
+    return ls.get_metrics()
 
 
 @server.feature(lsp_types.TEXT_DOCUMENT_DID_OPEN)
-def did_open(ls: HydraLSP, params: lsp_types.DidOpenTextDocumentParams) -> None:
+async def did_open(ls: HydraLSP, params: lsp_types.DidOpenTextDocumentParams) -> None:
     """Document opened."""
     logger.info(f"Document opened: {params.text_document.uri}")
 
-    ls.progress.begin("context", WorkDoneProgressBegin(title="Indexing"))
-    ls.reload_config(params.text_document.uri)
+    # switching to an already indexed document costs nothing
+    context = ls.get_context(params.text_document.uri)
+    if context is None:
+        ls.progress.begin("context", WorkDoneProgressBegin(title="Indexing"))
+        try:
+            context = await ls.load_config(params.text_document.uri, pinned=True)
+        finally:
+            ls.progress.end("context", WorkDoneProgressEnd())
+
+    if context is None:
+        return
 
-    diagnostics = ls.intel.get_diagnostics(ls.context, params.text_document.uri)
-    ls.publish_diagnostics(params.text_document.uri, diagnostics)
-    ls.progress.end("context", WorkDoneProgressEnd())
+    ls.publish_document_diagnostics(params.text_document.uri, context)
+
+
+@server.feature(lsp_types.TEXT_DOCUMENT_DID_CLOSE)
+async def did_close(ls: HydraLSP, params: lsp_types.DidCloseTextDocumentParams) -> None:
+    """Document closed, its semantic tokens are not needed for deltas anymore."""
+    logger.debug("Document closed: %s", params.text_document.uri)
+
+    await ls.run_parser(ls.semantic_tokens.forget, params.text_document.uri)
 
 
 @server.feature(lsp_types.TEXT_DOCUMENT_DID_CHANGE)
 def did_change(ls: HydraLSP, params: lsp_types.DidChangeTextDocumentParams) -> None:
     """Document changed."""
-    logger.info(f"Document changed: {params.text_document.uri}")
+    logger.debug("Document changed: %s", params.text_document.uri)
+
+    ls.schedule_reindex(params.text_document.uri)
 
-    # NOTE: perform diagnostics and reload config? (should it be done on every change?)
-    # self.reload_config(params.text_document.uri)
+
+@server.feature(lsp_types.WORKSPACE_DID_CHANGE_WATCHED_FILES)
+def did_change_watched_files(
+    ls: HydraLSP, params: lsp_types.DidChangeWatchedFilesParams
+) -> None:
+    """Files changed outside of the editor."""
+    logger.debug("Watched files changed: %s", params.changes)
+
+    ls.schedule_file_changes(params.changes)
 
 
 @server.feature(lsp_types.TEXT_DOCUMENT_DID_SAVE)
-def did_save(ls: HydraLSP, params: lsp_types.DidSaveTextDocumentParams) -> None:
+async def did_save(ls: HydraLSP, params: lsp_types.DidSaveTextDocumentParams) -> None:
     """Document saved."""
     logger.info(f"Document saved: {params.text_document.uri}")
 
-    ls.progress.begin("context", WorkDoneProgressBegin(title="Indexing"))
-    ls.reload_config(params.text_document.uri)
+    # the file may be a new option of a config group
+    ls.config_loaded.groups.invalidate(uri_to_path(params.text_document.uri))
 
-    diagnostics = ls.intel.get_diagnostics(ls.context, params.text_document.uri)
-    ls.publish_diagnostics(params.text_document.uri, diagnostics)
-    ls.progress.end("context", WorkDoneProgressEnd())
+    ls.progress.begin("context", WorkDoneProgressBegin(title="Indexing"))
+    try:
+        await ls.reindex_document(params.text_document.uri)
+    finally:
+        ls.progress.end("context", WorkDoneProgressEnd())
+
+
+@server.feature(
+    lsp_types.TEXT_DOCUMENT_DIAGNOSTIC,
+    lsp_types.DiagnosticOptions(
+        identifier="hydra-lsp",
+        inter_file_dependencies=True,
+        workspace_diagnostics=True,
+    ),
+)
+async def diagnostic(
+    ls: HydraLSP, params: lsp_types.DocumentDiagnosticParams
+) -> lsp_types.DocumentDiagnosticReport:
+    """Diagnostics of a document pulled by the client."""
+    uri = params.text_document.uri
+    context = await ls.ensure_context(uri)
+
+    return ls.intel.get_document_diagnostic_report(
+        context, uri, params.previous_result_id
+    )
+
+
+@server.feature(lsp_types.WORKSPACE_DIAGNOSTIC)
+def workspace_diagnostic(
+    ls: HydraLSP, params: lsp_types.WorkspaceDiagnosticParams
+) -> lsp_types.WorkspaceDiagnosticReport:
+    """Diagnostics of all the indexed files pulled by the client."""
+    previous_ids = {p.uri: p.value for p in params.previous_result_ids}
+
+    return ls.intel.get_workspace_diagnostic_report(ls.contexts.owners(), previous_ids)
 
 
 @server.feature(lsp_types.TEXT_DOCUMENT_DEFINITION)
-def definition(
+async def definition(
     ls: HydraLSP, params: lsp_types.TextDocumentPositionParams
 ) -> lsp_types.Location | None:
     """Definition of a symbol."""
-    logger.info(f"Definition feature is called with params: {params}")
+    context = await ls.ensure_context(params.text_document.uri)
+    if ls.settings.target_indexing:
+        location = ls.intel.get_target_definition(params, context, ls.targets)
+        if location is not None:
+            return location
 
-    return ls.intel.get_definition(params, ls.context)
+    return ls.intel.get_definition(params, context)
 
 
 @server.feature(lsp_types.TEXT_DOCUMENT_REFERENCES)
-def references(
+async def references(
     ls: HydraLSP, params: lsp_types.ReferenceParams
 ) -> list[lsp_types.Location] | None:
     """Provide a list of references for the symbol at the current cursor position."""
-    logger.info(f"References feature is called with params: {params}")
-
-    return ls.intel.get_references(params, ls.context)
+    context = await ls.ensure_context(params.text_document.uri)
+    return ls.intel.get_references(params, context)
 
 
 @server.feature(lsp_types.TEXT_DOCUMENT_HOVER)
-def hover(ls: HydraLSP, params: lsp_types.HoverParams) -> lsp_types.Hover | None:
+async def hover(ls: HydraLSP, params: lsp_types.HoverParams) -> lsp_types.Hover | None:
     """Cursor over a symbol."""
-    logger.info(f"Hover feature is called with params: {params}")
-
-    return ls.intel.get_hover(params, ls.context)
-
-
-@server.feature(lsp_types.TEXT_DOCUMENT_COMPLETION)
-def completions(params: lsp_types.CompletionParams) -> CompletionList:
-    logger.info("Completions feature is called")
-
-    return server.completer.get_completions(server, params)
+    context = await ls.ensure_context(params.text_document.uri)
+    if ls.settings.target_indexing:
+        hover = ls.intel.get_target_hover(params, context, ls.targets)
+        if hover is not None:
+            return hover
+
+    return ls.intel.get_hover(params, context)
+
+
+@server.feature(
+    lsp_types.TEXT_DOCUMENT_COMPLETION,
+    lsp_types.CompletionOptions(resolve_provider=True),
+)
+async def completions(
+    ls: HydraLSP, params: lsp_types.CompletionParams
+) -> CompletionList:
+    context = await ls.ensure_context(params.text_document.uri)
+    if ls.settings.target_indexing:
+        targets = ls.completer.get_target_completions(ls, params, ls.targets)
+        if targets is not None:
+            return targets
+
+    return ls.completer.get_completions(ls, params, context)
+
+
+@server.feature(
+    lsp_types.TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL,
+    lsp_types.SemanticTokensLegend(
+        token_types=TOKEN_TYPES, token_modifiers=TOKEN_MODIFIERS
+    ),
+)
+async def semantic_tokens_full(
+    ls: HydraLSP, params: lsp_types.SemanticTokensParams
+) -> lsp_types.SemanticTokens:
+    """Highlighting of the keys and the interpolations."""
+    uri = params.text_document.uri
+    context = await ls.ensure_context(uri)
+    return await ls.run_parser(ls.get_semantic_tokens, uri, context)
+
+
+@server.feature(lsp_types.TEXT_DOCUMENT_SEMANTIC_TOKENS_FULL_DELTA)
+async def semantic_tokens_delta(
+    ls: HydraLSP, params: lsp_types.SemanticTokensDeltaParams
+) -> lsp_types.SemanticTokens | lsp_types.SemanticTokensDelta:
+    """Changes of the highlighting since the previous result."""
+    uri = params.text_document.uri
+    context = await ls.ensure_context(uri)
+    return await ls.run_parser(
+        ls.get_semantic_tokens, uri, context, params.previous_result_id
+    )
+
+
+@server.feature(lsp_types.WORKSPACE_SYMBOL)
+async def workspace_symbol(
+    ls: HydraLSP, params: lsp_types.WorkspaceSymbolParams
+) -> List[lsp_types.SymbolInformation]:
+    """Keys defined anywhere in the workspace."""
+    return await ls.run_parser(ls.get_workspace_symbols, params.query)
+
+
+@server.feature(lsp_types.COMPLETION_ITEM_RESOLVE)
+def completion_resolve(
+    ls: HydraLSP, item: lsp_types.CompletionItem
+) -> lsp_types.CompletionItem:
+    """Add documentation to the completion item selected by the user."""
+    root = (item.data or {}).get("root")
+    context = ls.contexts.get(root) if root is not None else None
+
+    return ls.completer.resolve(item, context)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class Settings:
+    """
+    Server options.
+    Can be overridden by the client with ``initializationOptions``, e.g.:
+        {"maxContexts": 4, "backgroundIndexing": true, "targetIndexing": true}
+    """
+
+    __slots__ = [
+        "max_contexts",
+        "memory_budget",
+        "background_indexing",
+        "index_workers",
+        "target_indexing",
+        "persistent_index",
+        "cache_dir",
+        "metrics_file",
+    ]
+
+    # option name in the client (camelCase) -> attribute
+    OPTIONS: Dict[str, str] = {
+        "maxContexts": "max_contexts",
+        "memoryBudget": "memory_budget",
+        "backgroundIndexing": "background_indexing",
+        "indexWorkers": "index_workers",
+        "targetIndexing": "target_indexing",
+        "persistentIndex": "persistent_index",
+        "cacheDir": "cache_dir",
+        "metricsFile": "metrics_file",
+    }
+
+    def __init__(self):
+        # how many composed root configs are kept alive at the same time
+        self.max_contexts: int = 16
+        # total size of the kept contexts, measured in indexed entries
+        # (definitions + references), see HydraContext.size
+        self.memory_budget: int = 2_000_000
+        # parse every YAML file of the workspace in background after initialization
+        self.background_indexing: bool = False
+        # number of processes used by the background indexer (0 - number of CPUs)
+        self.index_workers: int = 0
+        # parse the Python files of the workspace for ``_target_`` (see TargetIndex),
+        # off by default like background_indexing: it walks the whole workspace
+        self.target_indexing: bool = False
+        # keep the parsed files on disk between restarts
+        self.persistent_index: bool = True
+        # where the index is stored ("" - $XDG_CACHE_HOME/hydra-lsp)
+        self.cache_dir: str = ""
+        # dump the metrics (see HydraLSP.get_metrics) to this JSON file on shutdown
+        self.metrics_file: str = ""
+
+    def update(self, options: Dict[str, Any] | None) -> None:
+        for name, value in (options or {}).items():
+            attr = self.OPTIONS.get(name)
+            if attr is None:
+                logger.warning(f"Unknown option: {name}")
+                continue
+
+            expected = type(getattr(self, attr))
+            if not isinstance(value, expected):
+                logger.warning(f"Invalid value for {name}: {value!r}")
+                continue
+
+            setattr(self, attr, value)
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import logging
+import re
+from array import array
+from collections import defaultdict
+from functools import lru_cache, partial
+from itertools import islice
+from typing import Callable, DefaultDict, Dict, FrozenSet, Iterable, List, Set, Tuple
+
+from hydra_lsp.cache import FileCache, ParsedFile
+from hydra_lsp.context import Loc
+from hydra_lsp.utils import KeyBlob, is_subsequence
+
+logger = logging.getLogger(__name__)
+
+# "data.loader_type" -> data, loader, type; "LoaderType" -> Loader, Type
+SEGMENT = re.compile(r"[A-Z]?[^\W_A-Z]+|[A-Z]")
+
+# how the key matched the query, lower is better
+MATCH_NAME = 0  # loader -> data.loader
+MATCH_NAME_PREFIX = 1  # load -> data.loader
+MATCH_SUBSTRING = 2  # a.loa -> data.loader
+MATCH_FUZZY = 3  # dlo -> data.loader
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+def strip(text: str) -> str:
+    """Lowercase text without the separators"""
+    return "".join(SEGMENT.findall(text)).lower()
+
+
+@lru_cache(maxsize=65536)
+def _jumps(segment: str, following: str, after: str) -> FrozenSet[str]:
+    """
+    Trigrams jumping from the segment to the head of the ``following`` one
+    (``after`` is the head of the segment after it)
+    """
+    head = following[0]
+    # then the next char, or a jump to the head after it
+    nexts = {following[1] if len(following) > 1 else after, after} - {""}
+    result = {a + head + c for a in segment for c in nexts}
+    # two chars of the segment, then a jump
+    result.update(segment[j : j + 2] + head for j in range(len(segment) - 2))
+
+    return frozenset(result)
+
+
+def fuzzy_trigrams(key: str) -> Set[str]:
+    """
+    Trigrams of the lowercase key without the separators, where every next char
+    is either the following one or the first char of the next segment (after a
+    separator or a case change), so abbreviations are found:
+        "dlb" and "lbs" are fuzzy trigrams of "data.loader.batch_size"
+    The trigrams of a key containing a query include the trigrams of the query
+    (both without the separators).
+    """
+    segments = [segment.lower() for segment in SEGMENT.findall(key)]
+    result = trigrams("".join(segments))
+    for i in range(len(segments) - 1):
+        after = segments[i + 2][0] if i + 2 < len(segments) else ""
+        result |= _jumps(segments[i], segments[i + 1], after)
+
+    return result
+
+
+class SymbolIndex:
+    """
+    Keys defined in all the parsed files (the ones in the FileCache), for
+    ``workspace/symbol``. Every distinct key gets an id, the ids are indexed by
+    their fuzzy trigrams (see fuzzy_trigrams), a query is only compared with
+    the keys in the posting of its rarest trigram.
+    The index follows the cache (see sync): only the files which were added,
+    re-parsed or removed since the last sync are updated. Ids of the keys which
+    are not defined anymore are left in the postings and skipped, until there
+    are too many of them and the index is rebuilt.
+    """
+
+    __slots__ = [
+        "files",
+        "keys",
+        "lowercase",
+        "key_ids",
+        "names",
+        "key_files",
+        "postings",
+        "dead",
+        "version",
+        "_blob",
+    ]
+
+    def __init__(self):
+        # uri -> the ParsedFile its keys were indexed from
+        self.files: Dict[str, ParsedFile] = {}
+        # id -> key, "" once it is not defined in any file
+        self.keys: List[str] = []
+        # id -> lowercase key (the same string if the key is lowercase)
+        self.lowercase: List[str] = []
+        self.key_ids: Dict[str, int] = {}
+        # lowercase last segment of the key -> ids
+        self.names: DefaultDict[str, List[int]] = defaultdict(list)
+        # id -> URIs of the files defining the key
+        self.key_files: List[List[str]] = []
+        self.postings: DefaultDict[str, array] = defaultdict(lambda: array("I"))
+        self.dead = 0
+        # version of the cache at the last sync
+        self.version = -1
+        # all the keys in a single string, built on the first short query
+        self._blob: KeyBlob | None = None
+
+    def __len__(self) -> int:
+        return len(self.key_ids)
+
+    def sync(self, cache: FileCache) -> None:
+        """Update the index with the files changed in the cache since the last sync"""
+        if cache.version == self.version:
+            return
+
+        removed = [uri for uri in self.files if uri not in cache.files]
+        for uri in removed:
+            self._remove(uri)
+
+        changed = 0
+        for uri, parsed in cache.files.items():
+            if self.files.get(uri) is not parsed:
+                self._remove(uri)
+                self._add(parsed)
+                changed += 1
+
+        self.version = cache.version
+        if self.dead > len(self.key_ids):
+            self._rebuild()
+
+        logger.debug(
+            "Symbols synced: %d files changed, %d removed, %d keys",
+            changed,
+            len(removed),
+            len(self.key_ids),
+        )
+
+    def _add(self, parsed: ParsedFile) -> None:
+        self.files[parsed.uri] = parsed
+        for key in parsed.definitions:
+            key_id = self.key_ids.get(key)
+            if key_id is None:
+                key_id = self.key_ids[key] = len(self.keys)
+                lowercase = key.lower()
+                if lowercase == key:
+                    lowercase = key
+                self.keys.append(key)
+                self.lowercase.append(lowercase)
+                self.key_files.append([])
+                self.names[lowercase.rpartition(".")[2]].append(key_id)
+                for gram in fuzzy_trigrams(key):
+                    self.postings[gram].append(key_id)
+                self._blob = None
+
+            self.key_files[key_id].append(parsed.uri)
+
+    def _remove(self, uri: str) -> None:
+        parsed = self.files.pop(uri, None)
+        if parsed is None:
+            return
+
+        for key in parsed.definitions:
+            key_id = self.key_ids[key]
+            files = self.key_files[key_id]
+            files.remove(uri)
+            if not files:
+                del self.key_ids[key]
+                self.keys[key_id] = self.lowercase[key_id] = ""
+                self.dead += 1
+                self._blob = None
+
+    def _rebuild(self) -> None:
+        files = list(self.files.values())
+        self.files.clear()
+        self.keys.clear()
+        self.lowercase.clear()
+        self.key_ids.clear()
+        self.names.clear()
+        self.key_files.clear()
+        self.postings.clear()
+        self.dead = 0
+        self._blob = None
+        for parsed in files:
+            self._add(parsed)
+
+    def search(self, query: str, limit: int = 100) -> List[Tuple[str, Loc]]:
+        """
+        (key, location) of the keys matching the query, at most ``limit`` of them,
+        best first: the last segment of the key is the query or starts with it,
+        the key contains the query, the key contains the query as a subsequence.
+        Collecting stops a bit after the limit, the rest is dropped.
+        """
+        query = query.lower()
+        if not query:
+            return self._locate(islice(self.key_ids, limit), limit)
+
+        budget = limit * 4
+        # key -> kind of the match
+        matches: Dict[str, int] = {}
+        for key_id in self.names.get(query, ()):
+            if self.keys[key_id]:
+                matches[self.keys[key_id]] = MATCH_NAME
+
+        chars = strip(query)
+        for key_id in self._find(query, chars, budget):
+            key = self.keys[key_id]
+            if key not in matches:
+                name = self.lowercase[key_id].rpartition(".")[2]
+                prefix = name.startswith(query)
+                matches[key] = MATCH_NAME_PREFIX if prefix else MATCH_SUBSTRING
+
+        if len(matches) < limit:
+            for key_id in self._find_fuzzy(chars, budget):
+                matches.setdefault(self.keys[key_id], MATCH_FUZZY)
+
+        ranked = sorted(matches.items(), key=lambda m: (m[1], len(m[0]), m[0]))
+        return self._locate((key for key, _ in ranked), limit)
+
+    def _find(self, query: str, chars: str, budget: int) -> List[int]:
+        """
+        Ids of at most ``budget`` + 1 keys containing the query,
+        ``chars`` is the query without the separators
+        """
+        if len(chars) < 3:
+            # too short for trigrams, all the keys are scanned
+            found, _ = self._get_blob().find(query, budget)
+            return found
+
+        return self._scan(trigrams(chars), lambda key: query in key, budget)
+
+    def _find_fuzzy(self, chars: str, budget: int) -> List[int]:
+        """Ids of at most ``budget`` + 1 keys containing the chars as a subsequence"""
+        if not chars:
+            return []
+        if len(chars) < 3:
+            found, _ = self._get_blob().search(chars, budget)
+            return found
+
+        return self._scan(trigrams(chars), partial(is_subsequence, chars), budget)
+
+    def _scan(
+        self, grams: Set[str], match: Callable[[str], bool], budget: int
+    ) -> List[int]:
+        """
+        Ids of the keys of the shortest posting of the trigrams which ``match``
+        (it gets the lowercase key), at most ``budget`` + 1 of them
+        """
+        shortest: array | None = None
+        for gram in grams:
+            postings = self.postings.get(gram)
+            if postings is None:
+                return []
+            if shortest is None or len(postings) < len(shortest):
+                shortest = postings
+
+        found = []
+        for key_id in shortest or ():
+            # the keys which are not defined anymore are empty, they never match
+            if self.lowercase[key_id] and match(self.lowercase[key_id]):
+                found.append(key_id)
+                if len(found) > budget:
+                    break
+
+        return found
+
+    def _locate(self, keys: Iterable[str], limit: int) -> List[Tuple[str, Loc]]:
+        """(key, location) for every file defining the keys, at most ``limit``"""
+        result: List[Tuple[str, Loc]] = []
+        for key in keys:
+            for uri in self.key_files[self.key_ids[key]]:
+                result.append((key, self.files[uri].definitions[key]))
+            if len(result) >= limit:
+                return result[:limit]
+
+        return result
+
+    def _get_blob(self) -> KeyBlob:
+        if self._blob is None:
+            self._blob = KeyBlob(self.lowercase)
+
+        return self._blob
@@ -0,0 +1,500 @@
+"""
+Static index of the Python callables ``_target_`` refers to.
+Modules are parsed with ast, nothing is ever imported.
+"""
+from __future__ import annotations
+
+import ast
+import logging
+import os
+import pickle
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Tuple
+
+from hydra_lsp.utils import discover_files
+
+logger = logging.getLogger(__name__)
+
+TARGET_KEY = "_target_"
+
+PYTHON_EXTENSIONS = (".py",)
+
+# bump it whenever the serialized format of Module changes
+TARGETS_VERSION = 1
+
+# re-exports are followed at most this deep
+MAX_ALIASES = 8
+
+
+class Param:
+    """A parameter of a callable, ``kind`` is "*" or "**" for the variadic ones"""
+
+    __slots__ = ["name", "annotation", "default", "kind", "line", "column"]
+
+    def __init__(
+        self,
+        name: str,
+        annotation: str | None = None,
+        default: str | None = None,
+        kind: str = "",
+        line: int = 0,
+        column: int = 0,
+    ):
+        self.name = name
+        # source of the annotation and of the default value
+        self.annotation = annotation
+        self.default = default
+        self.kind = kind
+        # zero-based position of the parameter in the module
+        self.line = line
+        self.column = column
+
+    def __str__(self) -> str:
+        result = self.kind + self.name
+        if self.annotation is not None:
+            result += f": {self.annotation}"
+        if self.default is not None:
+            result += f" = {self.default}" if self.annotation else f"={self.default}"
+        return result
+
+
+class Target:
+    """
+    A class or a function of a module. ``params`` of a class are the ones of its
+    ``__init__`` (or the fields of a dataclass), None if they are inherited
+    from the ``bases``.
+    """
+
+    __slots__ = ["name", "kind", "path", "line", "column", "params", "bases", "doc"]
+
+    def __init__(
+        self,
+        name: str,
+        kind: str,
+        path: str,
+        line: int,
+        column: int,
+        params: List[Param] | None,
+        bases: List[str] | None = None,
+        doc: str | None = None,
+    ):
+        # dotted name, e.g. "torch.optim.Adam"
+        self.name = name
+        # "class" or "function"
+        self.kind = kind
+        self.path = path
+        self.line = line
+        self.column = column
+        self.params = params
+        # dotted names of the base classes (as far as they are known)
+        self.bases = bases if bases is not None else []
+        # first paragraph of the docstring
+        self.doc = doc
+
+
+class Module:
+    """Targets and imported names of a single Python file"""
+
+    __slots__ = ["path", "name", "stamp", "targets", "imports"]
+
+    def __init__(
+        self,
+        path: str,
+        name: str,
+        stamp: int | None,
+        targets: List[Target] | None = None,
+        imports: Dict[str, str] | None = None,
+    ):
+        self.path = path
+        self.name = name
+        # mtime of the file, the module is parsed again when it changes
+        self.stamp = stamp
+        self.targets: List[Target] = targets if targets is not None else []
+        # local name -> dotted name of the imported object (``from x import y``)
+        self.imports: Dict[str, str] = imports if imports is not None else {}
+
+
+def get_stamp(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def get_module_name(path: str) -> str:
+    """Dotted name of the module, its packages are the folders with ``__init__.py``"""
+    folder, filename = os.path.split(path)
+    parts = [] if filename == "__init__.py" else [filename[: -len(".py")]]
+    while os.path.isfile(os.path.join(folder, "__init__.py")):
+        folder, package = os.path.split(folder)
+        parts.append(package)
+
+    return ".".join(reversed(parts))
+
+
+def _unparse(node: ast.AST | None) -> str | None:
+    return ast.unparse(node) if node is not None else None
+
+
+def _get_doc(node: ast.AST) -> str | None:
+    doc = ast.get_docstring(node)  # type: ignore[arg-type]
+    return doc.split("\n\n")[0].strip() if doc else None
+
+
+def _get_params(args: ast.arguments, method: bool) -> List[Param]:
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+
+    def param(arg: ast.arg, default: ast.AST | None, kind: str = "") -> Param:
+        return Param(
+            arg.arg,
+            _unparse(arg.annotation),
+            _unparse(default),
+            kind,
+            arg.lineno - 1,
+            arg.col_offset,
+        )
+
+    params = [param(arg, default) for arg, default in zip(positional, defaults)]
+    if method:
+        # self or cls
+        params = params[1:]
+    if args.vararg is not None:
+        params.append(param(args.vararg, None, "*"))
+    params.extend(param(a, d) for a, d in zip(args.kwonlyargs, args.kw_defaults))
+    if args.kwarg is not None:
+        params.append(param(args.kwarg, None, "**"))
+
+    return params
+
+
+def _is_dataclass(node: ast.ClassDef) -> bool:
+    for decorator in node.decorator_list:
+        if isinstance(decorator, ast.Call):
+            decorator = decorator.func
+        if _unparse(decorator).rpartition(".")[2] == "dataclass":
+            return True
+
+    return False
+
+
+def _get_class_params(node: ast.ClassDef) -> List[Param] | None:
+    for item in node.body:
+        if isinstance(item, ast.FunctionDef) and item.name == "__init__":
+            return _get_params(item.args, method=True)
+
+    if not _is_dataclass(node):
+        return None
+
+    return [
+        Param(
+            item.target.id,
+            _unparse(item.annotation),
+            _unparse(item.value),
+            line=item.lineno - 1,
+            column=item.col_offset,
+        )
+        for item in node.body
+        if isinstance(item, ast.AnnAssign)
+        and isinstance(item.target, ast.Name)
+        and not _unparse(item.annotation).startswith(("ClassVar", "typing.ClassVar"))
+    ]
+
+
+def _resolve_import(package: str, node: ast.ImportFrom) -> str:
+    """Absolute name of the module of ``from ... import``"""
+    if not node.level:
+        return node.module or ""
+
+    parts = package.split(".") if package else []
+    base = parts[: len(parts) - node.level + 1]
+    if node.module:
+        base.append(node.module)
+
+    return ".".join(base)
+
+
+def parse_module(path: str) -> Module:
+    """Classes and functions defined at the top level of the file (and nested classes)"""
+    stamp = get_stamp(path)
+    name = get_module_name(path)
+    module = Module(path, name, stamp)
+
+    try:
+        with open(path, "rb") as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError, ValueError, RecursionError) as e:
+        logger.debug("Can't parse %s: %s", path, e)
+        return module
+
+    # relative imports of a package's __init__ are relative to the package itself
+    package = name if path.endswith("__init__.py") else name.rpartition(".")[0]
+    # names of the classes and functions defined in the module
+    local = set()
+
+    def base_name(node: ast.AST) -> str:
+        base = _unparse(node)
+        head, _, rest = base.partition(".")
+        if head in module.imports:
+            return module.imports[head] + (f".{rest}" if rest else "")
+        if head in local:
+            return f"{name}.{base}"
+        return base
+
+    stack: List[Tuple[str, List[ast.stmt]]] = [(name, tree.body)]
+    while stack:
+        prefix, body = stack.pop()
+        for node in body:
+            if isinstance(node, ast.ImportFrom) and prefix == name:
+                source = _resolve_import(package, node)
+                for alias in node.names:
+                    if alias.name != "*":
+                        local_name = alias.asname or alias.name
+                        module.imports[local_name] = f"{source}.{alias.name}"
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if prefix == name:
+                    local.add(node.name)
+                    module.targets.append(
+                        Target(
+                            f"{prefix}.{node.name}",
+                            "function",
+                            path,
+                            node.lineno - 1,
+                            node.col_offset,
+                            _get_params(node.args, method=False),
+                            doc=_get_doc(node),
+                        )
+                    )
+            elif isinstance(node, ast.ClassDef):
+                if prefix == name:
+                    local.add(node.name)
+                module.targets.append(
+                    Target(
+                        f"{prefix}.{node.name}",
+                        "class",
+                        path,
+                        node.lineno - 1,
+                        node.col_offset,
+                        _get_class_params(node),
+                        [base_name(base) for base in node.bases],
+                        _get_doc(node),
+                    )
+                )
+                stack.append((f"{prefix}.{node.name}", node.body))
+
+    return module
+
+
+def format_signature(target: Target, params: List[Param]) -> str:
+    """``class my.Model(size: int, dropout=0.1)``"""
+    keyword = "class" if target.kind == "class" else "def"
+    return f"{keyword} {target.name}({', '.join(map(str, params))})"
+
+
+def parse_modules(paths: List[str]) -> List[Module]:
+    """Parse a chunk of the Python files, runs in the worker processes"""
+    return [parse_module(path) for path in paths]
+
+
+class TargetIndex:
+    """
+    Classes and functions of the Python files of the workspace by their dotted
+    name, and the names they are re-exported under (``from .x import Y`` in a
+    package). A file is parsed again only when its mtime changes.
+    The server never modifies the index it serves the requests from: a copy is
+    updated in the parser thread and replaces it (see HydraLSP.update_targets).
+    """
+
+    __slots__ = ["modules", "targets", "by_module", "_names"]
+
+    def __init__(self):
+        # path -> Module
+        self.modules: Dict[str, Module] = {}
+        # dotted name -> Target, dotted module name -> Module
+        self.targets: Dict[str, Target] = {}
+        self.by_module: Dict[str, Module] = {}
+        # sorted names of all the targets (with the re-exports), see complete
+        self._names: List[str] | None = None
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def copy(self) -> TargetIndex:
+        """A copy to update, the modules are shared (they never change)"""
+        index = TargetIndex()
+        index.modules = dict(self.modules)
+        index.targets = dict(self.targets)
+        index.by_module = dict(self.by_module)
+        return index
+
+    def get_stale_files(self, roots: Iterable[str]) -> List[str]:
+        """
+        Python files under the folders which are not parsed yet or changed since,
+        the deleted ones are forgotten
+        """
+        files = discover_files(roots, PYTHON_EXTENSIONS)
+        self.remove(set(self.modules).difference(files))
+
+        return self.get_stale(files)
+
+    def get_stale(self, paths: Iterable[str]) -> List[str]:
+        stale = []
+        for path in paths:
+            module = self.modules.get(path)
+            if (
+                module is None
+                or module.stamp is None
+                or module.stamp != get_stamp(path)
+            ):
+                stale.append(path)
+
+        return stale
+
+    def update(self, modules: Iterable[Module]) -> None:
+        for module in modules:
+            self._remove(module.path)
+            self.modules[module.path] = module
+            self.by_module[module.name] = module
+            for target in module.targets:
+                self.targets[target.name] = target
+
+        self._names = None
+
+    def remove(self, paths: Iterable[str]) -> None:
+        for path in paths:
+            self._remove(path)
+
+        self._names = None
+
+    def _remove(self, path: str) -> None:
+        module = self.modules.pop(path, None)
+        if module is None:
+            return
+
+        if self.by_module.get(module.name) is module:
+            del self.by_module[module.name]
+        for target in module.targets:
+            if self.targets.get(target.name) is target:
+                del self.targets[target.name]
+
+    def refresh(self, paths: Iterable[str]) -> int:
+        """Parse the changed files again and forget the deleted ones"""
+        paths = list(paths)
+        self.remove(path for path in paths if not os.path.isfile(path))
+        stale = self.get_stale(path for path in paths if os.path.isfile(path))
+        self.update(parse_modules(stale))
+
+        return len(stale)
+
+    def get(self, name: str) -> Target | None:
+        """The target by its dotted name, re-exports are followed"""
+        for _ in range(MAX_ALIASES):
+            target = self.targets.get(name)
+            if target is not None:
+                return target
+
+            # the longest known module the name starts with
+            module, attribute = name, ""
+            while module and module not in self.by_module:
+                module, _, head = module.rpartition(".")
+                attribute = f"{head}.{attribute}" if attribute else head
+            if not module or not attribute:
+                return None
+
+            local, _, rest = attribute.partition(".")
+            imported = self.by_module[module].imports.get(local)
+            if imported is None:
+                return None
+
+            name = f"{imported}.{rest}" if rest else imported
+
+        return None
+
+    def get_params(self, target: Target) -> List[Param]:
+        """Parameters of the target, the ones of a class may come from its bases"""
+        seen = set()
+        queue = [target]
+        while queue:
+            current = queue.pop(0)
+            if current.params is not None:
+                return current.params
+            if current.name in seen:
+                continue
+
+            seen.add(current.name)
+            queue.extend(
+                base for base in map(self.get, current.bases) if base is not None
+            )
+
+        return []
+
+    def complete(self, prefix: str, limit: int = 100) -> Tuple[List[str], bool]:
+        """Names starting with the prefix, at most ``limit``, and whether there are more"""
+        names = self.get_names()
+        start = bisect_left(names, prefix)
+        end = bisect_right(names, prefix + "\U0010ffff", start)
+
+        return names[start : min(end, start + limit)], end - start > limit
+
+    def get_names(self) -> List[str]:
+        """Sorted names of the targets and their re-exports, built once"""
+        if self._names is not None:
+            return self._names
+
+        names = sorted(self.targets)
+        # the names re-exported by the packages, with the classes nested in them
+        exported = []
+        for module in self.modules.values():
+            if not module.path.endswith("__init__.py"):
+                continue
+
+            for local, imported in module.imports.items():
+                target = self.get(imported)
+                if target is None:
+                    continue
+
+                alias = f"{module.name}.{local}"
+                exported.append(alias)
+                start = bisect_left(names, f"{target.name}.")
+                end = bisect_right(names, f"{target.name}.\U0010ffff", start)
+                size = len(target.name)
+                exported.extend(alias + name[size:] for name in names[start:end])
+
+        self._names = sorted(set(names).union(exported))
+        return self._names
+
+    def save(self, path: str) -> int:
+        """Write the parsed modules to disk, returns their number"""
+        modules = list(self.modules.values())
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(TARGETS_VERSION, f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(modules, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+        logger.info(f"Saved {len(modules)} Python modules to {path}")
+        return len(modules)
+
+    def load(self, path: str) -> int:
+        """Read the modules saved by save, the changed ones are parsed again later"""
+        try:
+            with open(path, "rb") as f:
+                if pickle.load(f) != TARGETS_VERSION:
+                    logger.info(
+                        f"Targets {path} have an outdated format, ignoring them"
+                    )
+                    return 0
+
+                modules = pickle.load(f)
+        except FileNotFoundError:
+            return 0
+        except Exception as e:
+            logger.error(f"Can't read the targets {path}: {e}")
+            return 0
+
+        self.update(modules)
+        logger.info(f"Loaded {len(modules)} Python modules from {path}")
+
+        return len(modules)
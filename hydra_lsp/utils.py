@@ -1,15 +1,26 @@
 from __future__ import annotations
 
-import collections
 import logging
+import os
+import re
+from bisect import bisect_right
+from typing import TYPE_CHECKING, Dict, Iterable, List, Tuple
 
-from lsprotocol.types import MarkupContent, MarkupKind
+if TYPE_CHECKING:
+    from lsprotocol.types import MarkupContent
 
 logger = logging.getLogger(__name__)
 
+YAML_EXTENSIONS = (".yaml", ".yml")
+
+# never searched for files (e.g. a virtual environment in the workspace)
+SKIPPED_FOLDERS = {"__pycache__", "node_modules", "site-packages"}
+
 
 def to_markdown_content(value: str, lang: str = "json") -> MarkupContent:
     """Return the MarkupContent with Markdown kind."""
+    from lsprotocol.types import MarkupContent, MarkupKind
+
     return MarkupContent(kind=MarkupKind.Markdown, value=f"```{lang}\n{value}\n```")
 
 
@@ -26,6 +37,98 @@ def yaml_get_var_prefix(line: str, pos: int = 0) -> str | None:
     return line[start + len("${") : pos]
 
 
+# "- optional db@backup: my" -> ("db", "my"), the option is None before ":"
+DEFAULTS_ENTRY = re.compile(
+    r"^\s*-\s*(?:(?:optional|override)\s+)*([\w/.\-]*)(?:@[\w.]*)?(?:\s*:\s*(\S*))?$"
+)
+
+
+def yaml_get_default_entry(
+    lines: List[str], line: int, pos: int
+) -> Tuple[str, str | None] | None:
+    """
+    Get the group and the typed option of the ``defaults`` list item at the cursor:
+        defaults:
+          - db: my<cursor>
+    it will return ("db", "my"), or ("d", None) for "- d<cursor>"
+    """
+    match = DEFAULTS_ENTRY.match(lines[line][:pos])
+    if match is None:
+        return None
+
+    # the list must be the value of the top-level "defaults" key
+    for above in reversed(lines[:line]):
+        if above.strip() and not above[0].isspace() and not above.startswith("-"):
+            if not above.startswith("defaults:"):
+                return None
+            return match.group(1), match.group(2)
+
+    return None
+
+
+# "  - _target_: torch.optim.Adam" -> (prefix up to the value, the value)
+TARGET_VALUE = re.compile(r"""^(\s*(?:-\s+)?_target_\s*:\s*["']?)([\w.]*)""")
+
+# "  - lr: 0.1" -> (indentation with the dashes, key, value)
+MAPPING_ITEM = re.compile(r"^(\s*(?:-\s+)*)([^\s#:][^:]*?)\s*:(?:\s+(.*))?$")
+
+
+def yaml_get_target(line: str) -> Tuple[int, str] | None:
+    """
+    Get the position and the value of ``_target_`` on the line:
+        "  _target_: torch.optim.Adam" -> (12, "torch.optim.Adam")
+    """
+    match = TARGET_VALUE.match(line)
+    if match is None:
+        return None
+
+    return match.end(1), match.group(2)
+
+
+def yaml_get_siblings(lines: List[str], line: int) -> Dict[str, str]:
+    """
+    Get the other keys of the mapping the line belongs to with their raw values
+    (judging by the indentation, the line itself may be incomplete):
+        model:
+          _target_: my.Model
+          hid<cursor>
+    it will return {"_target_": "my.Model"}
+    """
+    current = lines[line]
+    indent = len(current) - len(current.lstrip(" -"))
+    starts_item = current.lstrip().startswith("-")
+
+    siblings: Dict[str, str] = {}
+    # above the line up to the parent key (or the start of the list item),
+    # then below it up to the end of the mapping
+    for step in (-1, 1):
+        if step == -1 and starts_item:
+            continue
+
+        i = line + step
+        while 0 <= i < len(lines):
+            text = lines[i]
+            i += step
+            if not text.strip() or text.lstrip().startswith("#"):
+                continue
+
+            column = len(text) - len(text.lstrip(" -"))
+            if column < indent:
+                break
+            match = MAPPING_ITEM.match(text)
+            if column > indent or match is None:
+                continue
+
+            item = "-" in match.group(1)
+            if item and step == 1:
+                break
+            siblings.setdefault(match.group(2), (match.group(3) or "").strip())
+            if item:
+                break
+
+    return siblings
+
+
 def yaml_get_key(line: str, position: int) -> str | None:
     """
     Get key from the yaml value (if exists).
@@ -70,12 +173,99 @@ def yaml_get_identifier(line: str, position: int) -> str | None:
 
 def deep_update(source, overrides):
     """
-    Update a nested dictionary or similar mapping.
-    Modify ``source`` in place.
+    Update a nested dictionary.
+    Modify ``source`` in place, nested dictionaries of ``overrides`` are copied.
+    Configs only contain plain dicts, checking for them is much cheaper
+    than for any Mapping.
     """
     for key, value in overrides.items():
-        if isinstance(value, collections.abc.Mapping) and value:
+        if isinstance(value, dict) and value:
             source[key] = deep_update(source.get(key, {}), value)
+        elif isinstance(value, dict):
+            source[key] = {}
         else:
             source[key] = value
     return source
+
+
+def discover_files(roots: Iterable[str], extensions: Tuple[str, ...]) -> List[str]:
+    """
+    Find all the files with the extensions under the given folders,
+    hidden folders and the SKIPPED_FOLDERS are skipped
+    """
+    files = []
+    for root in roots:
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [
+                d
+                for d in dirnames
+                if not d.startswith(".") and d not in SKIPPED_FOLDERS
+            ]
+            files.extend(
+                os.path.join(dirpath, name)
+                for name in filenames
+                if name.endswith(extensions)
+            )
+
+    return sorted(files)
+
+
+def discover_yaml_files(roots: Iterable[str]) -> List[str]:
+    return discover_files(roots, YAML_EXTENSIONS)
+
+
+def is_subsequence(query: str, value: str) -> bool:
+    it = iter(value)
+    return all(c in it for c in query)
+
+
+def chunks(items: List, size: int) -> List[List]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+class KeyBlob:
+    """
+    Keys joined into a single lowercase string, so a fuzzy search over all
+    of them is a single scan of the regex engine
+    """
+
+    __slots__ = ["blob", "offsets"]
+
+    def __init__(self, keys: List[str]):
+        self.blob = "\n".join(keys).lower()
+        # offset of every key in the blob, its index is the index of the key
+        self.offsets: List[int] = []
+        offset = 0
+        for key in keys:
+            self.offsets.append(offset)
+            offset += len(key) + 1
+
+    def search(self, query: str, budget: int) -> Tuple[List[int], bool]:
+        """
+        Indexes of the keys containing the query as a subsequence, at most
+        ``budget`` + 1 of them, and whether the search stopped early
+        """
+        # "abc" -> "a[^\nb]*b[^\nc]*c", the negated classes never backtrack
+        query = query.lower()
+        pattern = re.compile(
+            re.escape(query[0])
+            + "".join(f"[^\n{re.escape(c)}]*{re.escape(c)}" for c in query[1:])
+        )
+        return self._scan(pattern, budget)
+
+    def find(self, text: str, budget: int) -> Tuple[List[int], bool]:
+        """Indexes of the keys containing the text, like search"""
+        return self._scan(re.compile(re.escape(text.lower())), budget)
+
+    def _scan(self, pattern: re.Pattern, budget: int) -> Tuple[List[int], bool]:
+        found: List[int] = []
+        for match in pattern.finditer(self.blob):
+            line = bisect_right(self.offsets, match.start()) - 1
+            if found and found[-1] == line:
+                continue
+
+            found.append(line)
+            if len(found) > budget:
+                return found, True
+
+        return found, False
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from hydra_lsp.autocomplete import Completer
+from hydra_lsp.parser import ConfigParser
+
+
+def test_complete_and_resolve():
+    context = ConfigParser().load("tests/artifacts/config_materials.yaml")
+    completer = Completer()
+    completer.update(context)
+
+    result = completer.complete("data.loader.pin")
+    assert not result.is_incomplete
+    assert result.items[0].label == "data.loader.pin_memory"
+
+    item = result.items[0]
+    assert item.documentation is None
+
+    item = completer.resolve(item, context)
+    assert '"data.loader.pin_memory": "True"' in item.documentation.value
+
+
+def test_complete_without_context():
+    assert Completer().complete("a").items == []
+
+
+def test_complete_is_capped(monkeypatch):
+    monkeypatch.setattr(Completer, "MAX_ITEMS", 3)
+
+    context = ConfigParser().load("tests/artifacts/config_materials.yaml")
+    completer = Completer()
+    completer.update(context)
+
+    result = completer.complete("data")
+    assert result.is_incomplete
+    assert len(result.items) == 3
+
+    assert completer.complete("unknown.key").items == []
+
+
+def test_complete_next_segment():
+    context = ConfigParser().load("tests/artifacts/config_materials.yaml")
+    completer = Completer()
+    completer.update(context)
+
+    labels = [item.label for item in completer.complete("data.lo").items]
+    assert labels[0] == "data.loader"
+    assert "data.loader.batch_size" in labels
+    assert labels.index("data.loader") < labels.index("data.loader.batch_size")
+
+    # subsequence of the last segment
+    labels = [item.label for item in completer.complete("data.ldr").items]
+    assert labels[0] == "data.loader"
+
+    # subsequence of the whole key
+    labels = [item.label for item in completer.complete("dtldrbtch").items]
+    assert labels == ["data.loader.batch_size"]
+
+
+def test_index_is_replaced():
+    loader = ConfigParser()
+    completer = Completer()
+    completer.update(loader.load("tests/artifacts/config_materials.yaml"))
+    completer.update(loader.load("tests/artifacts/local_path.yaml"))
+
+    labels = [item.label for item in completer.complete("").items]
+    assert labels == ["local_path"]
+
+
+def test_index_is_built_once_per_context():
+    loader = ConfigParser()
+    materials = loader.load("tests/artifacts/config_materials.yaml")
+    local_path = loader.load("tests/artifacts/local_path.yaml")
+
+    completer = Completer()
+    completer.update(materials)
+    index = completer.index
+    completer.update(local_path)
+    completer.update(materials)
+
+    assert completer.index is index
+    assert materials.completion_index is index
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import os
+
+from lsprotocol import types as lsp_types
+from pygls.workspace import Workspace
+
+from hydra_lsp.cache import ContextCache
+from hydra_lsp.parser import ConfigParser
+
+MATERIALS = "tests/artifacts/config_materials.yaml"
+LDM = "tests/artifacts/config_ldm_precompute_dataset.yaml"
+LOCAL_PATH = "tests/artifacts/local_path.yaml"
+
+
+def test_find_owner():
+    loader = ConfigParser()
+    contexts = ContextCache()
+    contexts.put(LDM, loader.load(LDM))
+    contexts.put(LOCAL_PATH, loader.load(LOCAL_PATH))
+
+    assert contexts.find_owner(LOCAL_PATH).files == [LOCAL_PATH]
+    assert contexts.find_owner(MATERIALS).files[-1] == LDM
+    assert contexts.find_owner("tests/artifacts/unknown.yaml") is None
+
+
+def test_lru_eviction():
+    loader = ConfigParser()
+    contexts = ContextCache(max_contexts=2)
+    contexts.put(LDM, loader.load(LDM))
+    contexts.put(MATERIALS, loader.load(MATERIALS))
+
+    contexts.get(LDM)
+    contexts.put(LOCAL_PATH, loader.load(LOCAL_PATH))
+    assert contexts.roots() == [LDM, LOCAL_PATH]
+
+
+def test_memory_budget():
+    loader = ConfigParser()
+    ldm = loader.load(LDM)
+    contexts = ContextCache(memory_budget=ldm.size + 1)
+    contexts.put(LDM, ldm)
+    contexts.put(LOCAL_PATH, loader.load(LOCAL_PATH))
+    assert contexts.roots() == [LDM, LOCAL_PATH]
+
+    contexts.put(MATERIALS, loader.load(MATERIALS))
+    assert contexts.roots() == [LOCAL_PATH, MATERIALS]
+
+
+def test_persistent_index(tmp_path):
+    (tmp_path / "base.yaml").write_text("a: 1\n")
+    (tmp_path / "root.yaml").write_text("defaults:\n  - base\nb: ${a}\n")
+    root = str(tmp_path / "root.yaml")
+    index = str(tmp_path / "cache" / "workspace.idx")
+
+    loader = ConfigParser()
+    loader.load(root)
+    assert loader.save_index(index) == 2
+
+    (tmp_path / "base.yaml").write_text("a: 10\n")
+
+    loader = ConfigParser()
+    assert loader.load_index(index) == 1
+    assert loader.graph.roots_including(str(tmp_path / "base.yaml"), [root])
+
+    config = loader.load(root)
+    assert loader.cache.hits == 1 and loader.cache.misses == 1
+    assert config.get("a") == 10 and config.get("b") == "${a}"
+
+    location = config.references["a"][0]
+    assert location.uri == root
+    assert (location.range.start.line, location.range.start.character) == (2, 3)
+
+
+def test_revalidate_unchanged(tmp_path):
+    (tmp_path / "base.yaml").write_text("a: 1\n")
+    base = str(tmp_path / "base.yaml")
+
+    loader = ConfigParser()
+    parsed = loader.parse_file(base)
+
+    # only the mtime changes, e.g. a branch switch and back
+    os.utime(base, ns=(0, 0))
+    assert loader.parse_file(base) is parsed
+    assert loader.cache.revalidated == 1
+
+    (tmp_path / "base.yaml").write_text("a: 2\n")
+    assert loader.parse_file(base).data == {"a": 2}
+    assert loader.cache.revalidated == 1
+
+
+def test_reopened_document(tmp_path):
+    class Server:
+        workspace = Workspace(None)
+
+    uri = str(tmp_path / "base.yaml")
+    loader = ConfigParser(Server())
+
+    def open_document(text: str) -> None:
+        Server.workspace.put_text_document(
+            lsp_types.TextDocumentItem(
+                uri=uri, language_id="yaml", version=1, text=text
+            )
+        )
+
+    open_document("a: 1\n")
+    assert loader.parse_file(uri).data == {"a": 1}
+
+    # changed on disk while closed, the client starts the versions over
+    Server.workspace.remove_text_document(uri)
+    open_document("a: 2\n")
+    assert loader.parse_file(uri).data == {"a": 2}
+
+
+def test_invalidate_files(tmp_path):
+    (tmp_path / "base.yaml").write_text("a: 1\n")
+    (tmp_path / "root.yaml").write_text(
+        "defaults:\n  - base\n  - optional extra: local\n"
+    )
+    (tmp_path / "other.yaml").write_text("b: 1\n")
+    root, other = str(tmp_path / "root.yaml"), str(tmp_path / "other.yaml")
+    base, extra = str(tmp_path / "base.yaml"), str(tmp_path / "extra" / "local.yaml")
+
+    loader = ConfigParser()
+    assert loader.load(root).get("extra") is None
+    loader.load(other)
+
+    # a created file reloads the configs which refer to it
+    (tmp_path / "extra").mkdir()
+    (tmp_path / "extra" / "local.yaml").write_text("c: 3\n")
+    assert loader.invalidate_files({extra: False}, [root, other]) == {root}
+    assert loader.load(root).get("extra.c") == 3
+
+    (tmp_path / "base.yaml").unlink()
+    assert loader.invalidate_files({base: True}, [root, other]) == {root}
+    assert base not in loader.cache
+    assert loader.load(root).get("a") is None
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+
+from hydra_lsp.check import (
+    RULE_MISSING,
+    RULE_UNDEFINED,
+    RULE_UNREADABLE,
+    Checker,
+    main,
+    to_sarif,
+)
+
+
+def write_tree(tmp_path) -> None:
+    (tmp_path / "db").mkdir()
+    (tmp_path / "db" / "mysql.yaml").write_text("url: ${host}:3306\n")
+    # an option which is not selected anywhere, it is not a root config
+    (tmp_path / "db" / "postgres.yaml").write_text("url: ${host}:5432\n")
+    (tmp_path / "train.yaml").write_text("defaults:\n  - db: mysql\nhost: a\n")
+    (tmp_path / "eval.yaml").write_text("defaults:\n  - db: mysql\nport: 1\n")
+    (tmp_path / "ok.yaml").write_text("a: 1\nb: ${a}\n")
+
+
+def test_check(tmp_path):
+    write_tree(tmp_path)
+
+    checker = Checker(workers=1)
+    problems = checker.run([str(tmp_path)])
+
+    # the group option is not a root, its problem is found through eval.yaml
+    assert checker.stats["roots"] == 3
+    assert [(p.uri, p.root, p.rule) for p in problems] == [
+        (
+            str(tmp_path / "db" / "mysql.yaml"),
+            str(tmp_path / "eval.yaml"),
+            RULE_UNDEFINED,
+        )
+    ]
+    assert problems[0].start == (0, 5)
+
+    sarif = to_sarif(problems, "0.0.0")
+    result = sarif["runs"][0]["results"][0]
+    assert result["ruleId"] == RULE_UNDEFINED
+    assert result["locations"][0]["physicalLocation"]["region"]["startLine"] == 1
+
+
+def test_exit_code(tmp_path, capsys):
+    write_tree(tmp_path)
+
+    assert main([str(tmp_path / "ok.yaml")], workers=1) == 0
+    assert json.loads(capsys.readouterr().out)["problems"] == []
+
+    output = tmp_path / "report.json"
+    assert main([str(tmp_path)], output=str(output), workers=1) == 1
+    assert json.loads(output.read_text())["stats"]["problems"] == 1
+
+
+def test_absolute_include(tmp_path):
+    (tmp_path / "common").mkdir()
+    (tmp_path / "common" / "base.yaml").write_text("url: ${name}\n")
+    (tmp_path / "model").mkdir()
+    (tmp_path / "model" / "big.yaml").write_text("defaults:\n  - /common/base\n")
+    (tmp_path / "train.yaml").write_text("defaults:\n  - model/big\nname: a\n")
+
+    checker = Checker(workers=1)
+    problems = checker.run([str(tmp_path)])
+
+    # common/base.yaml is relative to the folder of the root config, not a root
+    assert checker.stats["roots"] == 1
+    assert problems == []
+
+
+def test_unreadable_and_missing_configs(tmp_path):
+    (tmp_path / "broken.yaml").write_text("a: 1\nb: [1\n")
+    (tmp_path / "train.yaml").write_text(
+        "defaults:\n  - base\n  - optional extra: x\n  - _self_\na: 1\n"
+    )
+
+    problems = Checker(workers=1).run([str(tmp_path)])
+
+    assert [(p.uri, p.rule, p.start) for p in problems] == [
+        (str(tmp_path / "broken.yaml"), RULE_UNREADABLE, (2, 0)),
+        (str(tmp_path / "train.yaml"), RULE_MISSING, (0, 0)),
+    ]
+    assert problems[1].message == (
+        f"Config {tmp_path / 'base.yaml'} from the defaults list is missing"
+    )
@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+from hydra_lsp.graph import DependencyGraph
+from hydra_lsp.parser import ConfigParser
+
+
+def test_dependents():
+    graph = DependencyGraph()
+    graph.set_includes("a", ["base"])
+    graph.set_includes("b", ["mid"])
+    graph.set_includes("mid", ["base"])
+    graph.set_includes("c", [])
+
+    assert graph.dependents("base") == {"base", "a", "b", "mid"}
+    assert graph.dependencies("b") == {"b", "mid", "base"}
+    assert graph.roots_including("base", ["a", "b", "c"]) == {"a", "b"}
+
+    graph.set_includes("mid", [])
+    assert graph.roots_including("base", ["a", "b", "c"]) == {"a"}
+
+
+def test_graph_from_parser():
+    loader = ConfigParser()
+    loader.load("tests/artifacts/config_ldm_precompute_dataset.yaml")
+
+    roots = loader.graph.roots_including(
+        "tests/artifacts/local_path.yaml",
+        [
+            "tests/artifacts/config_ldm_precompute_dataset.yaml",
+            "tests/artifacts/config_materials.yaml",
+            "tests/artifacts/config_reconstruction.yaml",
+        ],
+    )
+    assert roots == {
+        "tests/artifacts/config_ldm_precompute_dataset.yaml",
+        "tests/artifacts/config_materials.yaml",
+    }
+
+
+def test_circular_defaults(tmp_path):
+    (tmp_path / "a.yaml").write_text("defaults:\n  - b\nx: 1\n")
+    (tmp_path / "b.yaml").write_text("defaults:\n  - a\ny: 2\n")
+
+    config = ConfigParser().load(str(tmp_path / "a.yaml"))
+    assert config.get("x") == 1 and config.get("y") == 2
+
+
+def test_graph_with_overrides(tmp_path):
+    """The files selected by the overrides of a root don't leak into other roots"""
+    (tmp_path / "db").mkdir()
+    (tmp_path / "db" / "mysql.yaml").write_text("url: mysql\n")
+    (tmp_path / "db" / "postgres.yaml").write_text("url: postgres\n")
+    (tmp_path / "mid.yaml").write_text("defaults:\n  - db: mysql\n")
+    (tmp_path / "a.yaml").write_text("defaults:\n  - mid\n  - override db: postgres\n")
+    (tmp_path / "b.yaml").write_text("defaults:\n  - mid\n")
+    roots = [str(tmp_path / "a.yaml"), str(tmp_path / "b.yaml")]
+    postgres = str(tmp_path / "db" / "postgres.yaml")
+
+    loader = ConfigParser()
+    assert loader.load(roots[0]).get("db.url") == "postgres"
+    assert loader.graph.roots_including(postgres, roots) == {roots[0]}
+
+    loader.load(roots[1])
+    assert loader.graph.roots_including(postgres, roots) == {roots[0]}
+    assert loader.graph.roots_including(str(tmp_path / "mid.yaml"), roots) == set(roots)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import pytest
+
+from hydra_lsp.autocomplete import Completer
+from hydra_lsp.groups import DefaultEntry, GroupIndex, get_package
+from hydra_lsp.parser import ConfigParser
+
+
+def write(path, text: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+@pytest.fixture
+def configs(tmp_path):
+    write(tmp_path / "db" / "mysql.yaml", "host: mysql.local\nport: 3306\n")
+    write(tmp_path / "db" / "postgres.yaml", "host: pg.local\nport: 5432\n")
+    write(tmp_path / "server" / "apache.yaml", "defaults:\n  - db: mysql\nport: 80\n")
+    write(tmp_path / "server" / "db" / "mysql.yaml", "host: mysql.local\n")
+    write(tmp_path / "server" / "db" / "sqlite.yaml", "file: db.sqlite\n")
+    write(tmp_path / "logging.yaml", "# @package _global_\nlevel: INFO\n")
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "item, expected",
+    [
+        ("_self_", DefaultEntry(None, ["_self_"])),
+        ("base@cfg", DefaultEntry(None, ["base"], "cfg")),
+        ({"db": "mysql"}, DefaultEntry("db", ["mysql"])),
+        ({"optional db": None}, DefaultEntry("db", [], optional=True)),
+        ({"override db@x.y": "pg"}, DefaultEntry("db", ["pg"], "x.y", override=True)),
+        ({"db": ["a", "b"]}, DefaultEntry("db", ["a", "b"])),
+        ({"db": "a", "x": "b"}, None),
+    ],
+)
+def test_parse_entry(item, expected):
+    assert DefaultEntry.parse(item) == expected
+
+
+def test_get_package():
+    assert get_package("db", "", None, None) == "db"
+    assert get_package("db", "server", "backup", None) == "server.backup"
+    assert get_package("db", "server", None, "storage") == "storage"
+    assert get_package("db", "server", "_global_.db", None) == "db"
+    assert get_package("db", "server", "_here_", None) == "server"
+    assert get_package("db", "server", "_group_.main", None) == "db.main"
+
+
+def test_group_option(configs):
+    write(configs / "config.yaml", "defaults:\n  - db: mysql\n  - _self_\nname: app\n")
+
+    context = ConfigParser().load(str(configs / "config.yaml"))
+
+    assert context.get("db.host") == "mysql.local"
+    assert context.get("name") == "app"
+    assert "db.port" in context.definitions
+    assert context.packages[str(configs / "db" / "mysql.yaml")] == "db"
+    # keys in the group file are found with their package
+    location = context.definitions["db.port"]
+    assert context.loc_to_definition.find_key_by_location(location) == "db.port"
+
+
+def test_packages(configs):
+    write(
+        configs / "config.yaml",
+        "defaults:\n"
+        "  - db@backup: postgres\n"
+        "  - server: apache\n"
+        "  - logging\n"
+        "  - optional missing: nothing\n",
+    )
+
+    context = ConfigParser().load(str(configs / "config.yaml"))
+
+    assert context.get("backup.host") == "pg.local"
+    # nested groups are relative to the including config
+    assert context.get("server.port") == 80
+    assert context.get("server.db.host") == "mysql.local"
+    # "# @package _global_" header
+    assert context.get("level") == "INFO"
+    assert context.get("missing") is None
+
+
+def test_override(configs):
+    write(configs / "config.yaml", "defaults:\n  - server: apache\n  - _self_\n")
+    write(
+        configs / "prod.yaml",
+        "defaults:\n  - config\n  - override server/db: sqlite\n  - _self_\n",
+    )
+
+    context = ConfigParser().load(str(configs / "prod.yaml"))
+
+    assert context.get("server.db.file") == "db.sqlite"
+    assert context.get("server.db.host") is None
+
+
+def test_group_index(configs):
+    groups = GroupIndex()
+
+    assert groups.options(str(configs / "db")) == ["mysql", "postgres"]
+    assert groups.groups(str(configs / "server")) == ["db"]
+    assert groups.has(str(configs / "db" / "mysql.yaml"))
+
+    # listings are kept until invalidated
+    write(configs / "db" / "oracle.yaml", "host: oracle\n")
+    assert not groups.has(str(configs / "db" / "oracle.yaml"))
+    groups.invalidate(str(configs / "db" / "oracle.yaml"))
+    assert groups.options(str(configs / "db")) == ["mysql", "oracle", "postgres"]
+
+
+def test_option_completion(configs):
+    uri = str(configs / "config.yaml")
+    completer = Completer()
+    groups = GroupIndex()
+
+    options = completer.complete_group("db", "m", uri, groups)
+    assert [item.label for item in options.items] == ["mysql"]
+
+    names = completer.complete_group("ser", None, uri, groups)
+    assert [item.label for item in names.items] == ["server"]
+
+    nested = completer.complete_group("server/", None, uri, groups)
+    assert [item.label for item in nested.items] == ["server/db", "server/apache"]
+
+    options = completer.complete_group("server/db", "", uri, groups)
+    assert [item.label for item in options.items] == ["mysql", "sqlite"]
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import os
+
+from hydra_lsp.parser import ConfigParser, parse_files
+from hydra_lsp.utils import discover_yaml_files
+
+
+def test_discover_yaml_files(tmp_path):
+    (tmp_path / "conf" / "db").mkdir(parents=True)
+    (tmp_path / ".git").mkdir()
+    (tmp_path / "conf" / "config.yaml").write_text("a: 1\n")
+    (tmp_path / "conf" / "db" / "mysql.yml").write_text("host: localhost\n")
+    (tmp_path / "conf" / "notes.txt").write_text("")
+    (tmp_path / ".git" / "hidden.yaml").write_text("")
+
+    files = discover_yaml_files([str(tmp_path)])
+    assert files == [
+        str(tmp_path / "conf" / "config.yaml"),
+        str(tmp_path / "conf" / "db" / "mysql.yml"),
+    ]
+
+
+def test_warm_cache_from_parsed_files():
+    files = [
+        os.path.abspath(f"tests/artifacts/{name}.yaml")
+        for name in ["local_path", "config_materials"]
+    ]
+    parsed = parse_files(files + ["/does/not/exist.yaml"])
+    assert [p.uri for p in parsed] == files
+
+    loader = ConfigParser()
+    for p in parsed:
+        loader.add_parsed_file(p)
+
+    config = loader.load(files[1])
+    assert loader.cache.hits == 2 and loader.cache.misses == 0
+    assert config.get("local_path") == "/my/mnt/disk"
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from lsprotocol import types as lsp_types
+
+from hydra_lsp.intel import HydraIntel
+from hydra_lsp.parser import ConfigParser
+
+
+def test_diagnostics(tmp_path):
+    (tmp_path / "base.yaml").write_text("a: 1\nb: ${missing}\n")
+    (tmp_path / "root.yaml").write_text(
+        "defaults:\n"
+        "  - base\n"
+        "c: ${a}\n"
+        "d: ${undefined}\n"
+        "e: ${skipped} # hydra: skip\n"
+    )
+    root = str(tmp_path / "root.yaml")
+    context = ConfigParser().load(root)
+    intel = HydraIntel(None)
+
+    diagnostics = intel.get_diagnostics(context, root)
+    assert [d.message for d in diagnostics] == ["`undefined` is not defined"]
+    assert diagnostics[0].range.start.line == 3
+
+    messages = {d.message for d in intel.get_diagnostics(context, None)}
+    assert messages == {"`undefined` is not defined", "`missing` is not defined"}
+
+
+def test_diagnostic_report_result_id(tmp_path):
+    (tmp_path / "root.yaml").write_text("a: ${b}\n")
+    root = str(tmp_path / "root.yaml")
+    loader = ConfigParser()
+    intel = HydraIntel(None)
+
+    report = intel.get_document_diagnostic_report(loader.load(root), root, None)
+    assert isinstance(report, lsp_types.RelatedFullDocumentDiagnosticReport)
+    assert len(report.items) == 1
+
+    # nothing changed: same result id
+    context = loader.load(root)
+    unchanged = intel.get_document_diagnostic_report(context, root, report.result_id)
+    assert isinstance(unchanged, lsp_types.RelatedUnchangedDocumentDiagnosticReport)
+
+    (tmp_path / "root.yaml").write_text("a: ${b}\nb: 1\n")
+    context = loader.load(root)
+    report = intel.get_document_diagnostic_report(context, root, report.result_id)
+    assert isinstance(report, lsp_types.RelatedFullDocumentDiagnosticReport)
+    assert report.items == []
@@ -2,7 +2,8 @@ from __future__ import annotations
 
 import pytest
 
-from hydra_lsp.parser import ConfigParser
+from hydra_lsp.context import KeyIndex, Loc, pack_position
+from hydra_lsp.parser import CancelToken, ConfigParser, ReloadCancelled
 
 
 @pytest.fixture(autouse=True, scope="session")
@@ -24,6 +25,13 @@ def test_dot_access(loader: ConfigParser):
     assert config.get("defaults") == ["local_path", "_self_"]
     assert config.get("trainer.accelerator") == "gpu"
     assert config.get("data.loader.pin_memory") is True
+    assert config.get("data.original_image_size.0") == 1024
+    assert config.get("data.original_image_size.2") is None
+    assert config.get("data.missing.key") is None
+
+    # the value index and the definitions share the same key strings
+    key = next(k for k in config.values if k == "data.loader.pin_memory")
+    assert next(k for k in config.definitions if k == key) is key
 
 
 def test_inheritance(loader: ConfigParser):
@@ -33,3 +41,73 @@ def test_inheritance(loader: ConfigParser):
     assert config.get("data.nb_chn") == 10
     assert config.get("data.dataset.train.data_len") == -1
     assert config.get("data.loader.batch_size") == 2
+
+
+def test_parse_cache(tmp_path):
+    (tmp_path / "base.yaml").write_text("a: 1\nb: ${a}\n")
+    (tmp_path / "root.yaml").write_text("defaults:\n  - base\n  - _self_\nc: 2\n")
+    root = str(tmp_path / "root.yaml")
+
+    loader = ConfigParser()
+    loader.load(root)
+    assert loader.cache.misses == 2
+
+    config = loader.load(root)
+    assert loader.cache.hits == 2
+    assert config.get("a") == 1 and config.get("c") == 2
+    assert config.files == [str(tmp_path / "base.yaml"), root]
+
+    (tmp_path / "root.yaml").write_text("defaults:\n  - base\n  - _self_\nc: 30\n")
+    config = loader.load(root)
+    assert loader.cache.misses == 3
+    assert config.get("c") == 30
+    assert "b" in config.definitions
+    assert len(config.references["a"]) == 1
+
+
+def test_definitions_and_references(loader: ConfigParser):
+    config = loader.load("tests/artifacts/config_reconstruction.yaml")
+
+    # keys of flow mappings are nested under their parent key
+    assert "data.dataset.train.mask_config.mask_mode" in config.definitions
+    assert "data.dataset.train.mask_mode" not in config.definitions
+
+    location = config.definitions["data.dataset.train.mask_config"]
+    assert location.uri == "tests/artifacts/config_reconstruction.yaml"
+    assert location.range.start.line == 67
+
+    assert len(config.references["local_path"]) > 0
+
+
+def test_cancelled_load(loader: ConfigParser):
+    token = CancelToken()
+    token.cancel()
+
+    with pytest.raises(ReloadCancelled):
+        loader.load("tests/artifacts/config_materials.yaml", token)
+
+    config = loader.load("tests/artifacts/config_materials.yaml")
+    assert config.get("local_path") == "/my/mnt/disk"
+
+
+def test_key_index():
+    def location(line, start, end):
+        return Loc(
+            "file:///a.yaml", pack_position(line, start), pack_position(line, end)
+        )
+
+    index = KeyIndex(
+        [
+            ("b", location(1, 2, 3)),
+            ("a", location(0, 0, 1)),
+            ("outer", location(2, 0, 10)),
+            ("inner", location(2, 4, 6)),
+        ]
+    )
+
+    assert index.find(0, 0) == "a"
+    assert index.find(0, 1) is None
+    assert index.find(1, 2) == "b"
+    assert index.find(2, 5) == "inner"
+    assert index.find(2, 7) == "outer"
+    assert index.find(3, 0) is None
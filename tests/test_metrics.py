@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import asyncio
+
+from hydra_lsp.metrics import Histogram, Metrics
+from hydra_lsp.profiling import Profiler
+
+
+def test_histogram():
+    histogram = Histogram()
+    for ms in [0.05, 0.3, 0.3, 4, 20]:
+        histogram.add(ms)
+
+    result = histogram.to_dict()
+    assert result["count"] == 5
+    assert result["min_ms"] == 0.05
+    assert result["max_ms"] == 20
+    assert result["p50_ms"] == 0.5
+    assert result["p99_ms"] == 20
+    assert Histogram().to_dict() == {"count": 0}
+
+
+def test_timed():
+    metrics = Metrics()
+
+    @metrics.timed("sync")
+    def sync(x):
+        return x + 1
+
+    @metrics.timed("async")
+    async def coroutine(x):
+        return x + 1
+
+    assert sync(1) == 2
+    assert asyncio.run(coroutine(1)) == 2
+    assert asyncio.iscoroutinefunction(coroutine)
+
+    with metrics.timer("sync"):
+        pass
+
+    snapshot = metrics.snapshot()
+    assert snapshot["sync"]["count"] == 2
+    assert snapshot["async"]["count"] == 1
+
+
+def test_profiler(tmp_path):
+    profiler = Profiler(str(tmp_path / "profiles"))
+
+    assert profiler.run("textDocument/hover", sum, [1, 2]) == 3
+    # nested calls are part of the outer profile
+    assert profiler.run("textDocument/hover", profiler.run, "inner", len, []) == 0
+    profiler.dump()
+
+    assert sorted(p.name for p in (tmp_path / "profiles").iterdir()) == [
+        "textDocument.hover.prof"
+    ]
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from hydra_lsp.context import HydraContext
+from hydra_lsp.intel import HydraIntel
+from hydra_lsp.parser import ConfigParser
+from hydra_lsp.resolver import get_absolute_key
+
+
+def test_resolve():
+    context = HydraContext(
+        {
+            "name": "run",
+            "size": 3,
+            "data": {"dir": "/data/${name}", "size": "${size}", "rel": "${.dir}"},
+            "list": ["${size}", 1],
+            "copy": "${data}",
+            "env": "${oc.env:HOME}",
+        }
+    )
+
+    assert context.resolve("data.dir") == "/data/run"
+    # a single interpolation keeps the type of the value
+    assert context.resolve("data.size") == 3
+    assert context.resolve("data.rel") == "/data/run"
+    assert context.resolve("list") == [3, 1]
+    assert context.resolve("copy")["dir"] == "/data/run"
+    assert context.resolve("env") == "${oc.env:HOME}"
+    assert context.resolve("missing") is None
+    assert context.resolver.errors == {}
+
+
+def test_resolve_errors():
+    context = HydraContext(
+        {
+            "a": "${b}",
+            "b": "x${a}",
+            "c": "${a}",
+            "d": "${e}",
+            "e": "${undefined}",
+            "nested": {"self": "${nested}"},
+        }
+    )
+    resolver = context.resolver
+    for key in context.config:
+        resolver.resolve(key)
+
+    assert resolver.errors["a"] == "circular interpolation: a -> b -> a"
+    assert resolver.errors["b"] == resolver.errors["a"]
+    assert resolver.errors["c"] == resolver.errors["a"]
+    assert resolver.errors["d"] == "`undefined` is not defined"
+    assert "nested" in resolver.errors["nested.self"]
+    assert context.resolve("e") == "${undefined}"
+
+
+def test_get_absolute_key():
+    assert get_absolute_key("a.b", "x.y") == "a.b"
+    assert get_absolute_key(".b", "x.a") == "x.b"
+    assert get_absolute_key("..b", "x.y.a") == "x.b"
+    assert get_absolute_key(".b", "a") == "b"
+
+
+def test_resolve_diagnostics(tmp_path):
+    (tmp_path / "root.yaml").write_text("a: ${b}\nb: ${a}\nc: ${d}\nd: ${missing}\n")
+    root = str(tmp_path / "root.yaml")
+    context = ConfigParser().load(root)
+
+    messages = {d.message for d in HydraIntel(None).get_diagnostics(context, root)}
+    assert messages == {
+        "`b` can't be resolved: circular interpolation: b -> a -> b",
+        "`a` can't be resolved: circular interpolation: b -> a -> b",
+        "`d` can't be resolved: `missing` is not defined",
+        "`missing` is not defined",
+    }
+
+
+def test_resolve_long_chain():
+    config = {"k0": 1, **{f"k{i}": f"${{k{i - 1}}}" for i in range(1, 5000)}}
+    context = HydraContext(config)
+
+    assert context.resolve("k4999") == 1
+    assert context.resolver.errors == {}
+
+
+def test_relative_references_and_resolvers(tmp_path):
+    (tmp_path / "db").mkdir()
+    (tmp_path / "db" / "mysql.yaml").write_text("host: x\nurl: ${.host}/${.port}\n")
+    (tmp_path / "root.yaml").write_text(
+        "defaults:\n  - db: mysql\n  - _self_\n"
+        "x:\n  b: 1\n  a: ${.b}\nhome: ${oc.env:HOME}\n"
+    )
+    root = str(tmp_path / "root.yaml")
+    context = ConfigParser().load(root)
+
+    assert context.get_problems(root) == []
+    problems = context.get_problems(str(tmp_path / "db" / "mysql.yaml"))
+    assert [message for _, message in problems] == ["`db.port` is not defined"]
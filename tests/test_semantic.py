@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import random
+
+from hydra_lsp.parser import ConfigParser
+from hydra_lsp.semantic import (
+    MODIFIER_UNRESOLVED,
+    TOKEN_INTERPOLATION,
+    TOKEN_KEY,
+    TOKEN_RESOLVER,
+    SemanticTokens,
+    diff,
+)
+
+CONFIG = """\
+a: 1
+b: x ${a} ${oc.env:HOME}
+c:
+  d: |
+    ${missing}
+"""
+
+
+def decode(data):
+    """Absolute (line, character, length, type, modifiers) of the tokens"""
+    tokens = []
+    line = character = 0
+    for i in range(0, len(data), 5):
+        delta_line, delta_character, length, token_type, modifiers = data[i : i + 5]
+        character = character + delta_character if delta_line == 0 else delta_character
+        line += delta_line
+        tokens.append((line, character, length, token_type, modifiers))
+
+    return tokens
+
+
+def test_tokens(tmp_path):
+    (tmp_path / "config.yaml").write_text(CONFIG)
+    uri = str(tmp_path / "config.yaml")
+    parser = ConfigParser()
+    context = parser.load(uri)
+
+    # the references are resolved while the context is built, never on encoding
+    resolved = len(context.resolver.resolved)
+    _, data = SemanticTokens().full(uri, parser.parse_file(uri), context)
+    assert len(context.resolver.resolved) == resolved
+
+    assert decode(data) == [
+        (0, 0, 1, TOKEN_KEY, 0),
+        (1, 0, 1, TOKEN_KEY, 0),
+        (1, 5, 4, TOKEN_INTERPOLATION, 0),
+        (1, 10, 14, TOKEN_RESOLVER, 0),
+        (2, 0, 1, TOKEN_KEY, 0),
+        (3, 2, 1, TOKEN_KEY, 0),
+        (4, 4, 10, TOKEN_INTERPOLATION, MODIFIER_UNRESOLVED),
+    ]
+
+
+def test_delta(tmp_path):
+    (tmp_path / "config.yaml").write_text(CONFIG)
+    uri = str(tmp_path / "config.yaml")
+    parser = ConfigParser()
+    tokens = SemanticTokens()
+
+    result_id, old = tokens.full(uri, parser.parse_file(uri), None)
+
+    (tmp_path / "config.yaml").write_text(CONFIG.replace("a: 1", "a: 1\ne: ${a}"))
+    new_id, new, edits = tokens.delta(uri, parser.parse_file(uri), None, result_id)
+
+    assert new_id != result_id
+    ((start, delete_count, data),) = edits
+    assert old[:start] + data + old[start + delete_count :] == new
+
+    # an unknown previous result gets all the tokens
+    assert tokens.delta(uri, parser.parse_file(uri), None, "0")[2] is None
+
+    # closed documents are forgotten
+    result_id, _ = tokens.full(uri, parser.parse_file(uri), None)
+    tokens.forget(uri)
+    assert tokens.delta(uri, parser.parse_file(uri), None, result_id)[2] is None
+
+
+def test_diff():
+    rng = random.Random(0)
+    old = [rng.randrange(10) for _ in range(5000)]
+    for start, end, data in [(0, 0, [1]), (2500, 2600, []), (4990, 5000, [7] * 30)]:
+        new = old[:start] + data + old[end:]
+        start, delete_count, data = diff(old, new)
+        assert old[:start] + data + old[start + delete_count :] == new
+
+    assert diff(old, list(old)) is None
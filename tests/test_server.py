@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+from typing import Any, Dict, List, Tuple
+
+from hydra_lsp.parser import ConfigParser
+from hydra_lsp.server import server
+from hydra_lsp.targets import TargetIndex
+
+
+class Transport:
+    """Collects the messages the server sends"""
+
+    def __init__(self):
+        self.messages: List[Dict[str, Any]] = []
+
+    def write(self, data: bytes) -> None:
+        body = data.split(b"\r\n\r\n", 1)[1]
+        self.messages.append(json.loads(body))
+
+    def close(self) -> None:
+        pass
+
+
+def send(message: Dict[str, Any]) -> None:
+    body = json.dumps({"jsonrpc": "2.0", **message}).encode()
+    server.lsp.data_received(b"Content-Length: %d\r\n\r\n" % len(body) + body)
+
+
+async def wait_for(transport: Transport, predicate, timeout: float = 5) -> Dict:
+    for _ in range(int(timeout / 0.01)):
+        for message in transport.messages:
+            if predicate(message):
+                return message
+        await asyncio.sleep(0.01)
+
+    raise AssertionError(f"No such message in {transport.messages}")
+
+
+def initialize() -> Transport:
+    transport = Transport()
+    server.lsp.connection_made(transport)
+
+    async def session():
+        send(
+            {
+                "id": 1,
+                "method": "initialize",
+                "params": {"processId": None, "rootUri": None, "capabilities": {}},
+            }
+        )
+        await wait_for(transport, lambda m: m.get("id") == 1)
+
+    server.loop.run_until_complete(session())
+
+    return transport
+
+
+def open_document(uri: str, text: str) -> None:
+    document = {"uri": uri, "languageId": "yaml", "version": 1, "text": text}
+    send({"method": "textDocument/didOpen", "params": {"textDocument": document}})
+
+
+def hover(request_id: int, uri: str, line: int, character: int) -> None:
+    send(
+        {
+            "id": request_id,
+            "method": "textDocument/hover",
+            "params": {
+                "textDocument": {"uri": uri},
+                "position": {"line": line, "character": character},
+            },
+        }
+    )
+
+
+def block_loads(monkeypatch) -> Tuple[threading.Event, threading.Event]:
+    """The loads wait for the returned ``release`` event, ``started`` is set then"""
+    started, release = threading.Event(), threading.Event()
+    load = ConfigParser.load
+
+    def slow_load(self, config_path, token=None):
+        started.set()
+        release.wait(5)
+        return load(self, config_path, token)
+
+    monkeypatch.setattr(ConfigParser, "load", slow_load)
+    return started, release
+
+
+async def wait_until(event: threading.Event) -> None:
+    while not event.is_set():
+        await asyncio.sleep(0.01)
+
+
+def test_request_during_open(tmp_path, monkeypatch):
+    """A request for a document which is being loaded waits for the same load"""
+    transport = initialize()
+    started, release = block_loads(monkeypatch)
+    uri = f"file://{tmp_path}/config.yaml"
+
+    async def session():
+        open_document(uri, "a: 1\nb: ${c}\n")
+        await wait_until(started)
+
+        hover(2, uri, 1, 3)
+        await asyncio.sleep(0.05)
+        release.set()
+
+        response = await wait_for(transport, lambda m: m.get("id") == 2)
+        diagnostics = await wait_for(
+            transport, lambda m: m.get("method") == "textDocument/publishDiagnostics"
+        )
+        return response, diagnostics
+
+    response, diagnostics = server.loop.run_until_complete(session())
+
+    assert "error" not in response
+    assert diagnostics["params"]["uri"] == uri
+    assert [d["message"] for d in diagnostics["params"]["diagnostics"]] == [
+        "`c` is not defined"
+    ]
+    assert not server.reloads
+
+
+def test_target_hover_during_reload(tmp_path, monkeypatch):
+    """Requests in a loaded document don't wait for the reloads of other ones"""
+    (tmp_path / "models.py").write_text("def build(size: int):\n    pass\n")
+    monkeypatch.setattr(server.settings, "target_indexing", True)
+    server.targets = TargetIndex()
+    server.targets.refresh([str(tmp_path / "models.py")])
+
+    transport = initialize()
+    uri = f"file://{tmp_path}/config.yaml"
+    started, release = block_loads(monkeypatch)
+
+    async def session():
+        open_document(uri, "model:\n  _target_: models.build\n")
+        release.set()
+        await wait_for(
+            transport, lambda m: m.get("method") == "textDocument/publishDiagnostics"
+        )
+
+        started.clear()
+        release.clear()
+        open_document(f"file://{tmp_path}/other.yaml", "a: 1\n")
+        await wait_until(started)
+
+        hover(3, uri, 1, 15)
+        try:
+            return await wait_for(transport, lambda m: m.get("id") == 3, timeout=1)
+        finally:
+            release.set()
+
+    response = server.loop.run_until_complete(session())
+
+    assert "def models.build(size: int)" in response["result"]["contents"]["value"]
+
+
+def test_diagnostics_after_change(tmp_path):
+    """An edited document is re-indexed once the typing stops"""
+    transport = initialize()
+    uri = f"file://{tmp_path}/config.yaml"
+
+    def is_diagnostics(message) -> bool:
+        return (
+            message.get("method") == "textDocument/publishDiagnostics"
+            and message["params"]["uri"] == uri
+        )
+
+    async def session():
+        open_document(uri, "a: 1\nb: ${c}\n")
+        await wait_for(transport, is_diagnostics)
+        transport.messages.clear()
+
+        # a burst of keystrokes is re-indexed once
+        for version, text in enumerate(["a: 1\nc", "a: 1\nc:", "a: 1\nc: 2\n"], 2):
+            send(
+                {
+                    "method": "textDocument/didChange",
+                    "params": {
+                        "textDocument": {"uri": uri, "version": version},
+                        "contentChanges": [{"text": text + "b: ${c}\n"}],
+                    },
+                }
+            )
+        await wait_for(transport, is_diagnostics)
+        await asyncio.sleep(server.CHANGE_DEBOUNCE * 2)
+
+    server.loop.run_until_complete(session())
+
+    published = [m for m in transport.messages if is_diagnostics(m)]
+    assert len(published) == 1
+    assert published[0]["params"]["diagnostics"] == []
+    assert server.get_context(uri).get("c") == 2
+
+
+def test_cancel_request_during_load(tmp_path, monkeypatch):
+    """A load started by a request is cancelled together with the request"""
+    initialize()
+    started, release = block_loads(monkeypatch)
+    (tmp_path / "config.yaml").write_text("a: 1\n")
+    uri = f"file://{tmp_path}/config.yaml"
+
+    async def session():
+        hover(4, uri, 0, 0)
+        await wait_until(started)
+        token = server.reloads[uri].token
+
+        send({"method": "$/cancelRequest", "params": {"id": 4}})
+        await asyncio.sleep(0.05)
+        cancelled = token.cancelled
+
+        release.set()
+        while server.reloads:
+            await asyncio.sleep(0.01)
+        return cancelled
+
+    assert server.loop.run_until_complete(session())
+    assert server.get_context(uri) is None
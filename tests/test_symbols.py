@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from hydra_lsp.cache import FileCache, ParsedFile
+from hydra_lsp.context import Loc
+from hydra_lsp.parser import ConfigParser
+from hydra_lsp.symbols import SymbolIndex, fuzzy_trigrams
+
+
+def make_file(uri: str, *keys: str) -> ParsedFile:
+    definitions = {
+        key: Loc(uri, i << 32, i << 32 | len(key)) for i, key in enumerate(keys)
+    }
+    return ParsedFile(uri, 1, {}, definitions)
+
+
+def names(results) -> list:
+    return [key for key, _ in results]
+
+
+def test_fuzzy_trigrams():
+    grams = fuzzy_trigrams("data.loaderType")
+    # every trigram of "dataloadertype"
+    assert {"dat", "tal", "ert"} <= grams
+    # jumps to the heads of the next segments
+    assert {"dlt", "dal", "lty", "ltd"} & grams == {"dlt", "dal", "lty"}
+
+
+def test_search():
+    cache = FileCache()
+    cache.put(
+        make_file(
+            "a.yaml",
+            "data",
+            "data.loader",
+            "data.loader.batch_size",
+            "model.Loader_Type",
+            "reloader",
+        )
+    )
+    symbols = SymbolIndex()
+    symbols.sync(cache)
+
+    # the name of the key, then the name prefix, then the substring
+    assert names(symbols.search("loader")) == [
+        "data.loader",
+        "model.Loader_Type",
+        "reloader",
+        "data.loader.batch_size",
+    ]
+    assert names(symbols.search("lo")) == [
+        "data.loader",
+        "model.Loader_Type",
+        "reloader",
+        "data.loader.batch_size",
+    ]
+    # subsequences are found when there are not enough substrings
+    assert names(symbols.search("dlbs")) == ["data.loader.batch_size"]
+    assert names(symbols.search("loader", limit=2)) == [
+        "data.loader",
+        "model.Loader_Type",
+    ]
+    assert symbols.search("missing") == []
+    assert len(symbols.search("")) == 5
+
+
+def test_incremental(tmp_path):
+    config = tmp_path / "config.yaml"
+    config.write_text("data:\n  size: 1\n")
+    other = tmp_path / "other.yaml"
+    other.write_text("data:\n  size: 2\n")
+
+    parser = ConfigParser()
+    parser.parse_file(str(config))
+    parser.parse_file(str(other))
+
+    symbols = SymbolIndex()
+    symbols.sync(parser.cache)
+    results = symbols.search("size")
+    assert sorted(loc.uri for _, loc in results) == [str(config), str(other)]
+    assert results[0][1] == parser.cache.files[str(config)].definitions["data.size"]
+
+    config.write_text("data:\n  length: 1\n")
+    parser.parse_file(str(config))
+    parser.cache.invalidate(str(other))
+    symbols.sync(parser.cache)
+
+    assert symbols.search("size") == []
+    assert names(symbols.search("length")) == ["data.length"]
+    assert len(symbols) == 2
+
+
+def test_rebuild():
+    cache = FileCache()
+    cache.put(make_file("a.yaml", "a.x", "a.y"))
+    symbols = SymbolIndex()
+    symbols.sync(cache)
+
+    cache.put(make_file("a.yaml", "b.x"))
+    symbols.sync(cache)
+
+    # the removed keys outnumber the defined ones, the index is rebuilt
+    assert symbols.keys == ["b.x"]
+    assert names(symbols.search("x")) == ["b.x"]
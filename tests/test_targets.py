@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+from lsprotocol import types as lsp_types
+from pygls.workspace import Workspace
+
+from hydra_lsp.autocomplete import Completer
+from hydra_lsp.intel import HydraIntel
+from hydra_lsp.targets import TargetIndex, get_module_name, parse_module
+from hydra_lsp.utils import yaml_get_siblings
+
+MODELS = '''
+from dataclasses import dataclass
+
+from .layers import Layer as BaseLayer
+
+
+class Base:
+    """Base of the models.
+
+    More details.
+    """
+
+    def __init__(self, size: int, dropout: float = 0.1, *layers, **kwargs):
+        pass
+
+
+class Model(Base):
+    class Head(BaseLayer):
+        pass
+
+
+@dataclass
+class Config:
+    name: str
+    depth: int = 2
+
+
+def build(name, *, seed=0):
+    pass
+'''
+
+LAYERS = """
+class Layer:
+    def __init__(self, units):
+        pass
+"""
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    package = tmp_path / "mylib"
+    package.mkdir()
+    (package / "__init__.py").write_text("from .models import Model\n")
+    (package / "models.py").write_text(MODELS)
+    (package / "layers.py").write_text(LAYERS)
+    (tmp_path / "broken.py").write_text("def broken(:\n")
+    return tmp_path
+
+
+class Server:
+    """The part of the language server used by the features: the workspace"""
+
+    def __init__(self, uri: str, text: str):
+        self.workspace = Workspace(None)
+        self.workspace.put_text_document(
+            lsp_types.TextDocumentItem(
+                uri=uri, language_id="yaml", version=1, text=text
+            )
+        )
+
+
+def test_parse_module(workspace):
+    path = str(workspace / "mylib" / "models.py")
+    module = parse_module(path)
+
+    assert get_module_name(path) == "mylib.models"
+    assert [t.name for t in module.targets] == [
+        "mylib.models.Base",
+        "mylib.models.Model",
+        "mylib.models.Config",
+        "mylib.models.build",
+        "mylib.models.Model.Head",
+    ]
+    base, model, config, build, head = module.targets
+    assert [str(p) for p in base.params] == [
+        "size: int",
+        "dropout: float = 0.1",
+        "*layers",
+        "**kwargs",
+    ]
+    assert base.doc == "Base of the models."
+    assert model.params is None and model.bases == ["mylib.models.Base"]
+    assert [str(p) for p in config.params] == ["name: str", "depth: int = 2"]
+    assert [str(p) for p in build.params] == ["name", "seed=0"]
+    assert head.bases == ["mylib.layers.Layer"]
+
+    assert parse_module(str(workspace / "broken.py")).targets == []
+
+
+def test_index(workspace):
+    targets = TargetIndex()
+    stale = targets.get_stale_files([str(workspace)])
+    assert len(stale) == 4
+    targets.update(map(parse_module, stale))
+    assert targets.get_stale_files([str(workspace)]) == []
+
+    # re-exported by the package, the parameters are inherited
+    model = targets.get("mylib.Model")
+    assert model is not None and model.name == "mylib.models.Model"
+    assert [p.name for p in targets.get_params(model)][:2] == ["size", "dropout"]
+    head = targets.get("mylib.Model.Head")
+    assert [p.name for p in targets.get_params(head)] == ["units"]
+
+    names, _ = targets.complete("mylib.M")
+    assert names == ["mylib.Model", "mylib.Model.Head"]
+
+    # a copy is updated while the index is still read
+    copy = targets.copy()
+    copy.remove([str(workspace / "mylib" / "models.py")])
+    assert copy.get("mylib.Model") is None
+    assert targets.get("mylib.Model") is not None
+
+    # changed files are parsed again, deleted ones are forgotten
+    layers = workspace / "mylib" / "layers.py"
+    layers.write_text("def layer(units):\n    pass\n")
+    os.utime(layers, ns=(0, 0))
+    os.remove(workspace / "broken.py")
+    assert targets.refresh([str(layers), str(workspace / "broken.py")]) == 1
+    assert targets.get("mylib.layers.Layer") is None
+    assert targets.get("mylib.layers.layer") is not None
+    assert str(workspace / "broken.py") not in targets.modules
+
+    path = str(workspace / "cache" / "targets")
+    assert targets.save(path) == 3
+    loaded = TargetIndex()
+    assert loaded.load(path) == 3
+    assert loaded.get_stale_files([str(workspace)]) == []
+    assert loaded.get("mylib.Model") is not None
+
+
+def test_siblings():
+    lines = [
+        "model:",
+        "  _target_: mylib.Model",
+        "  si",
+        "  layers:",
+        "    - _target_: mylib.layers.Layer",
+        "      units: 3",
+        "  dropout: 0.1",
+    ]
+    assert yaml_get_siblings(lines, 2) == {
+        "_target_": "mylib.Model",
+        "layers": "",
+        "dropout": "0.1",
+    }
+    assert yaml_get_siblings(lines, 5) == {"_target_": "mylib.layers.Layer"}
+
+
+def test_target_features(workspace):
+    targets = TargetIndex()
+    targets.update(map(parse_module, targets.get_stale_files([str(workspace)])))
+
+    uri = "file:///config.yaml"
+    text = "model:\n  _target_: mylib.Model\n  size: 4\n  \n"
+    ls = Server(uri, text)
+    intel = HydraIntel(ls)
+    document = lsp_types.TextDocumentIdentifier(uri=uri)
+
+    def position(line: int, character: int) -> lsp_types.HoverParams:
+        return lsp_types.HoverParams(
+            text_document=document,
+            position=lsp_types.Position(line=line, character=character),
+        )
+
+    hover = intel.get_target_hover(position(1, 15), None, targets)
+    assert (
+        "class mylib.models.Model(size: int, dropout: float = 0.1"
+        in hover.contents.value
+    )
+    hover = intel.get_target_hover(position(2, 3), None, targets)
+    assert "size: int" in hover.contents.value
+
+    location = intel.get_target_definition(position(2, 3), None, targets)
+    assert location.uri == f"file://{workspace}/mylib/models.py"
+    assert location.range.start.line == 12
+
+    completer = Completer()
+    completions = completer.get_target_completions(
+        ls,
+        lsp_types.CompletionParams(
+            text_document=document, position=lsp_types.Position(line=3, character=2)
+        ),
+        targets,
+    )
+    assert [item.label for item in completions.items] == ["dropout"]
+
+    completions = completer.get_target_completions(
+        ls,
+        lsp_types.CompletionParams(
+            text_document=document, position=lsp_types.Position(line=1, character=19)
+        ),
+        targets,
+    )
+    assert [item.label for item in completions.items] == [
+        "mylib.Model",
+        "mylib.Model.Head",
+    ]